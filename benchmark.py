@@ -0,0 +1,392 @@
+import argparse
+import csv
+import glob
+import json
+import multiprocessing
+import os
+import re
+import resource
+import sys
+import time
+import traceback
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import z3
+from settings import Z3_BACKEND, NUMPY_BACKEND, STABILIZER_BACKEND, QASM_FRONTEND
+
+BENCHMARKS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks")
+SUITES = ["small", "medium", "large"]
+DEFAULT_BASELINE = os.path.join(BENCHMARKS_DIR, "baseline.json")
+FIELDS = ["circuit", "status", "qubits", "gates", "parse_time", "encoding_time", "variables", "assertions",
+          "check_time", "winner", "peak_rss_kb", "python_peak_kb", "z3_memory_kb", "bytes_per_gate", "aer_distance",
+          "error"]
+# statuses of runs that finished
+OK_STATUSES = ["sat", "unsat", "ok"]
+# time differences below this many seconds are never reported as regressions
+MIN_TIME_DIFFERENCE = 0.05
+# bytes per gate (python and z3) allowed by --memory-budget when no value is given, the ising_model circuits of the
+# large suite take about 10KB per gate
+DEFAULT_MEMORY_BUDGET = 16 * 1024
+# bytes allowed on top of the budget of the gates, z3 allocates about 630KB for the first assertions of any circuit
+MEMORY_OVERHEAD = 1024 * 1024
+
+
+def find_circuits(suites: List[str], pattern: Optional[str]) -> List[str]:
+    """
+    :return: paths of the selected circuits, relative to the benchmarks directory (e.g. small/adder_n4/adder_n4.qasm)
+    """
+    circuits = []
+    for suite in suites:
+        for path in sorted(glob.glob(os.path.join(BENCHMARKS_DIR, suite, "*", "*.qasm"))):
+            circuit = os.path.relpath(path, BENCHMARKS_DIR)
+            if pattern is None or re.search(pattern, circuit):
+                circuits.append(circuit)
+    return circuits
+
+
+def count_variables(assertions) -> int:
+    # distinct uninterpreted constants (z3 Real and Bool variables) in the assertions
+    seen = set()
+    variables = set()
+    stack = list(assertions)
+    while len(stack) > 0:
+        expression = stack.pop()
+        if expression.get_id() in seen:
+            continue
+        seen.add(expression.get_id())
+        if z3.is_const(expression) and expression.decl().kind() == z3.Z3_OP_UNINTERPRETED:
+            variables.add(expression.decl().name())
+        stack.extend(expression.children())
+    return len(variables)
+
+
+def get_distance(distribution: Dict[str, float], reference: Dict[str, float]) -> float:
+    # total variation distance
+    keys = set(distribution.keys()).union(reference.keys())
+    return 0.5 * sum(abs(distribution.get(key, 0.0) - reference.get(key, 0.0)) for key in keys)
+
+
+def get_key(state: Dict[str, bool], qubits: List[str]) -> str:
+    return "".join("1" if state.get(qubit, False) else "0" for qubit in sorted(qubits))
+
+
+def get_aer_distance(path: str, qubits: List[str], distribution: Dict[str, float]) -> Optional[float]:
+    try:
+        from ibm_simulator import get_state_probabilities
+    except ImportError:
+        return None
+    reference = dict()
+    for (state, probability) in get_state_probabilities(path):
+        # qubits that the circuit never uses stay in |0>, they are marginalized
+        key = get_key(state, qubits)
+        reference[key] = reference.get(key, 0.0) + probability
+    return get_distance(distribution, reference)
+
+
+def set_memory(result: Dict[str, Any]) -> None:
+    # stops tracemalloc, the python peak and the memory held by z3 are divided among the gates
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result["python_peak_kb"] = peak // 1024
+    result["bytes_per_gate"] = (peak + result.get("z3_memory_kb", 0) * 1024) // max(result["gates"], 1)
+
+
+def run_circuit(path: str, backend: str, optimize: bool, compare_aer: bool, portfolio: bool = False,
+                timeout: Optional[float] = None, exact: bool = False, memory: bool = False,
+                report: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    Runs one circuit in the current process and returns its metrics, it is meant to run in a fresh process
+    :param portfolio: race the solver configurations of portfolio.py instead of the default check, the winner is
+    recorded and logged
+    :param exact: use the exact Clifford+T encoding
+    :param memory: measure the memory of parsing and encoding, the peak of the python allocations (tracemalloc, which
+    slows the encoding down) and the memory held by z3 once the circuit is encoded
+    :param report: called with the metrics measured until the circuit is encoded, before the solver runs
+    """
+    # imported here, only the child processes need the encoders
+    from circuit import load_instructions, encode_instructions, simulate_instructions, simulate_stabilizer
+    from peephole import PeepholeOptimizer
+    from simulation import Simulation
+    from static_solver import StaticSolver
+    from portfolio import CONFIGURATIONS, race, log_race, get_features
+    from utils import to_float
+
+    result: Dict[str, Any] = dict()
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    instructions = list(load_instructions(path, QASM_FRONTEND))
+    if optimize:
+        instructions = list(PeepholeOptimizer().optimize(instructions))
+    result["parse_time"] = time.perf_counter() - start
+    result["gates"] = len(instructions)
+
+    distribution = dict()
+    if backend == NUMPY_BACKEND:
+        start = time.perf_counter()
+        simulator = simulate_instructions(instructions)
+        result["encoding_time"] = time.perf_counter() - start
+        if memory:
+            set_memory(result)
+        result["status"] = "ok"
+        qubits = simulator.qubits
+        if compare_aer:
+            for (index, probability) in enumerate(simulator.get_probabilities().reshape(-1)):
+                if probability > 1e-12:
+                    state = {qubit: bool((index >> (len(qubits) - 1 - i)) & 1) for (i, qubit) in enumerate(qubits)}
+                    distribution[get_key(state, qubits)] = float(probability)
+    elif backend == STABILIZER_BACKEND:
+        start = time.perf_counter()
+        tableau = simulate_stabilizer(instructions)
+        result["encoding_time"] = time.perf_counter() - start
+        if memory:
+            set_memory(result)
+        result["status"] = "ok"
+        qubits = tableau.qubits
+        if compare_aer:
+            for (state, probability) in tableau.iter_support():
+                distribution[get_key(state, qubits)] = probability
+    else:
+        start = time.perf_counter()
+        session = Simulation(exact=exact)
+        # the memory of an empty context is not part of the encoding
+        z3_memory = z3.Z3_get_estimated_alloc_size()
+        encode_instructions(session, instructions)
+        result["encoding_time"] = time.perf_counter() - start
+        if memory:
+            result["z3_memory_kb"] = (z3.Z3_get_estimated_alloc_size() - z3_memory) // 1024
+            set_memory(result)
+        if report is not None:
+            report(result)
+        assertions = session.solver.assertions()
+        result["assertions"] = len(assertions)
+        result["variables"] = count_variables(assertions)
+        if portfolio:
+            answer = race(session, list(CONFIGURATIONS.keys()), timeout)
+            log_race(os.path.relpath(path, BENCHMARKS_DIR), get_features(session), answer)
+            result["status"] = answer["result"]
+            result["check_time"] = answer["time"]
+            result["winner"] = answer["winner"]
+        else:
+            start = time.perf_counter()
+            result["status"] = str(StaticSolver.check(session))
+            result["check_time"] = time.perf_counter() - start
+        qubits = list(session.mapping.keys())
+        if compare_aer:
+            for state in StaticSolver.iter_reachable_states(session, session.mapping):
+                _, _, probability = StaticSolver.evaluate_state_probability(session, state, session.mapping)
+                distribution[get_key(state, qubits)] = to_float(probability)
+
+    result["qubits"] = len(qubits)
+    if compare_aer:
+        result["aer_distance"] = get_aer_distance(path, qubits, distribution)
+    result["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return result
+
+
+def run_child(connection, path: str, backend: str, optimize: bool, compare_aer: bool, portfolio: bool,
+              timeout: float, exact: bool, memory: bool) -> None:
+    # the metrics of the encoding are sent before the solver runs, they are kept if the check times out or fails
+    encoded: Dict[str, Any] = dict()
+
+    def report(result: Dict[str, Any]) -> None:
+        encoded.update(result)
+        connection.send(dict(result))
+
+    try:
+        connection.send(run_circuit(path, backend, optimize, compare_aer, portfolio, timeout, exact, memory, report))
+    except Exception as exception:
+        connection.send({**encoded, "status": "error", "error": f"{type(exception).__name__}: {exception}",
+                         "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                         "traceback": traceback.format_exc()})
+
+
+def run_with_timeout(circuit: str, backend: str, optimize: bool, compare_aer: bool, timeout: float,
+                     portfolio: bool = False, exact: bool = False, memory: bool = False) -> Dict[str, Any]:
+    """
+    Runs a circuit in a new process, every circuit starts from an empty global encoding. When the circuit times out
+    (or its process dies, e.g. out of memory) after it was encoded, the result keeps the metrics of the encoding
+    """
+    context = multiprocessing.get_context("fork")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=run_child,
+                              args=(sender, os.path.join(BENCHMARKS_DIR, circuit), backend, optimize, compare_aer,
+                                    portfolio, timeout, exact, memory))
+    process.start()
+    sender.close()
+    deadline = time.perf_counter() + timeout
+    result = {"status": "timeout"}
+    while receiver.poll(max(deadline - time.perf_counter(), 0)):
+        try:
+            message = receiver.recv()
+        except EOFError:
+            process.join()
+            result.update({"status": "error", "error": f"worker exited with code {process.exitcode}"})
+            break
+        if "status" in message.keys():
+            result = message
+            break
+        # metrics of the encoding, the solver is running
+        result.update(message)
+    if process.is_alive():
+        process.kill()
+    process.join()
+    receiver.close()
+    result.pop("traceback", None)
+    result["circuit"] = circuit
+    return result
+
+
+def write_results(results: List[Dict[str, Any]], output: str) -> None:
+    with open(output + ".json", "w") as file:
+        json.dump(results, file, indent=2)
+    with open(output + ".csv", "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=FIELDS)
+        writer.writeheader()
+        for result in results:
+            writer.writerow({field: result.get(field) for field in FIELDS})
+
+
+def get_total_time(result: Dict[str, Any]) -> float:
+    return sum(result.get(field) or 0.0 for field in ["parse_time", "encoding_time", "check_time"])
+
+
+def is_larger(value: Optional[float], reference: Optional[float], tolerance: float) -> bool:
+    return value is not None and reference is not None and value > reference * (1 + tolerance)
+
+
+def find_regressions(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]],
+                     tolerance: float) -> List[str]:
+    """
+    :param tolerance: relative increase allowed for times, assertion counts and peak memory
+    :return: one message per regression
+    """
+    reference = {result["circuit"]: result for result in baseline}
+    regressions = []
+    for result in results:
+        if result["circuit"] not in reference.keys():
+            continue
+        old = reference[result["circuit"]]
+        circuit = result["circuit"]
+        if old["status"] in OK_STATUSES and result["status"] != old["status"]:
+            regressions.append(f"{circuit}: status {old['status']} -> {result['status']}")
+            continue
+        if result["status"] not in OK_STATUSES:
+            continue
+        old_time = get_total_time(old)
+        new_time = get_total_time(result)
+        if is_larger(new_time, old_time, tolerance) and new_time - old_time > MIN_TIME_DIFFERENCE:
+            regressions.append(f"{circuit}: time {old_time:.3f}s -> {new_time:.3f}s")
+        for field in ["assertions", "variables", "peak_rss_kb", "bytes_per_gate"]:
+            if is_larger(result.get(field), old.get(field), tolerance):
+                regressions.append(f"{circuit}: {field} {old[field]} -> {result[field]}")
+    return regressions
+
+
+def find_over_budget(results: List[Dict[str, Any]], budget: int) -> List[str]:
+    """
+    :param budget: bytes per gate, the encoding of a circuit may take MEMORY_OVERHEAD more bytes
+    :return: one message per circuit whose encoding took more memory than the budget
+    """
+    messages = []
+    for result in results:
+        if result.get("bytes_per_gate") is None:
+            continue
+        used = (result["python_peak_kb"] + result.get("z3_memory_kb", 0)) * 1024
+        if used > MEMORY_OVERHEAD + budget * result["gates"]:
+            messages.append(f"{result['circuit']}: {result['bytes_per_gate']} bytes per gate "
+                            f"(python {result['python_peak_kb']}kb, z3 {result.get('z3_memory_kb', 0)}kb)")
+    return messages
+
+
+def print_result(result: Dict[str, Any]) -> None:
+    def show(field: str) -> str:
+        value = result.get(field)
+        if isinstance(value, float):
+            return f"{value:.3f}"
+        return str(value)
+    memory = ""
+    if "bytes_per_gate" in result.keys():
+        memory = (f" python={show('python_peak_kb')}kb z3={result.get('z3_memory_kb', 0)}kb "
+                  f"bytes_per_gate={show('bytes_per_gate')}")
+    if result["status"] not in OK_STATUSES:
+        # a circuit that timed out in the solver was still encoded
+        encoded = f" encode={show('encoding_time')}{memory}" if "encoding_time" in result.keys() else ""
+        print(f"{result['circuit']:<50} {result['status']:<8} {result.get('error', '')}{encoded}")
+        sys.stdout.flush()
+        return
+    print(f"{result['circuit']:<50} {result['status']:<8} qubits={show('qubits')} gates={show('gates')} "
+          f"parse={show('parse_time')} encode={show('encoding_time')} check={show('check_time')} "
+          f"vars={show('variables')} assertions={show('assertions')} rss={show('peak_rss_kb')}kb{memory}"
+          + (f" winner={show('winner')}" if "winner" in result.keys() else "")
+          + (f" aer_distance={show('aer_distance')}" if "aer_distance" in result.keys() else ""))
+    sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="runs the circuits in benchmarks/ and compares them to a baseline")
+    parser.add_argument("--suite", nargs="+", choices=SUITES, default=["small"])
+    parser.add_argument("--filter", default=None, help="regular expression on <suite>/<name>/<file>.qasm")
+    parser.add_argument("--backend", choices=[Z3_BACKEND, NUMPY_BACKEND, STABILIZER_BACKEND], default=Z3_BACKEND)
+    parser.add_argument("--optimize", action="store_true", help="run the peephole pass before simulating")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds per circuit")
+    parser.add_argument("--output", default="benchmark_results", help="writes <output>.json and <output>.csv")
+    parser.add_argument("--baseline", default=None,
+                        help=f"results to compare against (default {os.path.relpath(DEFAULT_BASELINE)}), the run fails "
+                             "when this file is given and missing")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown/growth")
+    parser.add_argument("--aer", action="store_true",
+                        help="compare the distributions with Aer (ibm_simulator.py) when qiskit is installed")
+    parser.add_argument("--portfolio", action="store_true",
+                        help="z3 backend: race the solver configurations of portfolio.py and log the winners")
+    parser.add_argument("--exact", action="store_true", help="z3 backend: exact encoding of Clifford+T circuits")
+    parser.add_argument("--memory", action="store_true",
+                        help="measure the python peak (tracemalloc, slower encoding) and the z3 memory of the "
+                             "encoding, and the bytes per gate")
+    parser.add_argument("--memory-budget", type=int, nargs="?", const=DEFAULT_MEMORY_BUDGET, default=None,
+                        metavar="BYTES",
+                        help="implies --memory, fails when an encoding takes more than this many bytes per gate "
+                             f"(default {DEFAULT_MEMORY_BUDGET}) plus {MEMORY_OVERHEAD // 1024}kb")
+    cli_args = parser.parse_args()
+    memory = cli_args.memory or cli_args.memory_budget is not None
+
+    results = []
+    for circuit in find_circuits(cli_args.suite, cli_args.filter):
+        result = run_with_timeout(circuit, cli_args.backend, cli_args.optimize, cli_args.aer, cli_args.timeout,
+                                  cli_args.portfolio, cli_args.exact, memory)
+        print_result(result)
+        results.append(result)
+    write_results(results, cli_args.output)
+
+    over_budget = []
+    if cli_args.memory_budget is not None:
+        over_budget = find_over_budget(results, cli_args.memory_budget)
+        if len(over_budget) > 0:
+            print(f"OVER THE MEMORY BUDGET of {cli_args.memory_budget} bytes per gate:")
+            for message in over_budget:
+                print(f"  {message}")
+        else:
+            print(f"every encoding within {cli_args.memory_budget} bytes per gate")
+
+    baseline = DEFAULT_BASELINE if cli_args.baseline is None else cli_args.baseline
+    if cli_args.save_baseline:
+        with open(baseline, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"baseline saved in {baseline}")
+    elif os.path.exists(baseline):
+        with open(baseline) as file:
+            regressions = find_regressions(results, json.load(file), cli_args.tolerance)
+        if len(regressions) > 0:
+            print(f"REGRESSIONS against {baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"no regressions against {baseline}")
+    else:
+        print(f"WARNING: no baseline in {baseline}, the results were not compared (record one with --save-baseline)")
+        if cli_args.baseline is not None:
+            sys.exit(1)
+    if len(over_budget) > 0:
+        sys.exit(1)
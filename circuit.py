@@ -0,0 +1,99 @@
+from typing import Collection, Iterable, Iterator, List
+
+from qasm_parser import Instruction, parse_qasm_file
+from numpy_simulator import NumpyStatevector
+from stabilizer_simulator import StabilizerTableau
+from static_solver import StaticSolver
+from simulation import Simulation
+from z3quantum_gate import Z3QuantumGate
+from z3qubit import Z3Qubit
+from settings import QASM_FRONTEND, QISKIT_FRONTEND, CLIFFORD_GATES
+
+
+def get_instructions(qc) -> Iterator[Instruction]:
+    """
+    Flattens a qiskit QuantumCircuit into the instruction stream used by the simulators
+    :param qc: qiskit QuantumCircuit
+    """
+    for instruction in qc.data:
+        args = []
+        for qubit in instruction.qubits:
+            args.append(f"{qubit.register.name}_{qubit.index}")
+        params = tuple(float(param) for param in instruction.operation.params)
+        yield Instruction(instruction.operation.name, args, params)
+
+
+def load_instructions(input_file: str, frontend: str = QASM_FRONTEND,
+                      parameters: Collection[str] = ()) -> Iterable[Instruction]:
+    """
+    :param frontend: QASM_FRONTEND streams the file with the built-in parser, QISKIT_FRONTEND builds a qiskit
+    QuantumCircuit first
+    :param parameters: free parameters of the circuit, kept symbolic (built-in parser only)
+    """
+    if frontend == QISKIT_FRONTEND:
+        # qiskit is optional, only imported when it is asked for
+        from qiskit import QuantumCircuit
+        if len(parameters) > 0:
+            raise Exception("Free parameters are only supported by the built-in parser")
+        return get_instructions(QuantumCircuit.from_qasm_file(input_file))
+    assert (frontend == QASM_FRONTEND)
+    return parse_qasm_file(input_file, parameters=parameters)
+
+
+def encode_instructions(session: Simulation, instructions: Iterable[Instruction]) -> None:
+    """
+    Encodes the instructions into the solver of the session, qubits are created in session.mapping the first time
+    they are used
+    """
+    StaticSolver.add_constants(session)
+    apply_instructions(session, instructions)
+
+
+def apply_instructions(session: Simulation, instructions: Iterable[Instruction]) -> None:
+    """
+    Encodes more instructions after the ones already encoded in the session
+    """
+    for (op, args, params) in instructions:
+        for name in args:
+            if name not in session.mapping.keys():
+                session.mapping[name] = Z3Qubit(session, name)
+        Z3QuantumGate(session, op, args, params).execute()
+
+
+def iter_variants(session: Simulation, suffixes: List[Iterable[Instruction]]) -> Iterator[Simulation]:
+    """
+    Encodes each suffix after the instructions of the session (the shared prefix) in its own solver scope. The session
+    is yielded once per suffix, the suffix is removed when the next one is requested, so the prefix is encoded once
+    for the whole family.
+    """
+    for suffix in suffixes:
+        session.push()
+        try:
+            apply_instructions(session, suffix)
+            yield session
+        finally:
+            session.pop()
+
+
+def simulate_instructions(instructions: Iterable[Instruction]) -> NumpyStatevector:
+    simulator = NumpyStatevector([])
+    for (op, args, params) in instructions:
+        for name in args:
+            if name not in simulator.index.keys():
+                simulator.add_qubit(name)
+        simulator.apply(op, args, params)
+    return simulator
+
+
+def is_clifford(instructions: Iterable[Instruction]) -> bool:
+    return all(op in CLIFFORD_GATES for (op, _, _) in instructions)
+
+
+def simulate_stabilizer(instructions: Iterable[Instruction]) -> StabilizerTableau:
+    tableau = StabilizerTableau([])
+    for (op, args, params) in instructions:
+        for name in args:
+            if name not in tableau.index.keys():
+                tableau.add_qubit(name)
+        tableau.apply(op, args, params)
+    return tableau
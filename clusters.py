@@ -0,0 +1,113 @@
+import itertools
+import multiprocessing
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from qasm_parser import Instruction
+from static_solver import StaticSolver
+from simulation import Simulation
+from circuit import encode_instructions
+from utils import to_float
+
+
+class QubitClusters:
+    """
+    Union-find over the qubits, two qubits are in the same cluster when a gate acts on both of them
+    """
+    parent: Dict[str, str]
+
+    def __init__(self):
+        self.parent = dict()
+
+    def find(self, qubit: str) -> str:
+        root = qubit
+        while self.parent[root] != root:
+            root = self.parent[root]
+        # path compression
+        while self.parent[qubit] != root:
+            self.parent[qubit], qubit = root, self.parent[qubit]
+        return root
+
+    def add(self, qubits: List[str]) -> None:
+        for qubit in qubits:
+            if qubit not in self.parent.keys():
+                self.parent[qubit] = qubit
+        root = self.find(qubits[0])
+        for qubit in qubits[1:]:
+            other = self.find(qubit)
+            if other != root:
+                self.parent[other] = root
+
+    def get_clusters(self) -> List[List[str]]:
+        """
+        :return: qubits of each cluster, in order of first use
+        """
+        clusters: Dict[str, List[str]] = dict()
+        for qubit in self.parent.keys():
+            clusters.setdefault(self.find(qubit), []).append(qubit)
+        return list(clusters.values())
+
+
+def split_instructions(instructions: Iterable[Instruction]) -> List[List[Instruction]]:
+    """
+    Splits a circuit into the connected components of its interaction graph
+    :return: instructions of each cluster, in their original order
+    """
+    instructions = list(instructions)
+    clusters = QubitClusters()
+    for instruction in instructions:
+        clusters.add(instruction.qubits)
+    roots = [clusters.find(cluster[0]) for cluster in clusters.get_clusters()]
+    answer: Dict[str, List[Instruction]] = {root: [] for root in roots}
+    for instruction in instructions:
+        answer[clusters.find(instruction.qubits[0])].append(instruction)
+    return [answer[root] for root in roots]
+
+
+def solve_cluster(instructions: List[Instruction], exact: bool = False) -> List[Tuple[Dict[str, bool], float]]:
+    """
+    Encodes a cluster in a new session and enumerates its reachable states
+    :param exact: use the exact Clifford+T encoding (see ExactComplex)
+    :return: list of (state of the qubits of the cluster, probability)
+    """
+    session = Simulation(exact=exact)
+    encode_instructions(session, instructions)
+    answer = []
+    for state in StaticSolver.iter_reachable_states(session, session.mapping):
+        _, _, probability = StaticSolver.evaluate_state_probability(session, state, session.mapping)
+        answer.append((state, to_float(probability)))
+    return answer
+
+
+def solve_clusters(instructions: Iterable[Instruction], workers: int,
+                   exact: bool = False) -> List[List[Tuple[Dict[str, bool], float]]]:
+    """
+    Every cluster is encoded and solved in its own session, in a pool of `workers` processes
+    :return: distribution of each cluster (see solve_cluster)
+    """
+    clusters = split_instructions(instructions)
+    with multiprocessing.get_context("fork").Pool(max(1, min(workers, len(clusters)))) as pool:
+        return pool.starmap(solve_cluster, [(cluster, exact) for cluster in clusters], chunksize=1)
+
+
+def combine(distributions: List[List[Tuple[Dict[str, bool], float]]]) -> Iterator[Tuple[Dict[str, bool], float]]:
+    """
+    Tensor product of the distributions of independent clusters
+    """
+    for combination in itertools.product(*distributions):
+        state = dict()
+        probability = 1.0
+        for (cluster_state, cluster_probability) in combination:
+            state.update(cluster_state)
+            probability *= cluster_probability
+        yield dict(sorted(state.items())), probability
+
+
+def get_highest_prob(distributions: List[List[Tuple[Dict[str, bool], float]]]) -> Tuple[float, Dict[str, bool]]:
+    # the clusters are independent, the most likely state is made of the most likely state of each cluster
+    state = dict()
+    probability = 1.0
+    for distribution in distributions:
+        cluster_state, cluster_probability = max(distribution, key=lambda item: item[1])
+        state.update(cluster_state)
+        probability *= cluster_probability
+    return round(probability, 3), dict(sorted(state.items()))
@@ -1,17 +1,19 @@
 from z3qubit import Z3Qubit as Qubit
 from z3quantum_gate import Z3QuantumGate
+from simulation import Simulation
 
-q = Qubit("control")
-q2 = Qubit("target")
+session = Simulation()
+q = Qubit(session, "control")
+q2 = Qubit(session, "target")
 
 
-Z3QuantumGate.mapping["dy"] = q
-Z3QuantumGate.mapping["pony"] = q2
+session.mapping["dy"] = q
+session.mapping["pony"] = q2
 q.t()
-# Z3QuantumGate("cx", ["dummy", "pony"]).execute()
+# Z3QuantumGate(session, "cx", ["dummy", "pony"]).execute()
 
 # q.normalization_constraint()
 
 from utils import StaticSolver
-print(StaticSolver.check())
-StaticSolver.model()
+print(StaticSolver.check(session))
+StaticSolver.model(session)
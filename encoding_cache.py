@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import z3
+from qasm_parser import Instruction
+from simulation import Simulation
+from circuit import encode_instructions
+from smt_export import export_encoding, load_encoding
+from settings import ENCODER_VERSION, ENCODING_CACHE_DIR, ENCODING_CACHE_SIZE
+
+SMT2_EXTENSION = ".smt2"
+QUBITS_EXTENSION = ".json"
+
+
+class EncodingCache:
+    """
+    Encoded circuits stored on disk as SMT-LIB2 (see export_encoding), with the name of the final z3 boolean of every
+    qubit. An entry is keyed by the hash of the OpenQASM file, the encoder version and the options that change the
+    encoded instructions. When the total size exceeds `max_size` bytes the least recently used entries are removed.
+    """
+    directory: str
+    max_size: int
+
+    def __init__(self, directory: str = ENCODING_CACHE_DIR, max_size: int = ENCODING_CACHE_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def get_key(input_file: str, options: List[Any]) -> str:
+        """
+        :param options: everything that changes the instructions given to the encoder (front-end, peephole pass,
+        light cone...), as JSON values
+        """
+        digest = hashlib.sha256()
+        with open(input_file, "rb") as file:
+            for block in iter(lambda: file.read(1 << 16), b""):
+                digest.update(block)
+        # the SMT-LIB2 printer and parser are those of z3, an entry is not reused by another z3 version
+        digest.update(json.dumps([ENCODER_VERSION, z3.get_version_string(), options]).encode())
+        return digest.hexdigest()
+
+    def get_paths(self, key: str) -> Tuple[str, str]:
+        return (os.path.join(self.directory, key + SMT2_EXTENSION),
+                os.path.join(self.directory, key + QUBITS_EXTENSION))
+
+    def load(self, key: str) -> Optional[Simulation]:
+        """
+        :return: a new session with the cached encoding (its mapping holds ImportedQubit), or None on a miss
+        """
+        smt2_path, qubits_path = self.get_paths(key)
+        try:
+            with open(smt2_path) as file:
+                smt2 = file.read()
+            with open(qubits_path) as file:
+                qubits = json.load(file)
+            session = load_encoding(smt2, qubits)
+        except (OSError, ValueError, z3.Z3Exception):
+            # missing, or partially removed by the eviction of another process
+            return None
+        # the modification time is the last use of the entry
+        os.utime(smt2_path)
+        return session
+
+    def store(self, key: str, session: Simulation) -> None:
+        smt2, qubits = export_encoding(session)
+        smt2_path, qubits_path = self.get_paths(key)
+        # files are renamed into place, so that other processes never read an incomplete entry
+        for (path, content) in [(qubits_path, json.dumps(qubits)), (smt2_path, smt2)]:
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "w") as file:
+                file.write(content)
+            os.replace(temp_path, path)
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Removes the least recently used entries until the cache fits in max_size bytes
+        """
+        entries = []
+        total_size = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(SMT2_EXTENSION):
+                continue
+            smt2_path, qubits_path = self.get_paths(name[:-len(SMT2_EXTENSION)])
+            try:
+                size = os.path.getsize(smt2_path) + os.path.getsize(qubits_path)
+                entries.append((os.path.getmtime(smt2_path), size, smt2_path, qubits_path))
+            except OSError:
+                continue
+            total_size += size
+        entries.sort()
+        while total_size > self.max_size and len(entries) > 0:
+            _, size, smt2_path, qubits_path = entries.pop(0)
+            for path in [smt2_path, qubits_path]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total_size -= size
+
+
+def get_session(instructions: Iterable[Instruction], cache: Optional[EncodingCache] = None,
+                key: Optional[str] = None, exact: bool = False) -> Tuple[Simulation, bool]:
+    """
+    Loads the encoding from the cache, or encodes the instructions into a new session (and stores it in the cache)
+    :param exact: use the exact Clifford+T encoding (see ExactComplex)
+    :return: the session, and whether it was loaded from the cache
+    """
+    if cache is not None:
+        session = cache.load(key)
+        if session is not None:
+            return session, True
+    session = Simulation(exact=exact)
+    encode_instructions(session, instructions)
+    if cache is not None:
+        cache.store(key, session)
+    return session, False
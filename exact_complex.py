@@ -0,0 +1,269 @@
+import cmath
+from math import sqrt
+from typing import Any, List, Optional, Tuple
+
+import z3
+from simulation import Simulation
+from static_solver import StaticSolver
+from symbolic_complex import SymbolicComplex
+from settings import EXPRESSION_DAG, MAX_EXPRESSION_SIZE
+
+# w = e^(i pi/4), w^4 = -1. Elements of the ring are (c0 + c1 w + c2 w^2 + c3 w^3) / sqrt(2)^k with integer
+# coefficients, the powers of w are a basis so the coefficients of an element are unique for a given k
+OMEGA_POWERS = 4
+OMEGA = cmath.exp(1j * cmath.pi / 4)
+# sqrt(2) = w - w^3
+SQRT2 = (0, 1, 0, -1)
+# largest power of sqrt(2) tried when a python scalar is converted, and the largest coefficient
+MAX_SCALAR_EXPONENT = 4
+MAX_SCALAR_COEFFICIENT = 8
+TOLERANCE = 1e-9
+
+# a coefficient is a python int (known at encoding time) or a z3 Int expression
+Coefficient = Any
+
+
+def is_zero(coefficient: Coefficient) -> bool:
+    return isinstance(coefficient, int) and coefficient == 0
+
+
+def accumulate(total: Coefficient, factor: int, term: Coefficient) -> Coefficient:
+    """
+    :return: total + factor * term, python ints are folded and zeros are dropped
+    """
+    if factor == 0 or is_zero(term):
+        return total
+    if isinstance(term, int):
+        summand = factor * term
+    elif factor == 1:
+        summand = term
+    elif factor == -1:
+        summand = -term
+    else:
+        summand = factor * term
+    if is_zero(total):
+        return summand
+    return total + summand
+
+
+def multiply(a: List[Coefficient], b: List[Coefficient]) -> List[Coefficient]:
+    # product of polynomials in w modulo w^4 = -1
+    answer: List[Coefficient] = [0] * OMEGA_POWERS
+    for i in range(OMEGA_POWERS):
+        for j in range(OMEGA_POWERS):
+            if is_zero(a[i]) or is_zero(b[j]):
+                continue
+            sign = 1 if i + j < OMEGA_POWERS else -1
+            k = (i + j) % OMEGA_POWERS
+            if isinstance(a[i], int):
+                answer[k] = accumulate(answer[k], sign * a[i], b[j])
+            elif isinstance(b[j], int):
+                answer[k] = accumulate(answer[k], sign * b[j], a[i])
+            else:
+                answer[k] = accumulate(answer[k], sign, a[i] * b[j])
+    return answer
+
+
+def find_multiple(x: float) -> Optional[Tuple[int, int]]:
+    # x = a + m / sqrt(2) with integers a and m
+    for m in range(-MAX_SCALAR_COEFFICIENT, MAX_SCALAR_COEFFICIENT + 1):
+        a = x - m / sqrt(2)
+        if abs(a - round(a)) < TOLERANCE:
+            return round(a), m
+    return None
+
+
+def to_ring(c: complex) -> Tuple[Tuple[int, ...], int]:
+    """
+    :return: coefficients and exponent k of c as an element of the ring
+    """
+    c = complex(c)
+    for k in range(MAX_SCALAR_EXPONENT + 1):
+        x = c * sqrt(2) ** k
+        # real part a0 + (a1 - a3) / sqrt(2), imaginary part a2 + (a1 + a3) / sqrt(2)
+        real = find_multiple(x.real)
+        im = find_multiple(x.imag)
+        if real is None or im is None or (real[1] + im[1]) % 2 != 0:
+            continue
+        return (real[0], (real[1] + im[1]) // 2, im[0], (im[1] - real[1]) // 2), k
+    raise Exception(f"Value ({c}) is not in Z[1/sqrt(2), w], the circuit is not Clifford+T")
+
+
+class ExactComplex(object):
+    """
+    Amplitude of the exact Clifford+T encoding, (c0 + c1 w + c2 w^2 + c3 w^3) / sqrt(2)^k where the coefficients are
+    z3 Ints and the exponent k is known at encoding time. Hadamard, T, S, X, Y and Z only add integer-linear
+    constraints. It has the interface of SymbolicComplex, real/im and squared_norm are z3 Real expressions (with
+    sqrt(2)) that are only evaluated in models.
+    """
+    __slots__ = ["session", "coefficients", "exponent", "value", "size"]
+    session: Simulation
+    coefficients: List[Coefficient]
+    # None for variables that are not yet defined (see define)
+    exponent: Optional[int]
+    value: Optional[complex]
+    size: int
+
+    @staticmethod
+    def to_complex(session: Simulation, a) -> 'ExactComplex':
+        if isinstance(a, ExactComplex):
+            return a
+        return ExactComplex.from_value(session, a)
+
+    @staticmethod
+    def from_value(session: Simulation, value) -> 'ExactComplex':
+        coefficients, exponent = to_ring(value)
+        return ExactComplex(session, None, list(coefficients), exponent)
+
+    @staticmethod
+    def from_expression(session: Simulation, prefix: str, coefficients: List[Coefficient], exponent: int,
+                        size: int) -> 'ExactComplex':
+        # as SymbolicComplex.from_expression
+        name = f"{prefix}_{session.local_counter}"
+        session.local_counter += 1
+        answer = ExactComplex(session, None, coefficients, exponent, size)
+        if answer.is_constant() or (EXPRESSION_DAG and size <= MAX_EXPRESSION_SIZE):
+            return answer
+        variable = ExactComplex(session, name)
+        session.real_count += 2
+        StaticSolver.add(session, variable.define(answer))
+        return variable
+
+    def __init__(self, session: Simulation, name: Optional[str], coefficients: List[Coefficient] = None,
+                 exponent: Optional[int] = None, size: int = 1):
+        self.session = session
+        self.size = size
+        if name is not None:
+            self.coefficients = [z3.Int(f"w{power}_{name}", session.context) for power in range(OMEGA_POWERS)]
+            self.exponent = None
+        else:
+            self.coefficients = coefficients
+            self.exponent = exponent
+        self.value = None
+        if self.is_constant():
+            self.value = sum(coefficient * OMEGA ** power for (power, coefficient) in enumerate(self.coefficients))
+            self.value /= sqrt(2) ** self.exponent
+
+    def is_constant(self) -> bool:
+        return all(isinstance(coefficient, int) for coefficient in self.coefficients)
+
+    def is_zero(self) -> bool:
+        return all(is_zero(coefficient) for coefficient in self.coefficients)
+
+    def get_aligned(self, exponent: int) -> List[Coefficient]:
+        # the same element with a larger power of sqrt(2) in the denominator
+        coefficients = self.coefficients
+        for _ in range(exponent - self.exponent):
+            coefficients = multiply(coefficients, list(SQRT2))
+        return coefficients
+
+    def define(self, amplitude: 'ExactComplex') -> z3.BoolRef:
+        """
+        :return: constraint that defines this variable as the amplitude, the variable takes its exponent
+        """
+        self.exponent = amplitude.exponent
+        return self == amplitude
+
+    def conjugate(self) -> 'ExactComplex':
+        # conj(w) = -w^3
+        c0, c1, c2, c3 = self.coefficients
+        return ExactComplex.from_expression(self.session, "conj", [c0, accumulate(0, -1, c3), accumulate(0, -1, c2),
+                                                                   accumulate(0, -1, c1)], self.exponent, self.size + 1)
+
+    def combine(self, other: 'ExactComplex', sign: int, prefix: str) -> 'ExactComplex':
+        if other.is_zero():
+            return self
+        if self.is_zero() and sign == 1:
+            return other
+        exponent = max(self.exponent, other.exponent)
+        coefficients = [accumulate(a, sign, b) for (a, b) in zip(self.get_aligned(exponent),
+                                                                  other.get_aligned(exponent))]
+        return ExactComplex.from_expression(self.session, prefix, coefficients, exponent, self.size + other.size + 1)
+
+    def __add__(self, other) -> 'ExactComplex':
+        return self.combine(ExactComplex.to_complex(self.session, other), 1, "add")
+
+    def __sub__(self, other) -> 'ExactComplex':
+        return self.combine(ExactComplex.to_complex(self.session, other), -1, "sub")
+
+    def __eq__(self, other) -> z3.BoolRef:
+        other = ExactComplex.to_complex(self.session, other)
+        exponent = max(self.exponent, other.exponent)
+        return z3.And([a == b for (a, b) in zip(self.get_aligned(exponent), other.get_aligned(exponent))])
+
+    def scale(self, c: complex) -> 'ExactComplex':
+        return self.__mul__(ExactComplex.from_value(self.session, c))
+
+    def __mul__(self, other) -> 'ExactComplex':
+        other = ExactComplex.to_complex(self.session, other)
+        if other.is_zero() or self.is_zero():
+            return ExactComplex.from_value(self.session, 0)
+        if other.is_constant() and other.value == 1:
+            return self
+        if self.is_constant() and self.value == 1:
+            return other
+        return ExactComplex.from_expression(self.session, "mul", multiply(self.coefficients, other.coefficients),
+                                            self.exponent + other.exponent, self.size + other.size + 1)
+
+    def __truediv__(self, other) -> 'ExactComplex':
+        # only divisions by scalars whose inverse is in the ring (e.g. sqrt(2) in the hadamard gate)
+        if isinstance(other, ExactComplex):
+            raise Exception("Division by an amplitude is not supported by the exact encoding")
+        return self.scale(1 / complex(other))
+
+    def get_real(self, a: Coefficient) -> z3.ArithRef:
+        if isinstance(a, int):
+            return z3.RealVal(a, self.session.context)
+        return z3.ToReal(a)
+
+    def get_denominator(self, exponent: int) -> z3.ArithRef:
+        # 1 / sqrt(2)^exponent
+        answer = z3.RealVal(1, self.session.context) / z3.RealVal(2 ** (exponent // 2), self.session.context)
+        if exponent % 2 == 1:
+            answer = answer / z3.Sqrt(z3.RealVal(2, self.session.context), self.session.context)
+        return answer
+
+    def get_part(self, rational: Coefficient, first: Coefficient, second: Coefficient, sign: int) -> z3.ArithRef:
+        # (rational + (first + sign * second) / sqrt(2)) / sqrt(2)^k
+        irrational = accumulate(first, sign, second)
+        return (self.get_real(rational) + self.get_real(irrational) * self.get_denominator(1)) \
+            * self.get_denominator(self.exponent)
+
+    @property
+    def real(self) -> z3.ArithRef:
+        c0, c1, c2, c3 = self.coefficients
+        return self.get_part(c0, c1, c3, -1)
+
+    @property
+    def im(self) -> z3.ArithRef:
+        c0, c1, c2, c3 = self.coefficients
+        return self.get_part(c2, c1, c3, 1)
+
+    def squared_norm(self) -> z3.ArithRef:
+        # x * conj(x) is real: (p0 + (p1 - p3) / sqrt(2)) / 2^k
+        conj_coefficients = [self.coefficients[0]] + [accumulate(0, -1, c) for c in reversed(self.coefficients[1:])]
+        p0, p1, p2, p3 = multiply(self.coefficients, conj_coefficients)
+        return (self.get_real(p0) + self.get_real(accumulate(p1, -1, p3)) * self.get_denominator(1)) \
+            * self.get_denominator(2 * self.exponent)
+
+    @staticmethod
+    def select(condition: z3.BoolRef, then_value: 'ExactComplex', else_value: 'ExactComplex') -> 'ExactComplex':
+        if then_value is else_value or (then_value.is_constant() and else_value.is_constant()
+                                        and abs(then_value.value - else_value.value) < TOLERANCE):
+            return then_value
+        exponent = max(then_value.exponent, else_value.exponent)
+        coefficients = []
+        for (a, b) in zip(then_value.get_aligned(exponent), else_value.get_aligned(exponent)):
+            if isinstance(a, int) and isinstance(b, int) and a == b:
+                coefficients.append(a)
+            else:
+                coefficients.append(z3.If(condition, a, b))
+        return ExactComplex.from_expression(then_value.session, "if", coefficients, exponent,
+                                            then_value.size + else_value.size + 1)
+
+
+def get_complex_class(session: Simulation):
+    """
+    :return: class of the amplitudes of the session, ExactComplex for the exact Clifford+T encoding
+    """
+    return ExactComplex if session.exact else SymbolicComplex
@@ -0,0 +1,119 @@
+import cmath
+from math import sqrt, e, pi, cos, sin
+from typing import Callable, Dict, Tuple
+
+import numpy as np
+from settings import *
+
+# entries smaller than this are set to 0, so that diagonal and permutation matrices are recognized by the encoders
+EPSILON = 1e-12
+
+# single qubit gates
+X_MATRIX = np.array([[0, 1], [1, 0]], dtype=np.complex128)
+H_MATRIX = np.array([[1, 1], [1, -1]], dtype=np.complex128) / sqrt(2)
+Y_MATRIX = np.array([[0, -1j], [1j, 0]], dtype=np.complex128)
+Z_MATRIX = np.array([[1, 0], [0, -1]], dtype=np.complex128)
+I_MATRIX = np.eye(2, dtype=np.complex128)
+T_MATRIX = np.array([[1, 0], [0, complex(e, 0) ** complex(0, pi / 4)]], dtype=np.complex128)
+TDG_MATRIX = np.array([[1, 0], [0, complex(e, 0) ** complex(0, -pi / 4)]], dtype=np.complex128)
+S_MATRIX = np.array([[1, 0], [0, 1j]], dtype=np.complex128)
+SDG_MATRIX = np.array([[1, 0], [0, -1j]], dtype=np.complex128)
+
+
+def controlled(matrix: np.ndarray, controls: int) -> np.ndarray:
+    """
+    Builds the matrix of a gate controlled by `controls` qubits
+    :param matrix: (2^k x 2^k) matrix of the target operation
+    :param controls: number of control qubits (the first arguments of the gate)
+    :return: (2^(controls + k) x 2^(controls + k)) matrix
+    """
+    size = (2 ** controls) * matrix.shape[0]
+    answer = np.eye(size, dtype=np.complex128)
+    answer[size - matrix.shape[0]:, size - matrix.shape[0]:] = matrix
+    return answer
+
+
+def clean(matrix: np.ndarray) -> np.ndarray:
+    matrix[np.abs(matrix) < EPSILON] = 0
+    return matrix
+
+
+def u3_matrix(theta: float, phi: float, lam: float) -> np.ndarray:
+    # U(theta, phi, lambda) of OpenQASM 2, as defined by qiskit
+    return clean(np.array([[cos(theta / 2), -cmath.exp(1j * lam) * sin(theta / 2)],
+                           [cmath.exp(1j * phi) * sin(theta / 2), cmath.exp(1j * (phi + lam)) * cos(theta / 2)]],
+                          dtype=np.complex128))
+
+
+def u1_matrix(lam: float) -> np.ndarray:
+    return clean(np.array([[1, 0], [0, cmath.exp(1j * lam)]], dtype=np.complex128))
+
+
+SWAP_MATRIX = np.array([[1, 0, 0, 0],
+                        [0, 0, 1, 0],
+                        [0, 1, 0, 0],
+                        [0, 0, 0, 1]], dtype=np.complex128)
+CX_MATRIX = controlled(X_MATRIX, 1)
+CZ_MATRIX = controlled(Z_MATRIX, 1)
+CCX_MATRIX = controlled(X_MATRIX, 2)
+CSWAP_MATRIX = controlled(SWAP_MATRIX, 1)
+
+GATE_MATRICES: Dict[str, np.ndarray] = {
+    X: X_MATRIX,
+    H: H_MATRIX,
+    Y: Y_MATRIX,
+    Z: Z_MATRIX,
+    I: I_MATRIX,
+    T: T_MATRIX,
+    TDG: TDG_MATRIX,
+    S: S_MATRIX,
+    SDG: SDG_MATRIX,
+    CX: CX_MATRIX,
+    CZ: CZ_MATRIX,
+    CCX: CCX_MATRIX,
+    SWAP: SWAP_MATRIX,
+    CSWAP: CSWAP_MATRIX,
+}
+
+# parametric gates as in qelib1.inc, from their parameters to their matrix
+PARAMETRIC_MATRICES: Dict[str, Callable[..., np.ndarray]] = {
+    U1: u1_matrix,
+    U2: lambda phi, lam: u3_matrix(pi / 2, phi, lam),
+    U3: u3_matrix,
+    RX: lambda theta: u3_matrix(theta, -pi / 2, pi / 2),
+    RY: lambda theta: u3_matrix(theta, 0, 0),
+    RZ: u1_matrix,
+    CU1: lambda lam: controlled(u1_matrix(lam), 1),
+}
+
+# single qubit operation applied on the target (the last qubit) of each controlled gate
+CONTROLLED_TARGETS: Dict[str, Callable[..., np.ndarray]] = {
+    CX: lambda: X_MATRIX,
+    CCX: lambda: X_MATRIX,
+    MCX: lambda: X_MATRIX,
+    CZ: lambda: Z_MATRIX,
+    CU1: u1_matrix,
+}
+
+
+def get_matrix(name: str, params: Tuple[float, ...] = (), qubits: int = 1) -> np.ndarray:
+    """
+    :param qubits: number of qubits the gate is applied to, it is only used by MCX
+    :return: (2^qubits x 2^qubits) matrix of the gate, the first qubit is the most significant one
+    """
+    if name == MCX:
+        return controlled(X_MATRIX, qubits - 1)
+    if name in PARAMETRIC_MATRICES.keys():
+        return PARAMETRIC_MATRICES[name](*params)
+    if name in GATE_MATRICES.keys():
+        return GATE_MATRICES[name]
+    raise Exception(f"Gate ({name}) not implemented")
+
+
+def get_target_matrix(name: str, params: Tuple[float, ...] = ()) -> np.ndarray:
+    """
+    :return: 2x2 matrix applied on the target of a controlled gate when all its controls are 1
+    """
+    if name not in CONTROLLED_TARGETS.keys():
+        raise Exception(f"Gate ({name}) is not a controlled gate")
+    return CONTROLLED_TARGETS[name](*params)
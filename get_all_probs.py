@@ -1,10 +1,19 @@
+import argparse
+import atexit
+import json
 import sys
-from qiskit import QuantumCircuit
 from z3quantum_gate import *
 from static_solver import StaticSolver
+from circuit import load_instructions, simulate_instructions, simulate_stabilizer, is_clifford, iter_variants
+from peephole import PeepholeOptimizer
+from profiler import Profiler
+from lightcone import get_light_cone, get_qubit_name, marginalize
+from encoding_cache import EncodingCache, get_session
+from clusters import solve_clusters, combine
+from parallel import get_state_probabilities, get_parallel_amplitudes
+from sweep import iter_sweep
 import warnings
-from utils import build_state
-from z3 import Real
+from utils import build_state, iter_prefix_order, get_amplitudes
 
 # https://ericpony.github.io/z3py-tutorial/guide-examples.htm
 
@@ -13,47 +22,207 @@ warnings.filterwarnings('ignore', category=DeprecationWarning)  # DeprecationWar
 # deprecated. Instead, inspect Registers to find
 # their contained Bits.
 
-input_file = sys.argv[1]  # path to OpenQASM file
-
-# create quantum circuit from OpenQASM file
-qc = QuantumCircuit.from_qasm_file(input_file)
-
-StaticSolver.add_constants()
-vars = []
-
-# create necessary qubits
-for instruction in qc.data:
-    qubits = instruction.qubits
-    for qubit in qubits:
-        register_name = qubit.register.name
-        qubit_index = qubit.index
-        name = f"{register_name}_{qubit_index}"
-        Z3QuantumGate.mapping[name] = Z3Qubit(name)
-        if name not in vars:
-            vars.append(name)
-
-# apply gates
-for instruction in qc.data:
-    op = instruction.operation.name
-    args = []
-    qubits = instruction.qubits
-    for qubit in qubits:
-        register_name = qubit.register.name
-        qubit_index = qubit.index
-        name = f"{register_name}_{qubit_index}"
-        args.append(name)
-
-    Z3QuantumGate(op, args).execute()
-
-# objective_function = StaticSolver.get_objective_function(Z3QuantumGate.mapping)
-# print(objective_function)
-
-# y = Real("y")
-# StaticSolver.solver.add(y == objective_function)
-vars.sort()
-for i in range(2**len(vars)):
-    state = build_state(vars, i)
-    StaticSolver.get_state_probability(state, Z3QuantumGate.mapping)
-
-# state = build_state(vars, 9)
-# StaticSolver.get_state_probability(state, Z3QuantumGate.mapping, y)
\ No newline at end of file
+parser = argparse.ArgumentParser()
+parser.add_argument("input_file", help="path to OpenQASM file")
+parser.add_argument("--backend", choices=[Z3_BACKEND, NUMPY_BACKEND, STABILIZER_BACKEND, AUTO_BACKEND],
+                    default=Z3_BACKEND,
+                    help="z3 encodes the circuit symbolically, numpy runs a dense statevector, stabilizer runs a "
+                         f"stabilizer tableau (Clifford circuits only), {AUTO_BACKEND} picks stabilizer for Clifford "
+                         "circuits and z3 otherwise")
+parser.add_argument("--frontend", choices=[QASM_FRONTEND, QISKIT_FRONTEND], default=QASM_FRONTEND,
+                    help="qasm streams the file with the built-in parser, qiskit builds a QuantumCircuit first")
+parser.add_argument("--allsat", action="store_true",
+                    help="z3 backend: only visit the reachable states by enumerating models with blocking clauses "
+                         "(stabilizer backend: by branching on the random measurement outcomes)")
+parser.add_argument("--workers", type=int, default=1,
+                    help="z3 backend: evaluate the basis states in this many processes")
+parser.add_argument("--amplitudes", action="store_true",
+                    help="z3 backend: print the amplitude of every basis state instead of its probability")
+parser.add_argument("--clusters", action="store_true",
+                    help="z3 backend: solve the groups of qubits that never interact in separate processes (--workers "
+                         "of them at a time) and print the product of their distributions")
+parser.add_argument("--optimize", action="store_true",
+                    help="cancel inverse gate pairs, merge phase gates and drop identities before simulating")
+parser.add_argument("--qubits", nargs="+", default=None, metavar="QUBIT",
+                    help="only query these qubits (q[0] or q_0), only the gates in their backward light cone are "
+                         "simulated")
+parser.add_argument("--exact", action="store_true",
+                    help="z3 backend: exact encoding of Clifford+T circuits, amplitudes are integer combinations of "
+                         "the powers of e^(i pi/4) over a power of sqrt(2)")
+parser.add_argument("--cache", nargs="?", const=ENCODING_CACHE_DIR, default=None, metavar="DIR",
+                    help="z3 backend: reuse the encoding of the circuit stored in this directory, or store it there "
+                         f"(default {ENCODING_CACHE_DIR})")
+parser.add_argument("--variants", nargs="+", default=None, metavar="SUFFIX",
+                    help="z3 backend: input_file is a prefix shared by a family of circuits, it is encoded once and "
+                         "each of these OpenQASM files is appended to it in its own solver scope and queried")
+parser.add_argument("--sweep", default=None, metavar="POINTS",
+                    help="z3 backend: JSON file with a list of points ({parameter: radians}), the angles of input_file "
+                         "may use these parameters. The circuit is encoded once and queried at every point (--workers "
+                         "of them at a time)")
+parser.add_argument("--profile", default=None, metavar="REPORT",
+                    help="z3 backend: time every gate and solver query, write the JSON report to this file")
+parser.add_argument("--profile-top", type=int, default=10,
+                    help="number of gates and checks shown in the profile summary")
+cli_args = parser.parse_args()
+if cli_args.variants is not None and (cli_args.backend not in [Z3_BACKEND, AUTO_BACKEND] or cli_args.clusters
+                                      or cli_args.cache is not None or cli_args.workers > 1
+                                      or cli_args.qubits is not None):
+    parser.error("--variants only works with the z3 backend, without --clusters, --cache, --workers and --qubits")
+if cli_args.amplitudes and (cli_args.backend not in [Z3_BACKEND, AUTO_BACKEND] or cli_args.allsat or cli_args.clusters
+                            or cli_args.qubits is not None or cli_args.sweep is not None):
+    parser.error("--amplitudes only works with the z3 backend, without --allsat, --clusters, --qubits and --sweep")
+if cli_args.sweep is not None and (cli_args.backend not in [Z3_BACKEND, AUTO_BACKEND] or cli_args.clusters
+                                   or cli_args.cache is not None or cli_args.variants is not None
+                                   or cli_args.exact):
+    parser.error("--sweep only works with the z3 backend, without --clusters, --cache, --variants and --exact")
+
+if cli_args.profile is not None:
+    def report_profile():
+        Profiler.write_report(cli_args.profile)
+        print(Profiler.get_summary(cli_args.profile_top), file=sys.stderr)
+
+    Profiler.enable()
+    # the report is written however the script exits
+    atexit.register(report_profile)
+
+points = []
+if cli_args.sweep is not None:
+    with open(cli_args.sweep) as file:
+        points = json.load(file)
+# the parameters of the sweep are free in the angles of the circuit
+parameters = sorted({name for point in points for name in point.keys()})
+
+# instructions are read lazily from the OpenQASM file
+instructions = load_instructions(cli_args.input_file, cli_args.frontend, parameters)
+optimizer = PeepholeOptimizer()
+if cli_args.optimize:
+    instructions = optimizer.optimize(instructions)
+targets = None
+if cli_args.qubits is not None:
+    # the gates that cannot reach the queried qubits are dropped before simulating
+    targets = sorted(get_qubit_name(qubit) for qubit in cli_args.qubits)
+    instructions = get_light_cone(instructions, targets)
+
+backend = cli_args.backend
+if cli_args.variants is not None or cli_args.sweep is not None:
+    # the suffixes and the symbolic angles are not known to the other backends
+    backend = Z3_BACKEND
+if backend == AUTO_BACKEND:
+    # the instructions are read before simulating, to find a gate outside CLIFFORD_GATES
+    instructions = list(instructions)
+    backend = STABILIZER_BACKEND if is_clifford(instructions) else Z3_BACKEND
+
+if backend == NUMPY_BACKEND:
+    simulator = simulate_instructions(instructions)
+    if cli_args.optimize:
+        print(optimizer.stats, file=sys.stderr)
+    # qubits that are not queried are summed out
+    vars = list(simulator.qubits) if targets is None else list(targets)
+    vars.sort()
+    for i in range(2**len(vars)):
+        state = build_state(vars, i)
+        print(state, round(simulator.get_state_probability(state), 3))
+    sys.exit(0)
+
+if backend == STABILIZER_BACKEND:
+    tableau = simulate_stabilizer(instructions)
+    if cli_args.optimize:
+        print(optimizer.stats, file=sys.stderr)
+    vars = list(tableau.qubits) if targets is None else list(targets)
+    vars.sort()
+    if cli_args.allsat:
+        # the support is enumerated by branching on the random measurement outcomes
+        for (state, probability) in tableau.iter_support(vars):
+            print(state, round(probability, 3))
+    else:
+        for i in range(2**len(vars)):
+            state = build_state(vars, i)
+            print(state, round(tableau.get_state_probability(state), 3))
+    sys.exit(0)
+
+if cli_args.clusters:
+    distributions = solve_clusters(instructions, cli_args.workers, cli_args.exact)
+    if cli_args.optimize:
+        print(optimizer.stats, file=sys.stderr)
+    # only the reachable states of each cluster are combined
+    distribution = combine(distributions)
+    if targets is not None:
+        distribution = marginalize(distribution, targets)
+    for (state, probability) in distribution:
+        print(state, round(probability, 3))
+    sys.exit(0)
+
+# create the qubits and apply the gates
+cache = None
+cache_key = None
+if cli_args.cache is not None:
+    cache = EncodingCache(cli_args.cache)
+    cache_key = EncodingCache.get_key(cli_args.input_file,
+                                      [cli_args.frontend, cli_args.optimize, targets, cli_args.exact])
+session, is_cached = get_session(instructions, cache, cache_key, cli_args.exact)
+if is_cached:
+    print(f"encoding loaded from {cli_args.cache}", file=sys.stderr)
+elif cli_args.optimize:
+    print(optimizer.stats, file=sys.stderr)
+
+
+def print_probabilities(session: Simulation) -> None:
+    vars = list(session.mapping.keys()) if targets is None else list(targets)
+    # the probability of a partial state is the marginal of its qubits
+    mapping = {var_name: session.mapping[var_name] for var_name in vars}
+
+    # objective_function = StaticSolver.get_objective_function(session, session.mapping)
+    # print(objective_function)
+
+    # y = Real("y")
+    # StaticSolver.add(session, y == objective_function)
+    vars.sort()
+    if cli_args.amplitudes:
+        if cli_args.workers > 1:
+            amplitudes = get_parallel_amplitudes(session, vars, cli_args.workers)
+        else:
+            amplitudes = get_amplitudes(session, mapping, vars)
+        for (i, amplitude) in enumerate(amplitudes):
+            print(build_state(vars, i), amplitude)
+        return
+
+    if cli_args.allsat:
+        # each reachable state is printed as soon as the solver finds it
+        for state in StaticSolver.iter_reachable_states(session, mapping):
+            StaticSolver.get_state_probability(session, state, session.mapping)
+        return
+
+    if cli_args.workers > 1:
+        for (state, probability) in get_state_probabilities(session, vars, cli_args.workers):
+            if probability is None:
+                print("solver timeout")
+            else:
+                print(state, probability)
+        return
+
+    # consecutive states share a prefix, its checks are reused from the memo of the session
+    for i in iter_prefix_order(len(vars)):
+        state = build_state(vars, i)
+        StaticSolver.get_state_probability(session, state, session.mapping)
+
+    # state = build_state(vars, 9)
+    # StaticSolver.get_state_probability(session, state, session.mapping, y)
+
+
+if cli_args.sweep is not None:
+    # the angles of each point are assumed by the queries, the encoding is shared by all of them
+    for (point, distribution) in iter_sweep(session, points, targets, cli_args.workers):
+        print(f"# {json.dumps(point)}")
+        for (state, probability) in distribution:
+            print(state, round(probability, 3))
+elif cli_args.variants is None:
+    print_probabilities(session)
+else:
+    suffixes = []
+    for path in cli_args.variants:
+        suffix = load_instructions(path, cli_args.frontend)
+        suffixes.append(optimizer.optimize(suffix) if cli_args.optimize else suffix)
+    # the prefix is encoded once, each suffix is removed before the next one is encoded
+    for (path, variant) in zip(cli_args.variants, iter_variants(session, suffixes)):
+        print(f"# {path}")
+        print_probabilities(variant)
@@ -1,13 +1,39 @@
+from typing import Dict, List, Tuple
+
 import numpy as np
 
 # Import Qiskit
 from qiskit import QuantumCircuit, execute
 from qiskit.providers.aer import QasmSimulator
 
-qc = QuantumCircuit.from_qasm_file("./benchmarks/small/adder_n4/adder_n4.qasm")
-qc.save_statevector()
-backend = QasmSimulator()
-backend_options = {'method': 'statevector'}
-job = execute(qc, backend, backend_options=backend_options)
-job_result = job.result()
-print(len(job_result.get_statevector(qc)))
\ No newline at end of file
+
+def get_statevector(qc: QuantumCircuit):
+    qc.save_statevector()
+    backend = QasmSimulator()
+    backend_options = {'method': 'statevector'}
+    job = execute(qc, backend, backend_options=backend_options)
+    job_result = job.result()
+    return job_result.get_statevector(qc)
+
+
+def get_state_probabilities(input_file: str) -> List[Tuple[Dict[str, bool], float]]:
+    """
+    Reference distribution computed by Aer
+    :return: list of (state, probability) for the states with non zero probability, states map qubit names
+    (<register>_<index>) to boolean values
+    """
+    qc = QuantumCircuit.from_qasm_file(input_file)
+    qc.remove_final_measurements()
+    names = [f"{qubit.register.name}_{qubit.index}" for qubit in qc.qubits]
+    probabilities = np.abs(np.asarray(get_statevector(qc))) ** 2
+    answer = []
+    for index in np.nonzero(probabilities > 1e-12)[0]:
+        # qiskit is little endian, qubit i is bit i of the index
+        state = {name: bool((int(index) >> i) & 1) for (i, name) in enumerate(names)}
+        answer.append((state, float(probabilities[index])))
+    return answer
+
+
+if __name__ == "__main__":
+    qc = QuantumCircuit.from_qasm_file("./benchmarks/small/adder_n4/adder_n4.qasm")
+    print(len(get_statevector(qc)))
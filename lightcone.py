@@ -0,0 +1,52 @@
+import re
+from typing import Dict, Iterable, List, Tuple
+
+from qasm_parser import Instruction
+
+# qubits can be given as in OpenQASM (q[3]) or as they are named by the simulators (q_3)
+QASM_QUBIT = re.compile(r"^([A-Za-z_][A-Za-z0-9_]*)\[(\d+)\]$")
+
+
+def get_qubit_name(name: str) -> str:
+    match = QASM_QUBIT.match(name.strip())
+    if match is None:
+        return name.strip()
+    return f"{match.group(1)}_{match.group(2)}"
+
+
+def get_light_cone(instructions: Iterable[Instruction], qubits: List[str]) -> List[Instruction]:
+    """
+    Backward slice of the circuit: a gate is kept when it acts on a qubit that later interacts (directly or through
+    other kept gates) with one of the target qubits. The other gates cannot change the marginal distribution of the
+    targets. The whole instruction list is read before the first instruction is returned.
+    :param qubits: target qubits
+    :return: kept instructions, in their original order
+    """
+    instructions = list(instructions)
+    cone = set(get_qubit_name(qubit) for qubit in qubits)
+    used = set(qubit for instruction in instructions for qubit in instruction.qubits)
+    for qubit in cone:
+        if qubit not in used:
+            raise Exception(f"Qubit ({qubit}) is not used by the circuit")
+
+    answer = []
+    for instruction in reversed(instructions):
+        if any(qubit in cone for qubit in instruction.qubits):
+            answer.append(instruction)
+            cone.update(instruction.qubits)
+    answer.reverse()
+    return answer
+
+
+def marginalize(distribution: Iterable[Tuple[Dict[str, bool], float]],
+                qubits: List[str]) -> List[Tuple[Dict[str, bool], float]]:
+    """
+    :param distribution: list of (state, probability)
+    :return: distribution of the given qubits, the other qubits are summed out
+    """
+    qubits = sorted(qubits)
+    answer: Dict[Tuple[bool, ...], float] = dict()
+    for (state, probability) in distribution:
+        key = tuple(state[qubit] for qubit in qubits)
+        answer[key] = answer.get(key, 0.0) + probability
+    return [(dict(zip(qubits, key)), probability) for (key, probability) in sorted(answer.items())]
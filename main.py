@@ -1,7 +1,15 @@
+import argparse
+import atexit
 import sys
-from qiskit import QuantumCircuit
 from z3quantum_gate import *
 from static_solver import StaticSolver
+from circuit import load_instructions, simulate_instructions, simulate_stabilizer, is_clifford
+from peephole import PeepholeOptimizer
+from profiler import Profiler
+from lightcone import get_light_cone, get_qubit_name, marginalize
+from encoding_cache import EncodingCache, get_session
+from portfolio import CONFIGURATIONS, AUTO, race, log_race, get_features, select_configuration
+from clusters import solve_clusters, combine, get_highest_prob
 import warnings
 
 # https://ericpony.github.io/z3py-tutorial/guide-examples.htm
@@ -11,43 +19,156 @@ warnings.filterwarnings('ignore', category=DeprecationWarning)  # DeprecationWar
 # deprecated. Instead, inspect Registers to find
 # their contained Bits.
 
-input_file = sys.argv[1]  # path to OpenQASM file
+parser = argparse.ArgumentParser()
+parser.add_argument("input_file", help="path to OpenQASM file")
+parser.add_argument("--backend", choices=[Z3_BACKEND, NUMPY_BACKEND, STABILIZER_BACKEND, AUTO_BACKEND],
+                    default=Z3_BACKEND,
+                    help="z3 encodes the circuit symbolically, numpy runs a dense statevector, stabilizer runs a "
+                         f"stabilizer tableau (Clifford circuits only), {AUTO_BACKEND} picks stabilizer for Clifford "
+                         "circuits and z3 otherwise")
+parser.add_argument("--frontend", choices=[QASM_FRONTEND, QISKIT_FRONTEND], default=QASM_FRONTEND,
+                    help="qasm streams the file with the built-in parser, qiskit builds a QuantumCircuit first")
+parser.add_argument("--shots", type=int, default=None,
+                    help="print a histogram of this many measurements instead of the most likely state")
+parser.add_argument("--top", type=int, default=None, metavar="K",
+                    help="z3 backend: print the K most likely states, found by a best-first search over the qubit "
+                         "values")
+parser.add_argument("--optimize", action="store_true",
+                    help="cancel inverse gate pairs, merge phase gates and drop identities before simulating")
+parser.add_argument("--clusters", action="store_true",
+                    help="z3 backend: solve the groups of qubits that never interact in separate processes")
+parser.add_argument("--workers", type=int, default=1, help="number of processes used by --clusters")
+parser.add_argument("--qubits", nargs="+", default=None, metavar="QUBIT",
+                    help="only query these qubits (q[0] or q_0), only the gates in their backward light cone are "
+                         "simulated")
+parser.add_argument("--exact", action="store_true",
+                    help="z3 backend: exact encoding of Clifford+T circuits, amplitudes are integer combinations of "
+                         "the powers of e^(i pi/4) over a power of sqrt(2)")
+parser.add_argument("--cache", nargs="?", const=ENCODING_CACHE_DIR, default=None, metavar="DIR",
+                    help="z3 backend: reuse the encoding of the circuit stored in this directory, or store it there "
+                         f"(default {ENCODING_CACHE_DIR})")
+parser.add_argument("--portfolio", nargs="*", default=None, choices=list(CONFIGURATIONS.keys()) + [AUTO],
+                    metavar="CONFIGURATION",
+                    help="z3 backend: race the most likely state query with these solver configurations (all of "
+                         f"them by default) in separate processes and log the winner in --portfolio-log. {AUTO} runs "
+                         "the configuration that won on the most similar logged circuits. Configurations: "
+                         f"{', '.join(CONFIGURATIONS.keys())}")
+parser.add_argument("--portfolio-log", default=PORTFOLIO_LOG, metavar="PATH",
+                    help=f"log of the portfolio races read by {AUTO} (default {PORTFOLIO_LOG})")
+parser.add_argument("--profile", default=None, metavar="REPORT",
+                    help="z3 backend: time every gate and solver query, write the JSON report to this file")
+parser.add_argument("--profile-top", type=int, default=10,
+                    help="number of gates and checks shown in the profile summary")
+cli_args = parser.parse_args()
+if cli_args.clusters and cli_args.shots is not None:
+    parser.error("--shots is not supported with --clusters")
+if cli_args.top is not None and (cli_args.backend not in [Z3_BACKEND, AUTO_BACKEND] or cli_args.clusters
+                                 or cli_args.shots is not None or cli_args.portfolio is not None):
+    parser.error("--top only works with the z3 backend, without --clusters, --shots and --portfolio")
 
-# create quantum circuit from OpenQASM file
-qc = QuantumCircuit.from_qasm_file(input_file)
+if cli_args.profile is not None:
+    def report_profile():
+        Profiler.write_report(cli_args.profile)
+        print(Profiler.get_summary(cli_args.profile_top), file=sys.stderr)
 
-StaticSolver.add_constants()
+    Profiler.enable()
+    # the report is written however the script exits
+    atexit.register(report_profile)
 
-# create necessary qubits
-for instruction in qc.data:
-    qubits = instruction.qubits
-    for qubit in qubits:
-        register_name = qubit.register.name
-        qubit_index = qubit.index
-        name = f"{register_name}_{qubit_index}"
-        Z3QuantumGate.mapping[name] = Z3Qubit(name)
+# instructions are read lazily from the OpenQASM file
+instructions = load_instructions(cli_args.input_file, cli_args.frontend)
+optimizer = PeepholeOptimizer()
+if cli_args.optimize:
+    instructions = optimizer.optimize(instructions)
+targets = None
+if cli_args.qubits is not None:
+    # the gates that cannot reach the queried qubits are dropped before simulating
+    targets = sorted(get_qubit_name(qubit) for qubit in cli_args.qubits)
+    instructions = get_light_cone(instructions, targets)
 
-# apply gates
-for instruction in qc.data:
-    op = instruction.operation.name
-    args = []
-    qubits = instruction.qubits
-    for qubit in qubits:
-        register_name = qubit.register.name
-        qubit_index = qubit.index
-        name = f"{register_name}_{qubit_index}"
-        args.append(name)
+backend = cli_args.backend
+if cli_args.top is not None:
+    backend = Z3_BACKEND
+if backend == AUTO_BACKEND:
+    # the instructions are read before simulating, to find a gate outside CLIFFORD_GATES
+    instructions = list(instructions)
+    backend = STABILIZER_BACKEND if is_clifford(instructions) else Z3_BACKEND
 
-    Z3QuantumGate(op, args).execute()
-# print(Z3QuantumGate.measure())
+if backend == NUMPY_BACKEND:
+    simulator = simulate_instructions(instructions)
+    if cli_args.optimize:
+        print(optimizer.stats, file=sys.stderr)
+    if cli_args.shots is not None:
+        print(simulator.get_counts(cli_args.shots, targets))
+    else:
+        print(simulator.get_highest_prob(targets))
+    sys.exit(0)
 
-print(StaticSolver.get_highest_prob(Z3QuantumGate.mapping))
+if backend == STABILIZER_BACKEND:
+    tableau = simulate_stabilizer(instructions)
+    if cli_args.optimize:
+        print(optimizer.stats, file=sys.stderr)
+    if cli_args.shots is not None:
+        print(tableau.get_counts(cli_args.shots, targets))
+    else:
+        print(tableau.get_highest_prob(targets))
+    sys.exit(0)
+
+if cli_args.clusters:
+    distributions = solve_clusters(instructions, cli_args.workers, cli_args.exact)
+    if cli_args.optimize:
+        print(optimizer.stats, file=sys.stderr)
+    if targets is None:
+        print(get_highest_prob(distributions))
+    else:
+        state, probability = max(marginalize(combine(distributions), targets), key=lambda item: item[1])
+        print((round(probability, 3), state))
+    sys.exit(0)
+
+# create the qubits and apply the gates
+cache = None
+cache_key = None
+if cli_args.cache is not None:
+    cache = EncodingCache(cli_args.cache)
+    cache_key = EncodingCache.get_key(cli_args.input_file,
+                                      [cli_args.frontend, cli_args.optimize, targets, cli_args.exact])
+session, is_cached = get_session(instructions, cache, cache_key, cli_args.exact)
+if is_cached:
+    print(f"encoding loaded from {cli_args.cache}", file=sys.stderr)
+elif cli_args.optimize:
+    print(optimizer.stats, file=sys.stderr)
+
+if cli_args.shots is not None:
+    print(Z3QuantumGate.measure(session, shots=cli_args.shots, qubits=targets))
+    sys.exit(0)
+
+# qubits that are not queried are summed out
+mapping = session.mapping if targets is None else {name: session.mapping[name] for name in targets}
+if cli_args.portfolio is not None:
+    features = get_features(session)
+    configurations = cli_args.portfolio if len(cli_args.portfolio) > 0 else list(CONFIGURATIONS.keys())
+    configurations = [select_configuration(features, cli_args.portfolio_log) if configuration == AUTO
+                      else configuration for configuration in configurations]
+    answer = race(session, list(dict.fromkeys(configurations)), targets=sorted(mapping.keys()))
+    log_race(cli_args.input_file, features, answer, cli_args.portfolio_log)
+    if answer["winner"] is None:
+        raise Exception("No solver configuration answered")
+    print(f"{answer['winner']} won in {answer['time']:.3f}s", file=sys.stderr)
+    # the same output as without --portfolio
+    print("unsat" if answer["state"] is None else (round(answer["probability"], 3), answer["state"]))
+    sys.exit(0)
+if cli_args.top is not None:
+    for (probability, state) in StaticSolver.get_top_k(session, mapping, cli_args.top):
+        print(round(probability, 3), state)
+    sys.exit(0)
+
+print(StaticSolver.get_highest_prob(session, mapping))
 
 # state = {'q_0': False, 'q_1': False}
-# print("|00>: ",get_state_amplitude(Z3QuantumGate.mapping, state)**2)
+# print("|00>: ",get_state_amplitude(session, session.mapping, state)**2)
 # state = {'q_0': True, 'q_1': False}
-# print("|10>: ", get_state_amplitude(Z3QuantumGate.mapping, state)**2)
+# print("|10>: ", get_state_amplitude(session, session.mapping, state)**2)
 # state = {'q_0': False, 'q_1': True}
-# print("|01>: ", get_state_amplitude(Z3QuantumGate.mapping, state)**2)
+# print("|01>: ", get_state_amplitude(session, session.mapping, state)**2)
 # state = {'q_0': True, 'q_1': True}
-# print("|11>: ", get_state_amplitude(Z3QuantumGate.mapping, state)**2)
+# print("|11>: ", get_state_amplitude(session, session.mapping, state)**2)
@@ -0,0 +1,91 @@
+from random import random
+from typing import Dict, List, Optional, Tuple
+
+from z3 import BoolRef
+from static_solver import StaticSolver
+from simulation import Simulation
+from utils import to_float
+
+
+class MeasurementTrie:
+    """
+    Prefix trie over partial assignments of the qubits, in the order of the mapping. Every node caches the
+    satisfiability checks and the branch probability of the next qubit, so shots that share a prefix reuse them
+    instead of walking the solver again.
+    """
+    session: Simulation
+    assumptions: List[BoolRef]
+    # probability of measuring 0 for the next qubit given this prefix, None until the node is expanded
+    zero_probability: Optional[float]
+    children: Dict[bool, 'MeasurementTrie']
+
+    def __init__(self, session: Simulation, assumptions: List[BoolRef]):
+        self.session = session
+        self.assumptions = assumptions
+        self.zero_probability = None
+        self.children = dict()
+
+    def get_norm(self, z3qubit, value: bool) -> float:
+        # evaluated in the model of the (satisfiable) check of the prefix extended with the value
+        entry = StaticSolver.check_memoized(self.session,
+                                            self.assumptions + [StaticSolver.literal(z3qubit.qubit, value)])
+        amplitude = z3qubit.one_amplitude if value else z3qubit.zero_amplitude
+        return to_float(entry.evaluate(amplitude.squared_norm()))
+
+    def expand(self, var_name: str, z3qubit) -> None:
+        is_zero_sat = StaticSolver.is_value_sat(self.session, z3qubit.qubit, False, self.assumptions)
+        zero_norm = self.get_norm(z3qubit, False) if is_zero_sat else 0.0
+        is_one_sat = StaticSolver.is_value_sat(self.session, z3qubit.qubit, True, self.assumptions)
+        one_norm = self.get_norm(z3qubit, True) if is_one_sat else 0.0
+        if is_zero_sat is None or is_one_sat is None:
+            raise Exception("SAT solver timeout")
+        if not is_zero_sat and not is_one_sat:
+            raise Exception(f"No value satisfies for {var_name}")
+
+        if is_zero_sat and is_one_sat:
+            if zero_norm + one_norm == 0:
+                self.zero_probability = 0.5
+            else:
+                self.zero_probability = zero_norm / (zero_norm + one_norm)
+        else:
+            # the qubit is entangled, its value is determined by the prefix
+            self.zero_probability = 1.0 if is_zero_sat else 0.0
+
+    def get_child(self, z3qubit, value: bool) -> 'MeasurementTrie':
+        if value not in self.children.keys():
+            self.children[value] = MeasurementTrie(self.session,
+                                                   self.assumptions + [StaticSolver.literal(z3qubit.qubit, value)])
+        return self.children[value]
+
+    def sample(self, mapping) -> Tuple[float, Dict[str, bool]]:
+        """
+        :return: the probability of the measured state, and the state itself
+        """
+        node = self
+        probability = 1.0
+        state: Dict[str, bool] = dict()
+        for (var_name, z3qubit) in mapping.items():
+            if node.zero_probability is None:
+                node.expand(var_name, z3qubit)
+            value = random() >= node.zero_probability
+            if value:
+                probability *= 1.0 - node.zero_probability
+            else:
+                probability *= node.zero_probability
+            state[var_name] = value
+            node = node.get_child(z3qubit, value)
+        return probability, state
+
+    def get_counts(self, mapping, shots: int) -> Dict[str, int]:
+        """
+        :return: histogram of the measured states. As in qiskit get_counts, the first qubit of the mapping is the
+        rightmost bit of the keys
+        """
+        var_names = list(mapping.keys())
+        var_names.reverse()
+        counts: Dict[str, int] = dict()
+        for _ in range(shots):
+            _, state = self.sample(mapping)
+            key = "".join("1" if state[var_name] else "0" for var_name in var_names)
+            counts[key] = counts.get(key, 0) + 1
+        return counts
@@ -0,0 +1,84 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from gate_matrices import get_matrix
+from settings import *
+
+
+class NumpyStatevector:
+    """
+    Dense complex128 statevector. The state is kept as a tensor with one axis of dimension 2 per qubit, so a k-qubit
+    gate is a contraction over k axes and never builds a 2^n x 2^n matrix.
+    """
+    qubits: List[str]
+    index: Dict[str, int]
+    state: np.ndarray
+
+    def __init__(self, qubits: List[str]):
+        self.qubits = list(qubits)
+        self.index = {name: i for (i, name) in enumerate(self.qubits)}
+        self.state = np.zeros((2,) * len(self.qubits), dtype=np.complex128)
+        self.state[(0,) * len(self.qubits)] = 1.0
+
+    def add_qubit(self, name: str) -> None:
+        # the new qubit is in |0>, it becomes the last axis
+        self.index[name] = len(self.qubits)
+        self.qubits.append(name)
+        self.state = np.stack([self.state, np.zeros_like(self.state)], axis=-1)
+
+    def apply_matrix(self, matrix: np.ndarray, args: List[str]) -> None:
+        k = len(args)
+        axes = [self.index[name] for name in args]
+        tensor = matrix.reshape((2,) * (2 * k))
+        # contract the input axes of the gate with the qubit axes, the output axes of the gate end up first
+        self.state = np.tensordot(tensor, self.state, axes=(list(range(k, 2 * k)), axes))
+        self.state = np.moveaxis(self.state, list(range(k)), axes)
+
+    def apply(self, op: str, args: List[str], params: Tuple[float, ...] = ()) -> None:
+        matrix = get_matrix(op, params, len(args))
+        assert (matrix.shape[0] == 2 ** len(args))
+        self.apply_matrix(matrix, args)
+
+    def get_probabilities(self) -> np.ndarray:
+        return np.abs(self.state) ** 2
+
+    def get_marginal_probabilities(self, qubits: List[str]) -> np.ndarray:
+        """
+        :return: tensor with one axis per qubit of `qubits` (in that order), the other qubits are summed out
+        """
+        axes = [self.index[name] for name in qubits]
+        others = tuple(i for i in range(len(self.qubits)) if i not in axes)
+        probabilities = self.get_probabilities().sum(axis=others)
+        # the remaining axes keep their relative order, they are permuted into the order of `qubits`
+        return np.transpose(probabilities, np.argsort(np.argsort(axes)))
+
+    def get_state_probability(self, state: Dict[str, bool]) -> float:
+        # qubits that are not in the state are summed out
+        position = tuple(int(state[name]) if name in state.keys() else slice(None) for name in self.qubits)
+        return float(np.sum(self.get_probabilities()[position]))
+
+    def get_highest_prob(self, qubits: Optional[List[str]] = None) -> Tuple[float, Dict[str, bool]]:
+        """
+        :param qubits: the most likely state of these qubits, by default of all of them
+        """
+        qubits = self.qubits if qubits is None else qubits
+        probabilities = self.get_marginal_probabilities(qubits)
+        position = np.unravel_index(np.argmax(probabilities), probabilities.shape)
+        state = {name: bool(position[i]) for (i, name) in enumerate(qubits)}
+        return round(float(probabilities[position]), 3), state
+
+    def get_counts(self, shots: int, qubits: Optional[List[str]] = None) -> Dict[str, int]:
+        """
+        :param qubits: measured qubits, by default all of them
+        :return: histogram of the measured states. As in qiskit get_counts, the first qubit is the rightmost bit of the
+        keys
+        """
+        qubits = self.qubits if qubits is None else qubits
+        probabilities = self.get_marginal_probabilities(qubits).reshape(-1)
+        samples = np.random.default_rng().choice(len(probabilities), size=shots, p=probabilities / probabilities.sum())
+        counts: Dict[str, int] = dict()
+        for (index, count) in zip(*np.unique(samples, return_counts=True)):
+            # the first qubit is the most significant axis of the flattened state
+            key = format(int(index), f"0{len(qubits)}b")[::-1]
+            counts[key] = int(count)
+        return counts
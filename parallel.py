@@ -0,0 +1,98 @@
+import multiprocessing
+from typing import Dict, List, Optional, Tuple, Any
+
+from z3 import sat, unknown
+from static_solver import StaticSolver
+from simulation import Simulation
+from smt_export import ExportedQubits, export_encoding, load_encoding
+from utils import build_state, get_state_amplitude, iter_prefix_order
+
+PROBABILITY = "probability"
+AMPLITUDE = "amplitude"
+
+# set in every worker process by init_worker
+worker_session: Optional[Simulation] = None
+
+
+def init_worker(smt2: str, qubits: ExportedQubits) -> None:
+    # each worker process parses the formula into its own session, nothing is shared with the parent encoding
+    global worker_session
+    worker_session = load_encoding(smt2, qubits)
+
+
+def evaluate_state(query: str, state: Dict[str, bool]) -> Any:
+    if query == AMPLITUDE:
+        return get_state_amplitude(worker_session, worker_session.mapping, state)
+    check_output, _, probability = StaticSolver.evaluate_state_probability(worker_session, state,
+                                                                           worker_session.mapping)
+    if check_output == sat:
+        return probability.as_decimal(3)
+    if check_output == unknown:
+        return None
+    return "unsat"
+
+
+def evaluate_partition(task: Tuple[str, List[str], int, int]) -> List[Tuple[int, Any]]:
+    """
+    Evaluates every basis state whose first prefix_size variables are assigned as in prefix
+    :return: list of (index of the state as in build_state, result of the query)
+    """
+    query, var_names, prefix_size, prefix = task
+    prefix_state = build_state(var_names[:prefix_size], prefix)
+    # when the prefix is not reachable none of the states of the partition is
+    is_prefix_sat = StaticSolver.is_state_sat(worker_session, {worker_session.mapping[var_name].qubit: value
+                                                               for (var_name, value) in prefix_state.items()})
+    results = []
+    for suffix in iter_prefix_order(len(var_names) - prefix_size):
+        index = prefix + (suffix << prefix_size)
+        if is_prefix_sat is False:
+            results.append((index, 0.0 if query == AMPLITUDE else "unsat"))
+        else:
+            results.append((index, evaluate_state(query, build_state(var_names, index))))
+    return results
+
+
+def get_prefix_size(var_count: int, workers: int) -> int:
+    # a few partitions per worker so that unreachable (cheap) partitions do not leave workers idle
+    prefix_size = 0
+    while 2 ** prefix_size < 4 * workers and prefix_size < var_count:
+        prefix_size += 1
+    return prefix_size
+
+
+def evaluate_all_states(session: Simulation, var_names: List[str], workers: int, query: str) -> List[Any]:
+    """
+    Encodes the circuit once as SMT-LIB2 and evaluates the 2^n basis states in a pool of worker processes, each one
+    working on disjoint prefix partitions
+    :return: results of the query, ordered by the state index used by build_state
+    """
+    smt2, qubits = export_encoding(session)
+    prefix_size = get_prefix_size(len(var_names), workers)
+    tasks = [(query, var_names, prefix_size, prefix) for prefix in range(2 ** prefix_size)]
+    results = []
+    with multiprocessing.get_context("fork").Pool(workers, initializer=init_worker,
+                                                  initargs=(smt2, qubits)) as pool:
+        for partition in pool.imap_unordered(evaluate_partition, tasks):
+            results.extend(partition)
+    results.sort(key=lambda result: result[0])
+    return [result for (_, result) in results]
+
+
+def get_state_probabilities(session: Simulation, var_names: List[str],
+                            workers: int) -> List[Tuple[Dict[str, bool], Optional[str]]]:
+    """
+    :return: list of (state, probability as a decimal string, "unsat" or None on solver timeout)
+    """
+    probabilities = evaluate_all_states(session, var_names, workers, PROBABILITY)
+    return [(build_state(var_names, index), probability) for (index, probability) in enumerate(probabilities)]
+
+
+def get_parallel_amplitudes(session: Simulation, var_names: List[str], workers: int) -> List[complex]:
+    """
+    Same as utils.get_amplitudes(session, session.mapping, var_names), the states are evaluated by the worker processes
+    :return: amplitudes ordered by the state index used by build_state
+    """
+    amplitudes = evaluate_all_states(session, var_names, workers, AMPLITUDE)
+    for amplitude in amplitudes:
+        assert(amplitude is not None)
+    return amplitudes
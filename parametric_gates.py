@@ -0,0 +1,86 @@
+from math import cos, sin, pi
+from typing import Any, List, Tuple
+
+import z3
+from qasm_parser import Angle, SymbolicAngle
+from simulation import Simulation
+from static_solver import StaticSolver
+from symbolic_complex import SymbolicComplex
+from gate_matrices import EPSILON
+from settings import *
+
+# matrix entry: a python number, or a SymbolicComplex when it depends on a symbolic angle
+Entry = Any
+
+
+def is_zero_entry(entry: Entry) -> bool:
+    return not isinstance(entry, SymbolicComplex) and entry == 0
+
+
+def scale_entry(amplitude, entry: Entry):
+    """
+    :return: amplitude * entry
+    """
+    if isinstance(entry, SymbolicComplex):
+        return amplitude * entry
+    return amplitude.scale(entry)
+
+
+def get_rotation(session: Simulation, angle: Angle) -> Tuple[Any, Any]:
+    """
+    :return: cos and sin of the angle. For a symbolic angle they are z3 Reals constrained by cos^2 + sin^2 = 1, shared by
+    every gate that uses the same expression, their values are only substituted by the queries (see sweep.py)
+    """
+    if not isinstance(angle, SymbolicAngle):
+        return cos(angle), sin(angle)
+    if angle.expression not in session.angles.keys():
+        index = len(session.angles)
+        cos_angle = z3.Real(f"cos_{index}", session.context)
+        sin_angle = z3.Real(f"sin_{index}", session.context)
+        session.real_count += 2
+        StaticSolver.add(session, cos_angle * cos_angle + sin_angle * sin_angle == 1)
+        session.angles[angle.expression] = (cos_angle, sin_angle)
+    return session.angles[angle.expression]
+
+
+def get_entry(session: Simulation, phase: Angle, magnitude: Any, sign: int = 1) -> Entry:
+    """
+    :return: sign * e^(i phase) * magnitude, magnitude is a python float or a z3 Real
+    """
+    cos_phase, sin_phase = get_rotation(session, phase)
+    if not any(isinstance(value, z3.ExprRef) for value in [cos_phase, sin_phase, magnitude]):
+        value = sign * complex(cos_phase, sin_phase) * magnitude
+        return 0 if abs(value) < EPSILON else value
+    return SymbolicComplex.from_expression(session, "param", sign * cos_phase * magnitude,
+                                           sign * sin_phase * magnitude, 3)
+
+
+def get_u3_matrix(session: Simulation, theta: Angle, phi: Angle, lam: Angle) -> List[List[Entry]]:
+    # as u3_matrix in gate_matrices.py
+    cos_half, sin_half = get_rotation(session, theta / 2)
+    return [[get_entry(session, 0, cos_half), get_entry(session, lam, sin_half, -1)],
+            [get_entry(session, phi, sin_half), get_entry(session, phi + lam, cos_half)]]
+
+
+def get_u1_matrix(session: Simulation, lam: Angle) -> List[List[Entry]]:
+    # diagonal whatever the angle, the branch variable of the qubit is kept
+    return [[1, 0], [0, get_entry(session, lam, 1)]]
+
+
+def get_parametric_matrix(session: Simulation, name: str, params: Tuple[Angle, ...]) -> List[List[Entry]]:
+    """
+    2x2 matrix of a single qubit parametric gate (or of the target operation of CU1) whose parameters may be symbolic
+    """
+    if session.exact:
+        raise Exception("Symbolic parameters are not supported by the exact encoding")
+    if name in [U1, RZ, CU1]:
+        return get_u1_matrix(session, *params)
+    if name == U2:
+        return get_u3_matrix(session, pi / 2, *params)
+    if name == U3:
+        return get_u3_matrix(session, *params)
+    if name == RX:
+        return get_u3_matrix(session, params[0], -pi / 2, pi / 2)
+    if name == RY:
+        return get_u3_matrix(session, params[0], 0, 0)
+    raise Exception(f"Gate ({name}) does not take symbolic parameters")
@@ -0,0 +1,220 @@
+from collections import deque
+from math import pi
+from typing import Deque, Dict, Iterable, Iterator, Optional
+
+from qasm_parser import Instruction, is_symbolic
+from settings import *
+
+# phase gates diag(1, e^(i k pi/4)) by their k
+PHASE_STEPS: Dict[str, int] = {
+    T: 1,
+    S: 2,
+    Z: 4,
+    SDG: 6,
+    TDG: 7,
+}
+# phase gates diag(1, e^(i lambda)) with lambda as their parameter (rz is u1 in qelib1.inc)
+PARAMETRIC_PHASE_GATES = [U1, RZ]
+# single gate for the phases k pi/4 that have one, the other merged phases are emitted as one u1
+PHASE_GATES: Dict[int, str] = {
+    1: T,
+    2: S,
+    4: Z,
+    6: SDG,
+    7: TDG,
+}
+# merged phases closer than this to a multiple of pi/4 are emitted as T/S/Z/SDG/TDG gates (when PHASE_GATES has one)
+PHASE_TOLERANCE = 1e-9
+# gates that are their own inverse, and those among them whose qubits can be given in any order
+SELF_INVERSE_GATES = [H, X, Y, CX, CZ, SWAP, CCX, MCX, CSWAP]
+SYMMETRIC_GATES = [CZ, SWAP]
+# number of assertions added by the z3 encoding of each gate (upper bound, constant amplitudes add fewer)
+ASSERTIONS_PER_GATE: Dict[str, int] = {
+    X: 1,
+    H: 2,
+    Y: 2,
+    Z: 1,
+    T: 1,
+    TDG: 1,
+    S: 1,
+    SDG: 1,
+    U1: 1,
+    RZ: 1,
+    U2: 3,
+    U3: 3,
+    RX: 3,
+    RY: 3,
+    I: 0,
+    CX: 5,
+    CZ: 4,
+    CU1: 4,
+    SWAP: 0,
+    CCX: 7,
+    CSWAP: 8,
+}
+# merged run of phase gates, params are (phase in units of pi/4, number of merged gates). It only lives inside the
+# window of the optimizer
+PHASE = "phase"
+
+# rules of the optimizer, used to report the removed gates
+IDENTITY_RULE = "identity"
+INVERSE_PAIR_RULE = "inverse pair"
+PHASE_RULE = "phase merge"
+
+
+def get_assertions(instruction: Instruction) -> int:
+    if instruction.name == MCX:
+        # two per qubit and the branch of the target
+        return 2 * len(instruction.qubits) + 1
+    return ASSERTIONS_PER_GATE.get(instruction.name, 0)
+
+
+def is_multiple(value: float, step: int) -> bool:
+    remainder = value % step
+    return min(remainder, step - remainder) < PHASE_TOLERANCE
+
+
+class PeepholeStats:
+    gates_in: int
+    gates_out: int
+    removed: Dict[str, int]
+    assertions_in: int
+    assertions_out: int
+
+    def __init__(self):
+        self.gates_in = 0
+        self.gates_out = 0
+        self.removed = dict()
+        self.assertions_in = 0
+        self.assertions_out = 0
+
+    def count_removed(self, rule: str, count: int = 1) -> None:
+        self.removed[rule] = self.removed.get(rule, 0) + count
+
+    def __str__(self) -> str:
+        return (f"peephole: {self.gates_in} -> {self.gates_out} gates, removed {self.removed}, "
+                f"~{self.assertions_in - self.assertions_out} assertions saved "
+                f"({self.assertions_in} -> {self.assertions_out} estimated)")
+
+
+class PeepholeOptimizer:
+    """
+    Streaming pass between the front-end and the encoder. It cancels adjacent inverse pairs (H H, X X, CX CX on the
+    same qubits...), merges runs of T/TDG/S/SDG/Z/U1/RZ on a qubit into a single phase and drops identity gates. Only the last
+    `window` instructions are kept, older ones are yielded as soon as they leave the window.
+    """
+    window: int
+    # removed instructions are left as None
+    buffer: Deque[Optional[Instruction]]
+    # absolute index of buffer[0]
+    offset: int
+    # absolute indices of the live instructions of the buffer that act on each qubit, oldest first
+    last: Dict[str, Deque[int]]
+    stats: PeepholeStats
+
+    def __init__(self, window: int = PEEPHOLE_WINDOW):
+        self.window = window
+        self.buffer = deque()
+        self.offset = 0
+        self.last = dict()
+        self.stats = PeepholeStats()
+
+    def get_last(self, qubit: str) -> Optional[int]:
+        if qubit not in self.last.keys() or len(self.last[qubit]) == 0:
+            return None
+        return self.last[qubit][-1]
+
+    def remove_last(self, index: int) -> None:
+        for qubit in self.buffer[index - self.offset].qubits:
+            assert (self.last[qubit][-1] == index)
+            self.last[qubit].pop()
+        self.buffer[index - self.offset] = None
+
+    def append(self, instruction: Instruction) -> None:
+        index = self.offset + len(self.buffer)
+        self.buffer.append(instruction)
+        for qubit in instruction.qubits:
+            self.last.setdefault(qubit, deque()).append(index)
+
+    def cancels(self, previous: Instruction, instruction: Instruction) -> bool:
+        if previous.name != instruction.name or instruction.name not in SELF_INVERSE_GATES:
+            return False
+        if instruction.name in SYMMETRIC_GATES:
+            return set(previous.qubits) == set(instruction.qubits)
+        if instruction.name == CCX:
+            # the two controls can be swapped
+            return set(previous.qubits[:2]) == set(instruction.qubits[:2]) and previous.qubits[2] == instruction.qubits[2]
+        return previous.qubits == instruction.qubits
+
+    def push(self, instruction: Instruction) -> None:
+        self.stats.gates_in += 1
+        self.stats.assertions_in += get_assertions(instruction)
+        if instruction.name == I:
+            self.stats.count_removed(IDENTITY_RULE)
+            return
+
+        indices = [self.get_last(qubit) for qubit in instruction.qubits]
+        previous = None
+        # the previous instruction must be the last one on every qubit of the new one
+        if indices[0] is not None and all(index == indices[0] for index in indices):
+            previous = self.buffer[indices[0] - self.offset]
+            if len(previous.qubits) != len(instruction.qubits):
+                previous = None
+
+        # a symbolic phase is only known at query time (see sweep.py), it is kept as it is
+        is_phase = instruction.name in PHASE_STEPS.keys() or (instruction.name in PARAMETRIC_PHASE_GATES
+                                                             and not is_symbolic(instruction.params))
+        if is_phase:
+            if instruction.name in PHASE_STEPS.keys():
+                step = PHASE_STEPS[instruction.name]
+            else:
+                step = (instruction.params[0] / (pi / 4)) % 8
+            count = 1
+            if previous is not None and previous.name == PHASE:
+                self.remove_last(indices[0])
+                step = (previous.params[0] + step) % 8
+                count += previous.params[1]
+            if is_multiple(step, 8):
+                self.stats.count_removed(PHASE_RULE, count)
+                return
+            self.append(Instruction(PHASE, instruction.qubits, (step, count)))
+            return
+
+        if previous is not None and self.cancels(previous, instruction):
+            self.remove_last(indices[0])
+            self.stats.count_removed(INVERSE_PAIR_RULE, 2)
+            return
+        self.append(instruction)
+
+    def pop_oldest(self) -> Iterator[Instruction]:
+        instruction = self.buffer.popleft()
+        if instruction is not None:
+            for qubit in instruction.qubits:
+                assert (self.last[qubit][0] == self.offset)
+                self.last[qubit].popleft()
+            yield from self.emit(instruction)
+        self.offset += 1
+
+    def emit(self, instruction: Instruction) -> Iterator[Instruction]:
+        if instruction.name == PHASE:
+            step, count = instruction.params
+            # a merged run is always emitted as one gate, u1 has a native encoding
+            if is_multiple(step, 1) and round(step) % 8 in PHASE_GATES.keys():
+                phase_gate = Instruction(PHASE_GATES[round(step) % 8], instruction.qubits)
+            else:
+                phase_gate = Instruction(U1, instruction.qubits, (step * pi / 4,))
+            if count > 1:
+                self.stats.count_removed(PHASE_RULE, count - 1)
+            yield from self.emit(phase_gate)
+            return
+        self.stats.gates_out += 1
+        self.stats.assertions_out += get_assertions(instruction)
+        yield instruction
+
+    def optimize(self, instructions: Iterable[Instruction]) -> Iterator[Instruction]:
+        for instruction in instructions:
+            self.push(instruction)
+            while len(self.buffer) > self.window:
+                yield from self.pop_oldest()
+        while len(self.buffer) > 0:
+            yield from self.pop_oldest()
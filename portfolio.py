@@ -0,0 +1,188 @@
+import json
+import math
+import multiprocessing
+import os
+import time
+from multiprocessing.connection import wait
+from typing import Any, Callable, Dict, List, Optional
+
+import z3
+from simulation import Simulation
+from smt_export import ExportedQubits, export_encoding, load_encoding
+from static_solver import StaticSolver, SolverTimeout
+from settings import PORTFOLIO_LOG
+
+# solver configurations raced by the portfolio, each one builds its solver in a fresh z3 Context
+SOLVER = "solver"
+OPTIMIZE = "optimize"
+NLSAT = "qfnra-nlsat"
+PREPROCESS = "simplify-solve-eqs-smt"
+SEED_1 = "seed-1"
+SEED_2 = "seed-2"
+# picks the configuration that won on the most similar logged circuits (see select_configuration)
+AUTO = "auto"
+
+
+def get_seeded_solver(context: z3.Context, seed: int) -> z3.Solver:
+    solver = z3.Solver(ctx=context)
+    solver.set("random_seed", seed)
+    return solver
+
+
+CONFIGURATIONS: Dict[str, Callable[[z3.Context], Any]] = {
+    SOLVER: lambda context: z3.Solver(ctx=context),
+    OPTIMIZE: lambda context: z3.Optimize(ctx=context),
+    NLSAT: lambda context: z3.Tactic("qfnra-nlsat", context).solver(),
+    PREPROCESS: lambda context: z3.Then("simplify", "solve-eqs", "smt", ctx=context).solver(),
+    SEED_1: lambda context: get_seeded_solver(context, 1),
+    SEED_2: lambda context: get_seeded_solver(context, 2),
+}
+
+# number of logged circuits that vote in select_configuration
+NEIGHBOURS = 3
+
+
+def get_features(session: Simulation) -> Dict[str, float]:
+    return {
+        "qubits": len(session.mapping),
+        "reals": session.real_count,
+        "bools": session.bool_count,
+        "assertions": session.assertion_count,
+    }
+
+
+def run_configuration(connection, configuration: str, smt2: str, qubits: ExportedQubits,
+                      timeout: Optional[float], targets: Optional[List[str]]) -> None:
+    """
+    Answers the query of the race on the exported encoding with one configuration, it runs in its own process
+    """
+    if targets is None:
+        context = z3.Context()
+        solver = CONFIGURATIONS[configuration](context)
+        if timeout is not None:
+            solver.set("timeout", int(timeout * 1000))
+        solver.add(z3.parse_smt2_string(smt2, ctx=context))
+        start = time.perf_counter()
+        result = solver.check()
+        elapsed = time.perf_counter() - start
+        state = None
+        if result == z3.sat:
+            model = solver.model()
+            state = {name: z3.is_true(model.eval(z3.Bool(qubit_name, context), model_completion=True))
+                     for (name, (qubit_name, _)) in sorted(qubits.items())}
+        connection.send((configuration, str(result), elapsed, state, None))
+        return
+
+    # most likely state of the targets, the checks of the best-first search are made by the configured solver
+    session = load_encoding(smt2, qubits)
+    solver = CONFIGURATIONS[configuration](session.context)
+    if timeout is not None:
+        solver.set("timeout", int(timeout * 1000))
+    solver.add(session.solver.assertions())
+    session.solver = solver
+    start = time.perf_counter()
+    try:
+        answer = StaticSolver.get_top_k(session, {name: session.mapping[name] for name in targets}, 1)
+    except SolverTimeout:
+        # a check of the search was unknown, any other error ends the process and its traceback is printed
+        connection.send((configuration, str(z3.unknown), time.perf_counter() - start, None, None))
+        return
+    elapsed = time.perf_counter() - start
+    if len(answer) == 0:
+        connection.send((configuration, str(z3.unsat), elapsed, None, None))
+    else:
+        probability, state = answer[0]
+        connection.send((configuration, str(z3.sat), elapsed, state, probability))
+
+
+def race(session: Simulation, configurations: List[str], timeout: Optional[float] = None,
+         targets: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Checks the encoding of the session with every configuration, each one in its own process. The first sat or
+    unsat answer wins and the other processes are killed.
+    :param timeout: seconds, for the whole race and for each solver
+    :param targets: race the most likely state of these qubits (StaticSolver.get_top_k, every check made by the
+    configuration) instead of a single satisfiability check
+    :return: dictionary with the result (sat, unsat or unknown), the winner (None if no configuration answered), its
+    time, the state of the qubits (an arbitrary model of the check, or the most likely state of the targets) when sat,
+    its probability (only with targets), and the time of every configuration that finished
+    """
+    for configuration in configurations:
+        if configuration not in CONFIGURATIONS.keys():
+            raise Exception(f"Solver configuration ({configuration}) not implemented")
+    smt2, qubits = export_encoding(session)
+    context = multiprocessing.get_context("fork")
+    processes = dict()
+    for configuration in configurations:
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=run_configuration,
+                                  args=(sender, configuration, smt2, qubits, timeout, targets))
+        process.start()
+        sender.close()
+        processes[receiver] = process
+
+    answer = {"result": str(z3.unknown), "winner": None, "time": None, "state": None, "probability": None,
+              "times": dict()}
+    start = time.perf_counter()
+    pending = list(processes.keys())
+    while len(pending) > 0 and answer["winner"] is None:
+        remaining = None if timeout is None else max(0.0, timeout - (time.perf_counter() - start))
+        ready = wait(pending, remaining)
+        if len(ready) == 0:
+            break
+        for receiver in ready:
+            pending.remove(receiver)
+            try:
+                configuration, result, elapsed, state, probability = receiver.recv()
+            except EOFError:
+                # the process died without answering (e.g. out of memory or an error)
+                continue
+            answer["times"][configuration] = elapsed
+            if result != str(z3.unknown) and answer["winner"] is None:
+                answer.update({"result": result, "winner": configuration, "time": elapsed, "state": state,
+                               "probability": probability})
+    for (receiver, process) in processes.items():
+        if process.is_alive():
+            process.kill()
+        process.join()
+        receiver.close()
+    return answer
+
+
+def log_race(circuit: str, features: Dict[str, float], answer: Dict[str, Any], path: str = PORTFOLIO_LOG) -> None:
+    """
+    Appends the winner of a race (one JSON object per line) to the log read by select_configuration
+    """
+    entry = {"circuit": circuit, "features": features, "winner": answer["winner"], "result": answer["result"],
+             "time": answer["time"], "times": answer["times"]}
+    if os.path.dirname(path) != "":
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as file:
+        file.write(json.dumps(entry) + "\n")
+
+
+def select_configuration(features: Dict[str, float], path: str = PORTFOLIO_LOG) -> str:
+    """
+    :return: the configuration that won most often among the NEIGHBOURS logged circuits with the closest features
+    (distance between the logarithms of the features), SOLVER when nothing was logged
+    """
+    entries = []
+    if os.path.exists(path):
+        with open(path) as file:
+            for line in file:
+                entry = json.loads(line)
+                if entry["winner"] in CONFIGURATIONS.keys():
+                    entries.append(entry)
+    if len(entries) == 0:
+        return SOLVER
+
+    def get_distance(entry: Dict[str, Any]) -> float:
+        return sum((math.log1p(value) - math.log1p(entry["features"].get(name, 0))) ** 2
+                   for (name, value) in features.items())
+
+    entries.sort(key=get_distance)
+    votes: Dict[str, int] = dict()
+    for entry in entries[:NEIGHBOURS]:
+        votes[entry["winner"]] = votes.get(entry["winner"], 0) + 1
+    # ties go to the closest circuit
+    return max(votes.keys(), key=lambda configuration: votes[configuration])
@@ -0,0 +1,118 @@
+import heapq
+import json
+from typing import Any, Dict, List, Tuple
+
+# number of checks kept with their z3 statistics in the report, the slowest ones
+KEPT_CHECKS = 20
+
+# kinds of queries
+CHECK = "check"
+IS_VALUE_SAT = "is_value_sat"
+IS_STATE_SAT = "is_state_sat"
+
+# counters of the encoding that are tracked for each gate
+GATE_COUNTERS = ["reals", "bools", "assertions", "expressions"]
+
+
+class Profiler:
+    """
+    Collects wall time and encoding sizes per gate, and wall time and z3 statistics per solver query. Every hook is
+    guarded by `Profiler.enabled`, when profiling is off the cost is one attribute lookup per gate or query.
+    """
+    enabled: bool = False
+    # gate name -> count, time and one entry per counter of GATE_COUNTERS
+    gates: Dict[str, Dict[str, float]] = dict()
+    # query kind -> count and time
+    queries: Dict[str, Dict[str, float]] = dict()
+    # check result (sat, unsat, unknown) -> count
+    results: Dict[str, int] = dict()
+    # min-heap of (time, index, check), only the KEPT_CHECKS slowest checks
+    slowest_checks: List[Tuple[float, int, Dict[str, Any]]] = []
+    # a gate executed while another gate runs is accounted to the outermost one (no encoding does this since swap
+    # became a relabelling of its qubits)
+    depth: int = 0
+
+    @staticmethod
+    def enable() -> None:
+        Profiler.enabled = True
+        Profiler.gates = dict()
+        Profiler.queries = dict()
+        Profiler.results = dict()
+        Profiler.slowest_checks = []
+        Profiler.depth = 0
+
+    @staticmethod
+    def disable() -> None:
+        Profiler.enabled = False
+
+    @staticmethod
+    def record_gate(name: str, elapsed: float, before: Dict[str, int], after: Dict[str, int]) -> None:
+        """
+        :param before: encoding counters (see GATE_COUNTERS) before the gate was executed
+        :param after: encoding counters after the gate was executed
+        """
+        entry = Profiler.gates.setdefault(name, {"count": 0, "time": 0.0, **{c: 0 for c in GATE_COUNTERS}})
+        entry["count"] += 1
+        entry["time"] += elapsed
+        for counter in GATE_COUNTERS:
+            entry[counter] += after[counter] - before[counter]
+
+    @staticmethod
+    def record_query(kind: str, elapsed: float) -> None:
+        entry = Profiler.queries.setdefault(kind, {"count": 0, "time": 0.0})
+        entry["count"] += 1
+        entry["time"] += elapsed
+
+    @staticmethod
+    def record_check(elapsed: float, assumptions: int, result, statistics) -> None:
+        """
+        :param assumptions: number of literals assumed by the check
+        :param statistics: z3 Statistics of the check
+        """
+        Profiler.record_query(CHECK, elapsed)
+        Profiler.results[str(result)] = Profiler.results.get(str(result), 0) + 1
+        index = Profiler.queries[CHECK]["count"]
+        if len(Profiler.slowest_checks) == KEPT_CHECKS and Profiler.slowest_checks[0][0] >= elapsed:
+            return
+        check = {"index": index, "time": elapsed, "assumptions": assumptions, "result": str(result),
+                 "statistics": {key: value for (key, value) in statistics}}
+        if len(Profiler.slowest_checks) == KEPT_CHECKS:
+            heapq.heapreplace(Profiler.slowest_checks, (elapsed, index, check))
+        else:
+            heapq.heappush(Profiler.slowest_checks, (elapsed, index, check))
+
+    @staticmethod
+    def get_report() -> Dict[str, Any]:
+        return {
+            "gates": Profiler.gates,
+            "queries": Profiler.queries,
+            "results": Profiler.results,
+            "slowest_checks": [check for (_, _, check) in sorted(Profiler.slowest_checks, reverse=True)],
+        }
+
+    @staticmethod
+    def write_report(path: str) -> None:
+        with open(path, "w") as file:
+            json.dump(Profiler.get_report(), file, indent=2)
+
+    @staticmethod
+    def get_summary(top: int = 10) -> str:
+        """
+        :return: human-readable summary with the `top` most expensive gates and checks
+        """
+        gate_time = sum(entry["time"] for entry in Profiler.gates.values())
+        gate_count = sum(entry["count"] for entry in Profiler.gates.values())
+        lines = [f"profile: {gate_count} gates encoded in {gate_time:.3f}s"]
+        lines.append(f"{'gate':<10} {'count':>8} {'time':>10} {'reals':>8} {'bools':>8} {'assertions':>11} "
+                     f"{'expressions':>12}")
+        gates = sorted(Profiler.gates.items(), key=lambda item: item[1]["time"], reverse=True)
+        for (name, entry) in gates[:top]:
+            lines.append(f"{name:<10} {entry['count']:>8} {entry['time']:>10.4f} {entry['reals']:>8} "
+                         f"{entry['bools']:>8} {entry['assertions']:>11} {entry['expressions']:>12}")
+        lines.append(f"{'query':<14} {'count':>8} {'time':>10}")
+        for (kind, entry) in sorted(Profiler.queries.items(), key=lambda item: item[1]["time"], reverse=True):
+            lines.append(f"{kind:<14} {entry['count']:>8} {entry['time']:>10.4f}")
+        lines.append(f"check results: {Profiler.results}")
+        for (elapsed, index, check) in sorted(Profiler.slowest_checks, reverse=True)[:top]:
+            lines.append(f"check #{index}: {elapsed:.4f}s {check['result']} with {check['assumptions']} assumptions")
+        return "\n".join(lines)
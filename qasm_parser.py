@@ -0,0 +1,342 @@
+import ast
+import math
+import operator
+import os
+import re
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Collection, Tuple, Union
+
+from settings import SUPPORTED_GATES, CX, U3
+
+# used when an included file is not next to the circuit
+QELIB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", "small", "qelib1.inc")
+
+# statements that do not change the state of the qubits, the final measurement is what the queries compute
+IGNORED_STATEMENTS = ["barrier", "measure", "creg", "OPENQASM", "opaque"]
+
+GATE_APPLICATION = re.compile(r"^([A-Za-z_][A-Za-z0-9_]*)\s*(?:\((.*)\))?\s*(.*)$", re.DOTALL)
+GATE_DEFINITION = re.compile(r"^gate\s+([A-Za-z_][A-Za-z0-9_]*)\s*(?:\((.*?)\))?\s*([^{]*)\{(.*)\}$", re.DOTALL)
+QUBIT_ARGUMENT = re.compile(r"^([A-Za-z_][A-Za-z0-9_]*)\s*(?:\[\s*(\d+)\s*\])?$")
+IDENTIFIER = re.compile(r"\b([A-Za-z_][A-Za-z0-9_]*)")
+# identifiers are prefixed before parsing with ast, parameter names like lambda are python keywords
+IDENTIFIER_PREFIX = "qasm_"
+
+BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.Pow: operator.pow,
+}
+UNARY_OPERATORS = {
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+}
+FUNCTIONS = {
+    "sin": math.sin,
+    "cos": math.cos,
+    "tan": math.tan,
+    "exp": math.exp,
+    "ln": math.log,
+    "sqrt": math.sqrt,
+}
+
+
+class SymbolicAngle:
+    """
+    Gate parameter that depends on the free parameters of a parametric circuit (see QasmParser). It is kept as the text
+    of its expression and only evaluated when the free parameters get values
+    """
+    expression: str
+
+    def __init__(self, expression: str):
+        self.expression = expression
+
+    def evaluate(self, values: Dict[str, float]) -> float:
+        return evaluate_expression(self.expression, values)
+
+    @staticmethod
+    def to_text(a) -> str:
+        if isinstance(a, SymbolicAngle):
+            return f"({a.expression})"
+        return repr(float(a))
+
+    @staticmethod
+    def combine(left, symbol: str, right) -> 'SymbolicAngle':
+        return SymbolicAngle(f"{SymbolicAngle.to_text(left)} {symbol} {SymbolicAngle.to_text(right)}")
+
+    def __add__(self, other) -> 'SymbolicAngle':
+        return SymbolicAngle.combine(self, "+", other)
+
+    def __radd__(self, other) -> 'SymbolicAngle':
+        return SymbolicAngle.combine(other, "+", self)
+
+    def __sub__(self, other) -> 'SymbolicAngle':
+        return SymbolicAngle.combine(self, "-", other)
+
+    def __rsub__(self, other) -> 'SymbolicAngle':
+        return SymbolicAngle.combine(other, "-", self)
+
+    def __mul__(self, other) -> 'SymbolicAngle':
+        return SymbolicAngle.combine(self, "*", other)
+
+    def __rmul__(self, other) -> 'SymbolicAngle':
+        return SymbolicAngle.combine(other, "*", self)
+
+    def __truediv__(self, other) -> 'SymbolicAngle':
+        return SymbolicAngle.combine(self, "/", other)
+
+    def __rtruediv__(self, other) -> 'SymbolicAngle':
+        return SymbolicAngle.combine(other, "/", self)
+
+    def __pow__(self, other) -> 'SymbolicAngle':
+        return SymbolicAngle.combine(self, "^", other)
+
+    def __rpow__(self, other) -> 'SymbolicAngle':
+        return SymbolicAngle.combine(other, "^", self)
+
+    def __neg__(self) -> 'SymbolicAngle':
+        return SymbolicAngle(f"-{SymbolicAngle.to_text(self)}")
+
+    def __pos__(self) -> 'SymbolicAngle':
+        return self
+
+
+Angle = Union[float, SymbolicAngle]
+
+
+def is_symbolic(params: Tuple[Angle, ...]) -> bool:
+    return any(isinstance(param, SymbolicAngle) for param in params)
+
+
+class Instruction(NamedTuple):
+    name: str
+    # qubit names are <register>_<index>
+    qubits: List[str]
+    # floats, or SymbolicAngle in parametric circuits
+    params: Tuple[Angle, ...] = ()
+
+
+class GateDefinition(NamedTuple):
+    params: List[str]
+    args: List[str]
+    body: List[str]
+
+
+def evaluate_expression(expression: str, variables: Dict[str, Angle]) -> Angle:
+    """
+    Evaluates an OpenQASM 2 parameter expression (numbers, pi, + - * / ^, unary -, sin cos tan exp ln sqrt)
+    :param variables: values of the parameters of the enclosing gate definition, or of the free parameters of the
+    circuit. The expression is a SymbolicAngle when one of the variables it uses is
+    """
+    def evaluate(node) -> Angle:
+        if isinstance(node, ast.Expression):
+            return evaluate(node.body)
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return node.value
+        if isinstance(node, ast.Name):
+            name = node.id[len(IDENTIFIER_PREFIX):]
+            if name == "pi":
+                return math.pi
+            if name in variables.keys():
+                return variables[name]
+            raise Exception(f"Unknown parameter ({name})")
+        if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS.keys():
+            return BINARY_OPERATORS[type(node.op)](evaluate(node.left), evaluate(node.right))
+        if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS.keys():
+            return UNARY_OPERATORS[type(node.op)](evaluate(node.operand))
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and \
+                node.func.id[len(IDENTIFIER_PREFIX):] in FUNCTIONS.keys():
+            assert (len(node.args) == 1)
+            function = node.func.id[len(IDENTIFIER_PREFIX):]
+            argument = evaluate(node.args[0])
+            if isinstance(argument, SymbolicAngle):
+                return SymbolicAngle(f"{function}{SymbolicAngle.to_text(argument)}")
+            return FUNCTIONS[function](argument)
+        raise Exception(f"Invalid parameter expression ({expression})")
+
+    answer = evaluate(ast.parse(IDENTIFIER.sub(IDENTIFIER_PREFIX + r"\1", expression.replace("^", "**")), mode="eval"))
+    if isinstance(answer, SymbolicAngle):
+        return answer
+    return float(answer)
+
+
+def split_list(text: str) -> List[str]:
+    """
+    Splits on commas that are not inside parentheses
+    """
+    answer = []
+    depth = 0
+    current = ""
+    for char in text:
+        if char == "," and depth == 0:
+            answer.append(current.strip())
+            current = ""
+            continue
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        current += char
+    if current.strip() != "":
+        answer.append(current.strip())
+    return answer
+
+
+def iter_statements(path: str) -> Iterator[str]:
+    """
+    Reads the file line by line and yields one statement at a time (without the final ';'). A gate definition is a
+    single statement that ends with its closing '}'.
+    """
+    with open(path) as file:
+        yield from split_statements(file, path)
+
+
+def split_statements(lines: Iterable[str], source: str) -> Iterator[str]:
+    """
+    Statements of the OpenQASM lines, see iter_statements
+    :param source: name of the file (or text) in error messages
+    """
+    buffer = ""
+    depth = 0
+    for line in lines:
+        line = line.split("//")[0]
+        for char in line:
+            if char == "{":
+                depth += 1
+            elif char == "}":
+                depth -= 1
+                if depth == 0:
+                    yield (buffer + char).strip()
+                    buffer = ""
+                    continue
+            elif char == ";" and depth == 0:
+                if buffer.strip() != "":
+                    yield buffer.strip()
+                buffer = ""
+                continue
+            buffer += char
+    if buffer.strip() != "":
+        raise Exception(f"Unterminated statement ({buffer.strip()}) in {source}")
+
+
+class QasmParser:
+    """
+    Streaming parser for the OpenQASM 2 subset used by the benchmarks. Gates in `native` are yielded as they are,
+    other gates are expanded with their definition (from the file or its includes) until they reach native gates.
+    Free parameters (e.g. the angles of a variational circuit) can be used in the gate parameters, the instructions
+    get SymbolicAngle parameters.
+    """
+    native: Collection[str]
+    registers: Dict[str, int]
+    definitions: Dict[str, GateDefinition]
+    # free parameter names to their SymbolicAngle
+    parameters: Dict[str, SymbolicAngle]
+
+    def __init__(self, native: Collection[str] = SUPPORTED_GATES, parameters: Collection[str] = ()):
+        self.native = native
+        self.registers = dict()
+        self.definitions = dict()
+        self.parameters = {name: SymbolicAngle(name) for name in parameters}
+
+    def parse_file(self, path: str) -> Iterator[Instruction]:
+        yield from self.parse_statements(iter_statements(path), os.path.dirname(os.path.abspath(path)))
+
+    def parse_statements(self, statements: Iterable[str], directory: str) -> Iterator[Instruction]:
+        """
+        :param directory: included files are looked up in this directory
+        """
+        for statement in statements:
+            if statement.startswith("include"):
+                include_name = statement[len("include"):].strip().strip('"')
+                include_path = os.path.join(directory, include_name)
+                if not os.path.exists(include_path) and include_name == "qelib1.inc":
+                    include_path = QELIB_PATH
+                yield from self.parse_file(include_path)
+            elif statement.startswith("gate"):
+                self.add_definition(statement)
+            elif statement.startswith("qreg"):
+                match = QUBIT_ARGUMENT.match(statement[len("qreg"):].strip())
+                self.registers[match.group(1)] = int(match.group(2))
+            elif statement.startswith("if"):
+                raise Exception(f"Classically controlled operations are not supported ({statement})")
+            elif statement.split()[0] == "reset":
+                # a reset is not unitary, the encodings only apply gates
+                raise Exception(f"Unsupported statement ({statement}): reset is not supported")
+            elif statement.split()[0].split("(")[0] in IGNORED_STATEMENTS:
+                continue
+            else:
+                yield from self.parse_application(statement)
+
+    def add_definition(self, statement: str) -> None:
+        match = GATE_DEFINITION.match(statement)
+        if match is None:
+            raise Exception(f"Invalid gate definition ({statement})")
+        name, params, args, body = match.groups()
+        self.definitions[name] = GateDefinition(split_list(params or ""), split_list(args),
+                                                [s.strip() for s in body.split(";") if s.strip() != ""])
+
+    def get_qubits(self, argument: str) -> List[str]:
+        match = QUBIT_ARGUMENT.match(argument)
+        if match is None:
+            raise Exception(f"Invalid qubit argument ({argument})")
+        register, index = match.groups()
+        if index is not None:
+            return [f"{register}_{index}"]
+        # a whole register, the gate is broadcast over it
+        return [f"{register}_{i}" for i in range(self.registers[register])]
+
+    def parse_application(self, statement: str) -> Iterator[Instruction]:
+        match = GATE_APPLICATION.match(statement)
+        if match is None:
+            raise Exception(f"Invalid statement ({statement})")
+        name, params, args = match.groups()
+        params = tuple(evaluate_expression(param, self.parameters) for param in split_list(params or ""))
+        qubits = [self.get_qubits(arg) for arg in split_list(args)]
+        size = max(len(arg_qubits) for arg_qubits in qubits)
+        for i in range(size):
+            call = [arg_qubits[i] if len(arg_qubits) > 1 else arg_qubits[0] for arg_qubits in qubits]
+            yield from self.expand(name, call, params)
+
+    def expand(self, name: str, qubits: List[str], params: Tuple[Angle, ...]) -> Iterator[Instruction]:
+        # U and CX are the OpenQASM builtins, they are yielded with their qelib1.inc names
+        if name == "U":
+            yield Instruction(U3, qubits, params)
+            return
+        if name == "CX":
+            yield Instruction(CX, qubits, params)
+            return
+        if name in self.native or name not in self.definitions.keys():
+            yield Instruction(name, qubits, params)
+            return
+
+        definition = self.definitions[name]
+        assert (len(definition.args) == len(qubits))
+        assert (len(definition.params) == len(params))
+        arguments = dict(zip(definition.args, qubits))
+        variables = dict(zip(definition.params, params))
+        for statement in definition.body:
+            match = GATE_APPLICATION.match(statement)
+            body_name, body_params, body_args = match.groups()
+            body_params = tuple(evaluate_expression(param, variables) for param in split_list(body_params or ""))
+            yield from self.expand(body_name, [arguments[arg] for arg in split_list(body_args)], body_params)
+
+
+def parse_qasm_file(path: str, native: Optional[Collection[str]] = None,
+                    parameters: Collection[str] = ()) -> Iterator[Instruction]:
+    """
+    Lazily yields the instructions of an OpenQASM 2 file, the file is never loaded in memory
+    :param native: gates that are not expanded, by default the gates supported by the simulators
+    :param parameters: names of the free parameters of the circuit, they are kept symbolic (see SymbolicAngle)
+    """
+    parser = QasmParser(SUPPORTED_GATES if native is None else native, parameters)
+    return parser.parse_file(path)
+
+
+def parse_qasm_string(text: str, native: Optional[Collection[str]] = None,
+                      parameters: Collection[str] = ()) -> Iterator[Instruction]:
+    """
+    Lazily yields the instructions of an OpenQASM 2 program given as text, included files are looked up in the working
+    directory (qelib1.inc is always found)
+    """
+    parser = QasmParser(SUPPORTED_GATES if native is None else native, parameters)
+    return parser.parse_statements(split_statements(text.splitlines(keepends=True), "<string>"), os.getcwd())
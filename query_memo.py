@@ -0,0 +1,82 @@
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from z3 import BoolRef, CheckSatResult, ExprRef, ModelRef, unsat
+
+
+class MemoEntry:
+    """
+    Result of one check, and when it is sat its model and the expressions already evaluated in it
+    """
+    # the z3 ids of the key are only unique while their ASTs are alive, the entry keeps a reference to them
+    assumptions: List[BoolRef]
+    result: CheckSatResult
+    model: Optional[ModelRef]
+    generation: int
+    # expression id -> (expression, value in the model)
+    values: Dict[int, Tuple[ExprRef, Any]]
+
+    def __init__(self, assumptions: List[BoolRef], result: CheckSatResult, model: Optional[ModelRef],
+                 generation: int):
+        self.assumptions = assumptions
+        self.result = result
+        self.model = model
+        self.generation = generation
+        self.values = dict()
+
+    def evaluate(self, expression: ExprRef) -> Any:
+        key = expression.get_id()
+        if key not in self.values.keys():
+            self.values[key] = (expression, self.model.eval(expression, model_completion=True))
+        return self.values[key][1]
+
+
+class QueryMemo:
+    """
+    Least recently used map from a set of assumption literals (a partial assignment of the qubits) to the result of
+    checking them. Every added constraint starts a new generation: sat and unknown results of older generations are
+    stale, unsat results stay valid as long as constraints are only added. Popping a solver scope clears the memo.
+    """
+    max_size: int
+    generation: int
+    entries: 'OrderedDict[FrozenSet[int], MemoEntry]'
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.generation = 0
+        self.entries = OrderedDict()
+
+    @staticmethod
+    def get_key(assumptions: List[BoolRef]) -> FrozenSet[int]:
+        # the literals are a conjunction, their order does not change the result
+        return frozenset(assumption.get_id() for assumption in assumptions)
+
+    def get(self, assumptions: List[BoolRef]) -> Optional[MemoEntry]:
+        key = QueryMemo.get_key(assumptions)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry.result != unsat and entry.generation != self.generation:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, assumptions: List[BoolRef], result: CheckSatResult, model: Optional[ModelRef]) -> MemoEntry:
+        entry = MemoEntry(list(assumptions), result, model, self.generation)
+        if self.max_size <= 0:
+            return entry
+        key = QueryMemo.get_key(assumptions)
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        return entry
+
+    def invalidate(self) -> None:
+        self.generation += 1
+
+    def clear(self) -> None:
+        # constraints were removed, unsat results are stale too
+        self.entries.clear()
+        self.generation += 1
@@ -0,0 +1,282 @@
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from qasm_parser import Instruction, parse_qasm_string
+from simulation import Simulation
+from static_solver import StaticSolver
+from z3quantum_gate import Z3QuantumGate
+from circuit import encode_instructions, simulate_instructions, simulate_stabilizer, is_clifford
+from lightcone import get_light_cone, get_qubit_name
+from utils import to_float
+from settings import Z3_BACKEND, NUMPY_BACKEND, STABILIZER_BACKEND, AUTO_BACKEND
+
+# query types
+MOST_LIKELY = "most_likely"
+DISTRIBUTION = "distribution"
+SHOTS = "shots"
+MARGINAL = "marginal"
+QUERIES = [MOST_LIKELY, DISTRIBUTION, SHOTS, MARGINAL]
+BACKENDS = [Z3_BACKEND, NUMPY_BACKEND, STABILIZER_BACKEND, AUTO_BACKEND]
+
+# seconds per job when the request does not give a timeout
+DEFAULT_TIMEOUT = 60.0
+# probabilities below this are not part of a numpy distribution
+MIN_PROBABILITY = 1e-12
+
+Distribution = List[Tuple[Dict[str, bool], float]]
+
+
+def load_request(request: Dict[str, Any], qubits: Optional[List[str]]) -> Tuple[List[Instruction], str]:
+    """
+    :return: instructions of the request (only the light cone of `qubits` when given) and the backend that runs them
+    """
+    instructions = list(parse_qasm_string(request["qasm"]))
+    if qubits is not None:
+        instructions = get_light_cone(instructions, qubits)
+    backend = request.get("backend", Z3_BACKEND)
+    if backend == AUTO_BACKEND:
+        backend = STABILIZER_BACKEND if is_clifford(instructions) else Z3_BACKEND
+    return instructions, backend
+
+
+def encode_request(request: Dict[str, Any], instructions: List[Instruction],
+                   qubits: Optional[List[str]]) -> Tuple[Simulation, Dict[str, Any]]:
+    """
+    :return: z3 session of the instructions and the mapping of the queried qubits (all of them by default)
+    """
+    session = Simulation(exact=request.get("exact", False))
+    encode_instructions(session, instructions)
+    mapping = session.mapping
+    if qubits is not None:
+        mapping = {name: session.mapping[name] for name in qubits}
+    return session, mapping
+
+
+def get_most_likely(request: Dict[str, Any], qubits: Optional[List[str]]) -> Tuple[float, Dict[str, bool]]:
+    """
+    :param qubits: the most likely state of these qubits (the others are summed out), by default of all of them
+    :return: (probability rounded to 3 decimals, state)
+    """
+    instructions, backend = load_request(request, qubits)
+    if backend == NUMPY_BACKEND:
+        return simulate_instructions(instructions).get_highest_prob(qubits)
+    if backend == STABILIZER_BACKEND:
+        return simulate_stabilizer(instructions).get_highest_prob(qubits)
+    # best-first search, the reachable states are not enumerated
+    session, mapping = encode_request(request, instructions, qubits)
+    answer = StaticSolver.get_top_k(session, mapping, 1)
+    if len(answer) == 0:
+        raise Exception("No reachable state")
+    probability, state = answer[0]
+    return round(probability, 3), state
+
+
+def get_distribution(request: Dict[str, Any], qubits: Optional[List[str]]) -> Distribution:
+    """
+    Simulates the circuit of the request and returns its reachable states
+    :param qubits: the distribution of these qubits (the others are summed out), by default of all of them
+    """
+    instructions, backend = load_request(request, qubits)
+
+    if backend == NUMPY_BACKEND:
+        simulator = simulate_instructions(instructions)
+        qubits = sorted(simulator.qubits) if qubits is None else qubits
+        probabilities = simulator.get_marginal_probabilities(qubits)
+        return [({name: bool(position[i]) for (i, name) in enumerate(qubits)}, float(probabilities[tuple(position)]))
+                for position in np.argwhere(probabilities > MIN_PROBABILITY)]
+    if backend == STABILIZER_BACKEND:
+        tableau = simulate_stabilizer(instructions)
+        return list(tableau.iter_support(sorted(tableau.qubits) if qubits is None else qubits))
+
+    session, mapping = encode_request(request, instructions, qubits)
+    answer = []
+    for state in StaticSolver.iter_reachable_states(session, mapping):
+        _, _, probability = StaticSolver.evaluate_state_probability(session, state, session.mapping)
+        answer.append((state, to_float(probability)))
+    return answer
+
+
+def get_counts(request: Dict[str, Any], qubits: Optional[List[str]]) -> Dict[str, int]:
+    instructions, backend = load_request(request, qubits)
+    shots = int(request["shots"])
+    if backend == NUMPY_BACKEND:
+        return simulate_instructions(instructions).get_counts(shots, qubits)
+    if backend == STABILIZER_BACKEND:
+        return simulate_stabilizer(instructions).get_counts(shots, qubits)
+    session = Simulation(exact=request.get("exact", False))
+    encode_instructions(session, instructions)
+    return Z3QuantumGate.measure(session, shots=shots, qubits=qubits)
+
+
+def run_query(request: Dict[str, Any]) -> Any:
+    """
+    :param request: dictionary with the OpenQASM text ("qasm"), the query type ("query", one of QUERIES) and
+    optionally "backend" (z3 by default), "qubits" (required by marginal), "shots" (required by shots) and "exact"
+    :return: the JSON value of the answer. States are dictionaries from qubit names to booleans, a distribution is a
+    list of [state, probability] and shots return a histogram like qiskit get_counts
+    """
+    query = request.get("query", MOST_LIKELY)
+    if query not in QUERIES:
+        raise Exception(f"Query ({query}) not implemented")
+    if request.get("backend", Z3_BACKEND) not in BACKENDS:
+        raise Exception(f"Backend ({request['backend']}) not implemented")
+    qubits = request.get("qubits")
+    if qubits is not None:
+        qubits = sorted(get_qubit_name(qubit) for qubit in qubits)
+    elif query == MARGINAL:
+        raise Exception("The marginal query needs the qubits")
+
+    if query == SHOTS:
+        return get_counts(request, qubits)
+    if query == MOST_LIKELY:
+        return list(get_most_likely(request, qubits))
+    return [[state, probability] for (state, probability) in get_distribution(request, qubits)]
+
+
+def run_job(connection, request: Dict[str, Any]) -> None:
+    # runs in its own process, the solver state of a job is never seen by the others
+    try:
+        connection.send({"result": run_query(request)})
+    except Exception as exception:
+        connection.send({"error": f"{type(exception).__name__}: {exception}", "traceback": traceback.format_exc()})
+
+
+class JobRunner:
+    """
+    Runs every request in a new process forked from the server, which has already imported the simulators (z3, numpy,
+    the parser), so a job only pays for its own encoding and its solver state dies with it. At most `workers` jobs run
+    at the same time and a job is killed when it exceeds its timeout.
+    """
+    context: Any
+    slots: threading.BoundedSemaphore
+    timeout: float
+
+    def __init__(self, workers: int, timeout: float = DEFAULT_TIMEOUT):
+        self.context = multiprocessing.get_context("fork")
+        self.slots = threading.BoundedSemaphore(workers)
+        self.timeout = timeout
+
+    def run(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        :return: {"result": ..., "time": seconds} or {"error": message}
+        """
+        timeout = float(request.get("timeout", self.timeout))
+        with self.slots:
+            start = time.perf_counter()
+            receiver, sender = self.context.Pipe(duplex=False)
+            process = self.context.Process(target=run_job, args=(sender, request))
+            process.start()
+            sender.close()
+            answer = {"error": "timeout"}
+            try:
+                if receiver.poll(timeout):
+                    answer = receiver.recv()
+            except EOFError:
+                # the process died without answering (e.g. out of memory)
+                answer = {"error": f"worker exited with code {process.exitcode}"}
+            if process.is_alive():
+                process.kill()
+            process.join()
+            receiver.close()
+        answer.pop("traceback", None)
+        answer["time"] = time.perf_counter() - start
+        return answer
+
+
+def handle_line(runner: JobRunner, line: bytes) -> Dict[str, Any]:
+    try:
+        request = json.loads(line)
+    except ValueError as exception:
+        return {"error": f"invalid JSON: {exception}"}
+    if not isinstance(request, dict) or "qasm" not in request:
+        return {"error": "a request is a JSON object with the OpenQASM text in \"qasm\""}
+    return runner.run(request)
+
+
+class UnixRequestHandler(socketserver.StreamRequestHandler):
+    # one JSON request per line, each one is answered with one JSON line
+    def handle(self) -> None:
+        for line in self.rfile:
+            if line.strip() == b"":
+                continue
+            answer = handle_line(self.server.runner, line)
+            self.wfile.write(json.dumps(answer).encode() + b"\n")
+            self.wfile.flush()
+
+
+class HttpRequestHandler(BaseHTTPRequestHandler):
+    # POST with the JSON request as body, the answer is the JSON body of the response
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        answer = json.dumps(handle_line(self.server.runner, body)).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(answer)))
+        self.end_headers()
+        self.wfile.write(answer)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+class UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    runner: JobRunner
+
+
+class HttpServer(ThreadingHTTPServer):
+    runner: JobRunner
+
+
+def send_request(socket_path: str, request: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Client of the Unix socket server
+    :return: the answer of the server to the request
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        connection.sendall(json.dumps(request).encode() + b"\n")
+        with connection.makefile("rb") as file:
+            return json.loads(file.readline())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="keeps the simulators loaded and answers queries on OpenQASM text")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--socket", default=None, metavar="PATH",
+                       help="listen on this Unix socket, one JSON request per line")
+    group.add_argument("--port", type=int, default=None, help="listen on this localhost HTTP port, POST JSON requests")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of jobs that run at the same time")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help="seconds per job, a request can lower or raise it with \"timeout\"")
+    cli_args = parser.parse_args()
+
+    if cli_args.socket is not None:
+        if os.path.exists(cli_args.socket):
+            os.remove(cli_args.socket)
+        server = UnixServer(cli_args.socket, UnixRequestHandler)
+        address = cli_args.socket
+    else:
+        server = HttpServer(("127.0.0.1", cli_args.port), HttpRequestHandler)
+        address = f"http://127.0.0.1:{cli_args.port}"
+    server.runner = JobRunner(cli_args.workers, cli_args.timeout)
+    print(f"listening on {address}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if cli_args.socket is not None:
+            os.remove(cli_args.socket)
@@ -1,9 +1,11 @@
+import os
+
 coeff = 1.2
 
 CX = "cx" # controlled not gate
 H = "h" # hadamard gate
 X = "x" # not gate
-CZ = "rzz" # phase gate 180 degrees
+CZ = "cz" # phase gate 180 degrees
 SWAP = "swap"
 I = "id"
 Y = "y"
@@ -11,5 +13,56 @@ Z = "z"
 T = "t"
 TDG = "tdg"
 S = "s"
-MCX = "mcx"
-CCX = "ccx"
\ No newline at end of file
+SDG = "sdg"
+MCX = "mcx" # not gate with any number of controls, the target is the last qubit
+CCX = "ccx"
+CSWAP = "cswap"
+# parametric gates, the angles are in radians
+U1 = "u1"
+U2 = "u2"
+U3 = "u3"
+RX = "rx"
+RY = "ry"
+RZ = "rz"
+CU1 = "cu1"
+
+# simulation backends
+Z3_BACKEND = "z3"
+NUMPY_BACKEND = "numpy"
+STABILIZER_BACKEND = "stabilizer"
+# the stabilizer backend when every gate is in CLIFFORD_GATES, z3 otherwise
+AUTO_BACKEND = "auto"
+
+# use a plain incremental z3 Solver queried with assumptions; when False an Optimize instance is used instead
+INCREMENTAL_SOLVER = True
+
+# intermediate SymbolicComplex values are plain z3 expressions, fresh variables are only created at gate boundaries
+# (Z3Qubit.get_vars) or when an expression has more than MAX_EXPRESSION_SIZE nodes
+EXPRESSION_DAG = True
+MAX_EXPRESSION_SIZE = 64
+
+# number of solver checks (and their models) remembered by each session, see query_memo.py. 0 disables the memo
+QUERY_MEMO_SIZE = 1024
+
+# gates with an encoding in Z3QuantumGate and NumpyStatevector, other gates are expanded by the OpenQASM front-end
+SUPPORTED_GATES = [X, H, CX, CZ, SWAP, I, Y, Z, T, TDG, S, SDG, CCX, MCX, CSWAP, U1, U2, U3, RX, RY, RZ, CU1]
+
+# gates with an encoding in StabilizerTableau, circuits made of them are simulated in polynomial time
+CLIFFORD_GATES = [H, S, SDG, X, Y, Z, CX, CZ, SWAP, I]
+
+# encoded circuits cached on disk (encoding_cache.py). Bump ENCODER_VERSION when the encoding of a gate changes, entries
+# of other versions are not reused
+ENCODER_VERSION = 2
+ENCODING_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "q_simulator")
+ENCODING_CACHE_SIZE = 1 << 30  # bytes
+
+# winners of the solver portfolio races (portfolio.py), one JSON object per line. It is kept per user and not in the
+# working directory, so the configuration picked by auto does not depend on where the simulator is run
+PORTFOLIO_LOG = os.path.join(os.path.expanduser("~"), ".local", "share", "q_simulator", "portfolio_log.jsonl")
+
+# OpenQASM front-ends
+QASM_FRONTEND = "qasm"
+QISKIT_FRONTEND = "qiskit"
+
+# number of instructions kept by the peephole optimizer before they are handed to the encoder
+PEEPHOLE_WINDOW = 1024
@@ -0,0 +1,95 @@
+import copy
+from typing import Any, Dict, List, NamedTuple, Tuple, Union
+
+import z3
+from query_memo import QueryMemo
+from settings import INCREMENTAL_SOLVER, QUERY_MEMO_SIZE
+
+
+class Checkpoint(NamedTuple):
+    # copies of the qubits (their current amplitudes, branch variable and counter), of the symbolic angles and of the
+    # session counters
+    mapping: Dict[str, Any]
+    angles: Dict[str, Tuple[z3.ArithRef, z3.ArithRef]]
+    local_counter: int
+    enumeration_counter: int
+    real_count: int
+    bool_count: int
+    assertion_count: int
+
+
+class Simulation:
+    """
+    State of one simulated circuit: its z3 Context and solver, its qubits and the counters used to name and count the
+    z3 variables. Sessions share nothing, so several circuits can be simulated in the same process (also in different
+    threads, as every session has its own z3 Context).
+    """
+    context: z3.Context
+    # queries never open a scope: they pass qubit literals as assumptions, so lemmas learned by z3 are kept. Scopes
+    # are only opened by push, to encode the variants of a circuit family on a shared prefix
+    solver: Union[z3.Solver, z3.Optimize]
+    # qubit names to Z3Qubit
+    mapping: Dict[str, Any]
+    # expressions of the symbolic gate parameters to their (cos, sin) z3 Reals, see parametric_gates.py
+    angles: Dict[str, Tuple[z3.ArithRef, z3.ArithRef]]
+    # constants
+    N1: z3.ArithRef
+    Z3ZERO: z3.ArithRef
+    # names of the intermediate SymbolicComplex values
+    local_counter: int
+    # names of the activation literals of AllSAT enumerations
+    enumeration_counter: int
+    # number of z3 Reals and branch Bools constrained by the encoding, and of asserted constraints
+    real_count: int
+    bool_count: int
+    assertion_count: int
+    # results of the checks made with assumptions, invalidated when a constraint is added
+    memo: QueryMemo
+    # amplitudes are ExactComplex (exact Clifford+T encoding) instead of SymbolicComplex
+    exact: bool
+    # one per open scope, see push
+    checkpoints: List[Checkpoint]
+
+    def __init__(self, incremental: bool = INCREMENTAL_SOLVER, exact: bool = False):
+        self.context = z3.Context()
+        self.solver = z3.Solver(ctx=self.context) if incremental else z3.Optimize(ctx=self.context)
+        self.mapping = dict()
+        self.angles = dict()
+        self.N1 = z3.Real("sc_n1", self.context)
+        self.Z3ZERO = z3.Real("z3_zero", self.context)
+        self.local_counter = 0
+        self.enumeration_counter = 0
+        self.real_count = 0
+        self.bool_count = 0
+        self.assertion_count = 0
+        self.memo = QueryMemo(QUERY_MEMO_SIZE)
+        self.exact = exact
+        self.checkpoints = []
+
+    def push(self) -> None:
+        """
+        Opens a solver scope and saves the state of the qubits, the gates encoded until the matching pop are undone by
+        it. The gates encoded before push are kept, so a prefix shared by several circuits is encoded once.
+        """
+        self.checkpoints.append(Checkpoint({name: copy.copy(qubit) for (name, qubit) in self.mapping.items()},
+                                           dict(self.angles), self.local_counter, self.enumeration_counter,
+                                           self.real_count, self.bool_count, self.assertion_count))
+        self.solver.push()
+
+    def pop(self) -> None:
+        """
+        Removes the constraints added since the last push and restores the qubits (qubits created since then are
+        removed) and the counters
+        """
+        if len(self.checkpoints) == 0:
+            raise Exception("There is no scope to pop")
+        self.solver.pop()
+        checkpoint = self.checkpoints.pop()
+        self.mapping = checkpoint.mapping
+        self.angles = checkpoint.angles
+        self.local_counter = checkpoint.local_counter
+        self.enumeration_counter = checkpoint.enumeration_counter
+        self.real_count = checkpoint.real_count
+        self.bool_count = checkpoint.bool_count
+        self.assertion_count = checkpoint.assertion_count
+        self.memo.clear()
@@ -0,0 +1,67 @@
+from typing import Dict, List, Optional, Tuple
+
+import z3
+from static_solver import StaticSolver
+from symbolic_complex import SymbolicComplex
+from simulation import Simulation
+from exact_complex import get_complex_class
+
+# qubit name -> (name of its final z3 boolean, exponents of its final amplitudes for ExactComplex or None)
+ExportedQubits = Dict[str, Tuple[str, Optional[List[int]]]]
+
+
+class ImportedQubit:
+    """
+    Final state of a Z3Qubit rebuilt from an exported encoding. The amplitudes are the reals
+    r_final_z_<name>/im_final_z_<name> (and final_o) defined by the exported formula, or the integer coefficients
+    w<power>_final_z_<name> of the exact encoding.
+    """
+    name: str
+    qubit: z3.Bool
+    zero_amplitude: SymbolicComplex
+    one_amplitude: SymbolicComplex
+
+    def __init__(self, session: Simulation, name: str, qubit_name: str, exponents: Optional[List[int]] = None):
+        """
+        :param exponents: powers of sqrt(2) of the exact amplitudes, None until they are defined (see export_encoding)
+        """
+        self.name = name
+        self.qubit = z3.Bool(qubit_name, session.context)
+        self.zero_amplitude = get_complex_class(session)(session, f"final_z_{name}")
+        self.one_amplitude = get_complex_class(session)(session, f"final_o_{name}")
+        if exponents is not None:
+            self.zero_amplitude.exponent, self.one_amplitude.exponent = exponents
+
+
+def export_encoding(session: Simulation) -> Tuple[str, ExportedQubits]:
+    """
+    Serializes the assertions of a session as SMT-LIB2, together with definitions of the final amplitudes of every
+    qubit of its mapping
+    :return: SMT-LIB2 text, and dictionary from qubit names to the name of their final z3 boolean and, in exact
+    sessions, the exponents of their final amplitudes
+    """
+    solver = z3.Solver(ctx=session.context)
+    solver.add(session.solver.assertions())
+    qubits = dict()
+    for (name, z3qubit) in session.mapping.items():
+        imported = ImportedQubit(session, name, z3qubit.qubit.decl().name())
+        solver.add(imported.zero_amplitude.define(z3qubit.zero_amplitude))
+        solver.add(imported.one_amplitude.define(z3qubit.one_amplitude))
+        exponents = None
+        if session.exact:
+            exponents = [imported.zero_amplitude.exponent, imported.one_amplitude.exponent]
+        qubits[name] = (z3qubit.qubit.decl().name(), exponents)
+    return solver.sexpr(), qubits
+
+
+def load_encoding(smt2: str, qubits: ExportedQubits) -> Simulation:
+    """
+    Loads an exported encoding (see export_encoding) into a new session
+    :return: the session, its mapping goes from qubit names to ImportedQubit and can be used by every StaticSolver
+    query
+    """
+    session = Simulation(exact=any(exponents is not None for (_, exponents) in qubits.values()))
+    StaticSolver.add(session, z3.parse_smt2_string(smt2, ctx=session.context))
+    for (name, (qubit_name, exponents)) in qubits.items():
+        session.mapping[name] = ImportedQubit(session, name, qubit_name, exponents)
+    return session
@@ -0,0 +1,235 @@
+from random import getrandbits
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from settings import *
+
+WORD_SIZE = 64
+
+
+def get_popcount(words: np.ndarray) -> np.ndarray:
+    # number of set bits in each row of uint64 words
+    return np.unpackbits(np.ascontiguousarray(words).view(np.uint8), axis=-1).sum(axis=-1, dtype=np.int64)
+
+
+class StabilizerTableau:
+    """
+    Aaronson-Gottesman tableau of a stabilizer state. Rows 0..n-1 are the destabilizers, rows n..2n-1 the stabilizers
+    and row 2n is scratch space. The X and Z bits of each row are packed in uint64 words (bit j of a row is qubit j), so
+    gates update one bit column of every row at once and the product of two rows is a few word operations. Gates,
+    measurements and outcome probabilities take polynomial time.
+    """
+    qubits: List[str]
+    index: Dict[str, int]
+    # (2n + 1) x words
+    x: np.ndarray
+    z: np.ndarray
+    # sign of each row, 1 for -1
+    r: np.ndarray
+
+    def __init__(self, qubits: List[str]):
+        self.qubits = []
+        self.index = dict()
+        self.x = np.zeros((1, 1), dtype=np.uint64)
+        self.z = np.zeros((1, 1), dtype=np.uint64)
+        self.r = np.zeros(1, dtype=np.uint8)
+        for name in qubits:
+            self.add_qubit(name)
+
+    def copy(self) -> 'StabilizerTableau':
+        answer = StabilizerTableau([])
+        answer.qubits = list(self.qubits)
+        answer.index = dict(self.index)
+        answer.x = self.x.copy()
+        answer.z = self.z.copy()
+        answer.r = self.r.copy()
+        return answer
+
+    @staticmethod
+    def get_position(qubit: int) -> Tuple[int, np.uint64]:
+        return qubit // WORD_SIZE, np.uint64(1) << np.uint64(qubit % WORD_SIZE)
+
+    def add_qubit(self, name: str) -> None:
+        # the new qubit is in |0>: destabilizer X and stabilizer Z
+        n = len(self.qubits)
+        words = n // WORD_SIZE + 1
+        x = np.zeros((2 * n + 3, words), dtype=np.uint64)
+        z = np.zeros((2 * n + 3, words), dtype=np.uint64)
+        r = np.zeros(2 * n + 3, dtype=np.uint8)
+        old_words = self.x.shape[1]
+        # destabilizers, then stabilizers, the scratch row is left empty
+        x[:n, :old_words] = self.x[:n]
+        z[:n, :old_words] = self.z[:n]
+        r[:n] = self.r[:n]
+        x[n + 1:2 * n + 1, :old_words] = self.x[n:2 * n]
+        z[n + 1:2 * n + 1, :old_words] = self.z[n:2 * n]
+        r[n + 1:2 * n + 1] = self.r[n:2 * n]
+        word, bit = StabilizerTableau.get_position(n)
+        x[n, word] |= bit
+        z[2 * n + 1, word] |= bit
+        self.x, self.z, self.r = x, z, r
+        self.index[name] = n
+        self.qubits.append(name)
+
+    def get_column(self, bits: np.ndarray, qubit: int) -> np.ndarray:
+        # bit of the qubit in every row, as uint8
+        word, bit = StabilizerTableau.get_position(qubit)
+        return ((bits[:, word] & bit) != 0).astype(np.uint8)
+
+    def set_column(self, bits: np.ndarray, qubit: int, column: np.ndarray) -> None:
+        word, bit = StabilizerTableau.get_position(qubit)
+        bits[:, word] = np.where(column != 0, bits[:, word] | bit, bits[:, word] & ~bit)
+
+    def hadamard(self, a: int) -> None:
+        xa = self.get_column(self.x, a)
+        za = self.get_column(self.z, a)
+        self.r ^= xa & za
+        self.set_column(self.x, a, za)
+        self.set_column(self.z, a, xa)
+
+    def phase(self, a: int) -> None:
+        xa = self.get_column(self.x, a)
+        za = self.get_column(self.z, a)
+        self.r ^= xa & za
+        self.set_column(self.z, a, za ^ xa)
+
+    def cnot(self, a: int, b: int) -> None:
+        xa = self.get_column(self.x, a)
+        za = self.get_column(self.z, a)
+        xb = self.get_column(self.x, b)
+        zb = self.get_column(self.z, b)
+        self.r ^= xa & zb & (xb ^ za ^ 1)
+        self.set_column(self.x, b, xb ^ xa)
+        self.set_column(self.z, a, za ^ zb)
+
+    def apply(self, op: str, args: List[str], params: Tuple[float, ...] = ()) -> None:
+        qubits = [self.index[name] for name in args]
+        if op == H:
+            self.hadamard(qubits[0])
+        elif op == S:
+            self.phase(qubits[0])
+        elif op == SDG:
+            for _ in range(3):
+                self.phase(qubits[0])
+        elif op == X:
+            self.r ^= self.get_column(self.z, qubits[0])
+        elif op == Z:
+            self.r ^= self.get_column(self.x, qubits[0])
+        elif op == Y:
+            self.r ^= self.get_column(self.x, qubits[0]) ^ self.get_column(self.z, qubits[0])
+        elif op == CX:
+            self.cnot(qubits[0], qubits[1])
+        elif op == CZ:
+            self.hadamard(qubits[1])
+            self.cnot(qubits[0], qubits[1])
+            self.hadamard(qubits[1])
+        elif op == SWAP:
+            # the qubits are relabeled, as in the z3 encoding
+            first, second = args
+            self.index[first], self.index[second] = self.index[second], self.index[first]
+        elif op != I:
+            raise Exception(f"Gate ({op}) is not a Clifford gate")
+
+    def rowsum(self, targets: np.ndarray, source: int) -> None:
+        """
+        Multiplies every target row by the source row, the signs follow the phases of the Pauli products
+        """
+        x1 = self.x[source]
+        z1 = self.z[source]
+        x2 = self.x[targets]
+        z2 = self.z[targets]
+        # the product of the Paulis of a qubit adds a phase i^g, g in {-1, 0, 1}
+        positive = (x1 & z1 & ~x2 & z2) | (x1 & ~z1 & x2 & z2) | (~x1 & z1 & x2 & ~z2)
+        negative = (x1 & z1 & x2 & ~z2) | (x1 & ~z1 & ~x2 & z2) | (~x1 & z1 & x2 & z2)
+        g = get_popcount(positive) - get_popcount(negative)
+        total = 2 * self.r[targets].astype(np.int64) + 2 * int(self.r[source]) + g
+        self.r[targets] = (np.mod(total, 4) == 2).astype(np.uint8)
+        self.x[targets] = x2 ^ x1
+        self.z[targets] = z2 ^ z1
+
+    def measure(self, qubit: str, outcome: Optional[bool] = None) -> Tuple[bool, bool]:
+        """
+        Measures a qubit in the computational basis, the state collapses
+        :param outcome: value forced when the outcome is random, by default it is drawn uniformly
+        :return: the outcome, and whether it was random (probability 1/2) or determined by the state
+        """
+        n = len(self.qubits)
+        a = self.index[qubit]
+        xa = self.get_column(self.x, a)
+        candidates = np.nonzero(xa[n:2 * n])[0]
+        if len(candidates) > 0:
+            p = n + int(candidates[0])
+            rows = np.nonzero(xa[:2 * n])[0]
+            rows = rows[rows != p]
+            if len(rows) > 0:
+                self.rowsum(rows, p)
+            # the anticommuting stabilizer becomes a destabilizer and Z_a (with the outcome as sign) a stabilizer
+            self.x[p - n] = self.x[p]
+            self.z[p - n] = self.z[p]
+            self.r[p - n] = self.r[p]
+            self.x[p] = 0
+            self.z[p] = 0
+            word, bit = StabilizerTableau.get_position(a)
+            self.z[p, word] = bit
+            value = bool(getrandbits(1)) if outcome is None else outcome
+            self.r[p] = int(value)
+            return value, True
+        # the outcome is the sign of the product of the stabilizers whose destabilizers anticommute with Z_a
+        self.x[2 * n] = 0
+        self.z[2 * n] = 0
+        self.r[2 * n] = 0
+        for i in np.nonzero(xa[:n])[0]:
+            self.rowsum(np.array([2 * n]), n + int(i))
+        return bool(self.r[2 * n]), False
+
+    def get_state_probability(self, state: Dict[str, bool]) -> float:
+        # qubits that are not in the state are summed out
+        tableau = self.copy()
+        probability = 1.0
+        for (name, value) in state.items():
+            outcome, is_random = tableau.measure(name, value)
+            if is_random:
+                probability /= 2
+            elif outcome != value:
+                return 0.0
+        return probability
+
+    def iter_support(self, qubits: Optional[List[str]] = None) -> Iterator[Tuple[Dict[str, bool], float]]:
+        """
+        Enumerates the states of the qubits with a non-zero probability, every random outcome is a branch
+        :return: generator of (state, probability), in lexicographic order of the qubits
+        """
+        qubits = self.qubits if qubits is None else qubits
+        stack = [(self.copy(), 0, dict(), 1.0)]
+        while len(stack) > 0:
+            tableau, i, state, probability = stack.pop()
+            while i < len(qubits):
+                outcome, is_random = tableau.copy().measure(qubits[i])
+                if is_random:
+                    probability /= 2
+                    one = tableau.copy()
+                    one.measure(qubits[i], True)
+                    stack.append((one, i + 1, {**state, qubits[i]: True}, probability))
+                    tableau.measure(qubits[i], False)
+                    outcome = False
+                state = {**state, qubits[i]: outcome}
+                i += 1
+            yield state, probability
+
+    def get_highest_prob(self, qubits: Optional[List[str]] = None) -> Tuple[float, Dict[str, bool]]:
+        # every state of the support of a stabilizer state has the same probability
+        state, probability = next(self.iter_support(qubits))
+        return round(probability, 3), state
+
+    def get_counts(self, shots: int, qubits: Optional[List[str]] = None) -> Dict[str, int]:
+        """
+        :return: histogram of the measured states. As in qiskit get_counts, the first qubit is the rightmost bit of the
+        keys
+        """
+        qubits = self.qubits if qubits is None else qubits
+        counts: Dict[str, int] = dict()
+        for _ in range(shots):
+            tableau = self.copy()
+            key = "".join("1" if tableau.measure(name)[0] else "0" for name in qubits)[::-1]
+            counts[key] = counts.get(key, 0) + 1
+        return counts
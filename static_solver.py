@@ -1,44 +1,102 @@
-from typing import Optional, Dict, Any
+import heapq
+from itertools import islice
+from time import perf_counter
+from typing import Optional, Dict, Any, List, Iterator, Tuple, Union
 
-from z3 import Bool, sat, unsat, unknown, Optimize, RealVal, Real, If
+from z3 import Bool, BoolRef, sat, unsat, unknown, RealVal, Not, Or, Implies, is_true, is_rational_value
+from simulation import Simulation
+from query_memo import MemoEntry
+from profiler import Profiler, IS_VALUE_SAT, IS_STATE_SAT
+
+
+class SolverTimeout(Exception):
+    """
+    A check needed by a query was unknown (timeout, or a solver that cannot decide the formula)
+    """
+
+
+def to_float(value) -> float:
+    """
+    :param value: z3 numeral (rational or algebraic) obtained from a model
+    """
+    if is_rational_value(value):
+        return float(value.as_fraction())
+    return float(value.approx(10).as_fraction())
 
 
 class StaticSolver:
-    solver: Optimize = Optimize()
-    # constants
-    N1: Real = Real("sc_n1")
-    Z3ZERO: Real = Real("z3_zero")
+    """
+    Queries on the solver of a simulation session, every method takes the session explicitly
+    """
+
+    @staticmethod
+    def check(session: Simulation, *assumptions):
+        if not Profiler.enabled:
+            return session.solver.check(*assumptions)
+        start = perf_counter()
+        result = session.solver.check(*assumptions)
+        Profiler.record_check(perf_counter() - start, len(assumptions), result, session.solver.statistics())
+        return result
 
+    @staticmethod
+    def add(session: Simulation, *constraints, guarded: bool = False) -> None:
+        """
+        :param guarded: the constraints are implied by an activation literal that memoized queries never assume (or
+        they retire it), so they do not change the result of those queries and the memo of the session is kept
+        """
+        session.assertion_count += len(constraints)
+        session.solver.add(*constraints)
+        if not guarded:
+            session.memo.invalidate()
+
+    @staticmethod
+    def check_memoized(session: Simulation, assumptions: List[BoolRef]) -> MemoEntry:
+        """
+        Checks the conjunction of the assumptions, or reuses the result of the same check if it is still in the memo
+        of the session
+        :return: memo entry with the result, and the model when it is sat
+        """
+        entry = session.memo.get(assumptions)
+        if entry is None:
+            result = StaticSolver.check(session, *assumptions)
+            entry = session.memo.put(assumptions, result, session.solver.model() if result == sat else None)
+        return entry
+
+    @staticmethod
+    def add_constants(session: Simulation):
+        StaticSolver.add(session, session.N1 == RealVal(-1, session.context))
+        StaticSolver.add(session, session.Z3ZERO == RealVal(0, session.context))
 
     @staticmethod
-    def check():
-        return StaticSolver.solver.check()
+    def literal(var: Bool, value: bool) -> BoolRef:
+        if value:
+            return var
+        return Not(var)
 
     @staticmethod
-    def add_constants():
-        StaticSolver.solver.add(StaticSolver.N1 == RealVal(-1))
-        StaticSolver.solver.add(StaticSolver.Z3ZERO == RealVal(0))
+    def get_assumptions(mapping, state: Dict[str, bool]) -> List[BoolRef]:
+        return [StaticSolver.literal(mapping[var_name].qubit, value) for (var_name, value) in state.items()]
 
     @staticmethod
-    def is_value_sat(var: Bool, value: bool) -> Optional[bool]:
-        StaticSolver.solver.push()  # create new scope
-        StaticSolver.solver.add(var == value)
-        check_value = StaticSolver.check()
-        StaticSolver.solver.pop()  # restore state
+    def is_value_sat(session: Simulation, var: Bool, value: bool, assumptions: List[BoolRef] = ()) -> Optional[bool]:
+        start = perf_counter() if Profiler.enabled else None
+        check_value = StaticSolver.check_memoized(session, [*assumptions, StaticSolver.literal(var, value)]).result
+        if start is not None:
+            Profiler.record_query(IS_VALUE_SAT, perf_counter() - start)
         if check_value == sat:
             return True
         if check_value == unsat:
             return False
-        print(StaticSolver.solver.reason_unknown())
+        print(session.solver.reason_unknown())
         return None
 
     @staticmethod
-    def is_state_sat(state: Dict[Bool, bool]) -> Optional[bool]:
-        StaticSolver.solver.push()
-        for (var, value) in state.items():
-            StaticSolver.solver.add(var == value)
-        check_value = StaticSolver.check()
-        StaticSolver.solver.pop()
+    def is_state_sat(session: Simulation, state: Dict[Bool, bool]) -> Optional[bool]:
+        start = perf_counter() if Profiler.enabled else None
+        check_value = StaticSolver.check_memoized(session, [StaticSolver.literal(var, value)
+                                                            for (var, value) in state.items()]).result
+        if start is not None:
+            Profiler.record_query(IS_STATE_SAT, perf_counter() - start)
         if check_value == sat:
             return True
         if check_value == unsat:
@@ -46,8 +104,8 @@ class StaticSolver:
         return None
 
     @staticmethod
-    def model():
-        m = StaticSolver.solver.model()
+    def model(session: Simulation):
+        m = session.solver.model()
         print(m)
 
     @staticmethod
@@ -70,9 +128,10 @@ class StaticSolver:
         return vars_values
 
     @staticmethod
-    def get_objective_function(mapping, state) -> Any:
+    def get_objective_function(session: Simulation, mapping, state, assumptions: List[BoolRef]) -> Any:
         # because of entanglement we need a state beforehand
-        objective_function = 1.0
+        # the literals of the qubits already visited are appended to assumptions
+        objective_function = RealVal(1, session.context)
         # for (var_name, z3qubit) in mapping.items():
         #     # objective_function *= (z3qubit.one_amplitude.squared_norm()*z3qubit.qubit
         #     #                       + z3qubit.zero_amplitude.squared_norm()*Not(z3qubit.qubit))
@@ -83,11 +142,11 @@ class StaticSolver:
 
             z3qubit = mapping[var_name]
 
-            sat_curr_value = StaticSolver.is_value_sat(z3qubit.qubit, value)
-            sat_not_curr_value = StaticSolver.is_value_sat(z3qubit.qubit, not value)
-            StaticSolver.solver.add(z3qubit.qubit == value)
+            sat_curr_value = StaticSolver.is_value_sat(session, z3qubit.qubit, value, assumptions)
+            sat_not_curr_value = StaticSolver.is_value_sat(session, z3qubit.qubit, not value, assumptions)
+            assumptions.append(StaticSolver.literal(z3qubit.qubit, value))
             if sat_not_curr_value is None or sat_curr_value is None:
-                raise Exception("SAT solver timeout")
+                raise SolverTimeout("SAT solver timeout")
             if sat_curr_value:
                 if sat_not_curr_value:
                     if value:
@@ -101,50 +160,127 @@ class StaticSolver:
                 if not sat_not_curr_value:
                     raise Exception("this is weird, the qubit does not satisfies for any value")
                 else:
-                    objective_function *= RealVal(0.0)
+                    objective_function *= RealVal(0.0, session.context)
                     return objective_function
 
         return objective_function
 
 
     @staticmethod
-    def get_highest_prob(mapping: Dict[str, Any], is_binary_string = False):
-        # TODO: this doesnt work, entanglement does not allows to do this
-        # obj_f = StaticSolver.get_objective_function(mapping)
-        # y = Real("y")
-        # StaticSolver.solver.add(y == obj_f)
-        # StaticSolver.solver.maximize(y)
-        check_output = StaticSolver.solver.check()
-        if check_output == sat:
-            model = StaticSolver.solver.model()
-            return model
-            #return model[y].as_decimal(3), StaticSolver.get_last_state_from_model(model, mapping, is_binary_string)
-        elif check_output == unknown:
-            return "solver timeout"
-        else:
+    def iter_most_likely_states(session: Simulation, mapping) -> Iterator[Tuple[float, Dict[str, bool]]]:
+        """
+        Best-first branch and bound over partial assignments of the qubits (in name order). The probability of a
+        partial state (see get_objective_function) bounds the probability of every state that extends it, so the open
+        partial state with the highest bound is extended first and a complete state is only reached when no other
+        branch can beat it. Unsatisfiable branches are cut by the checks of get_objective_function, and the branches
+        below the k-th best state are never extended when only k states are consumed.
+        The bound of a child is the lower of its probability and the bound of its parent: the search assumes that
+        extending a prefix never makes it more likely. The result is only exact when the encoding is: the amplitudes are
+        evaluated in whatever model each check returns, and when they are approximate a pruned branch can hold a state
+        more likely than the ones yielded.
+        :return: generator of (probability, state), from the most likely state down
+        """
+        var_names = sorted(mapping.keys())
+        # (-bound, insertion order, partial state, its probability)
+        queue = [(-1.0, 0, dict(), 1.0)]
+        pushed = 1
+        while len(queue) > 0:
+            negative_bound, _, state, probability = heapq.heappop(queue)
+            if len(state) == len(var_names):
+                yield probability, state
+                continue
+            for value in [False, True]:
+                child = dict(state)
+                child[var_names[len(state)]] = value
+                check_output, _, child_probability = StaticSolver.evaluate_state_probability(session, child, mapping)
+                if check_output == unknown:
+                    raise SolverTimeout("SAT solver timeout")
+                if check_output == unsat:
+                    continue
+                child_probability = to_float(child_probability)
+                if child_probability <= 0:
+                    continue
+                heapq.heappush(queue, (max(negative_bound, -child_probability), pushed, child, child_probability))
+                pushed += 1
+
+    @staticmethod
+    def get_top_k(session: Simulation, mapping, k: int) -> List[Tuple[float, Dict[str, bool]]]:
+        """
+        :return: the k most likely states as (probability, state), fewer when less than k states are reachable
+        """
+        # the search stops as soon as the k-th state is found
+        return list(islice(StaticSolver.iter_most_likely_states(session, mapping), k))
+
+    @staticmethod
+    def get_highest_prob(session: Simulation, mapping: Dict[str, Any],
+                         is_binary_string=False) -> Union[str, Tuple[float, Any]]:
+        """
+        :return: (probability, state) of the most likely state, see iter_most_likely_states. With is_binary_string the
+        state is the string of the qubit values in name order
+        """
+        answer = StaticSolver.get_top_k(session, mapping, 1)
+        if len(answer) == 0:
             return "unsat"
+        probability, state = answer[0]
+        if is_binary_string:
+            state = "".join("1" if state[var_name] else "0" for var_name in sorted(state.keys()))
+        return round(probability, 3), state
 
     @staticmethod
     def print_amplitudes(model, mapping):
         for (key, z3qubit) in mapping.items():
-            print(key, model[z3qubit.zero_amplitude.real].as_decimal(3), model[z3qubit.one_amplitude.real].as_decimal(3))
+            print(key, model.eval(z3qubit.zero_amplitude.real).as_decimal(3),
+                  model.eval(z3qubit.one_amplitude.real).as_decimal(3))
 
     @staticmethod
-    def get_state_probability(state, mapping):
+    def evaluate_state_probability(session: Simulation, state, mapping) -> Tuple[Any, Any, Any]:
+        """
+        :return: the check result, and when it is sat the model and the probability of the state evaluated in it
+        """
+        assumptions = []
+        objective_function = StaticSolver.get_objective_function(session, mapping, state, assumptions)
+        entry = StaticSolver.check_memoized(session, assumptions)
+        if entry.result == sat:
+            return entry.result, entry.model, entry.evaluate(objective_function)
+        return entry.result, None, None
 
-        StaticSolver.solver.push()
-        y = Real("y")
-        StaticSolver.solver.add(y == StaticSolver.get_objective_function(mapping, state))
-        check_output = StaticSolver.solver.check()
+    @staticmethod
+    def get_state_probability(session: Simulation, state, mapping):
+        check_output, model, probability = StaticSolver.evaluate_state_probability(session, state, mapping)
 
         if check_output == sat:
-            model = StaticSolver.solver.model()
             #print(model)
             StaticSolver.print_amplitudes(model, mapping)
-            print(state, model[y].as_decimal(3))
+            print(state, probability.as_decimal(3))
         elif check_output == unknown:
             print("solver timeout")
         else:
             print(state, "unsat")
 
-        StaticSolver.solver.pop()
+    @staticmethod
+    def iter_reachable_states(session: Simulation, mapping) -> Iterator[Dict[str, bool]]:
+        """
+        Enumerates only the satisfiable assignments of the final qubit booleans (AllSAT with blocking clauses), so
+        the number of checks is the size of the support plus one instead of 2^n.
+        The blocking clauses are guarded by an activation literal that is only assumed here, they never constrain
+        the queries made while (or after) the states are consumed.
+        :return: generator of states, a dictionary mapping variable names to boolean values
+        """
+        var_names = sorted(mapping.keys())
+        activation = Bool(f"allsat_{session.enumeration_counter}", session.context)
+        session.enumeration_counter += 1
+        while True:
+            check_output = StaticSolver.check(session, activation)
+            if check_output == unknown:
+                raise SolverTimeout("SAT solver timeout")
+            if check_output == unsat:
+                break
+            model = session.solver.model()
+            state = dict()
+            for var_name in var_names:
+                state[var_name] = is_true(model.eval(mapping[var_name].qubit, model_completion=True))
+            yield state
+            StaticSolver.add(session, Implies(activation, Or([StaticSolver.literal(mapping[var_name].qubit, not value)
+                                                             for (var_name, value) in state.items()])), guarded=True)
+        # retire the blocking clauses
+        StaticSolver.add(session, Not(activation), guarded=True)
@@ -0,0 +1,106 @@
+import copy
+import math
+import multiprocessing
+from fractions import Fraction
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import z3
+from qasm_parser import SymbolicAngle
+from query_memo import QueryMemo
+from simulation import Simulation
+from static_solver import StaticSolver
+from smt_export import ExportedQubits, export_encoding, load_encoding
+from utils import to_float
+from settings import QUERY_MEMO_SIZE
+
+# values of the free parameters of a parametric circuit, in radians
+Point = Dict[str, float]
+Distribution = List[Tuple[Dict[str, bool], float]]
+# cos and sin of the angles are rationals, tan(angle / 2) is rounded to a fraction with at most this denominator
+MAX_DENOMINATOR = 10 ** 6
+EPSILON = 1e-12
+
+# set in every worker process by init_worker
+worker_session: Optional[Simulation] = None
+
+
+def get_circle_point(angle: float) -> Tuple[Fraction, Fraction]:
+    """
+    :return: rational cos and sin of (almost) the angle that are exactly on the unit circle, (1 - t^2, 2t) / (1 + t^2)
+    with t = tan(angle / 2), so that they satisfy the cos^2 + sin^2 = 1 constraint of the encoding
+    """
+    if abs(math.cos(angle / 2)) < EPSILON:
+        return Fraction(-1), Fraction(0)
+    t = Fraction(math.tan(angle / 2)).limit_denominator(MAX_DENOMINATOR)
+    return (1 - t * t) / (1 + t * t), 2 * t / (1 + t * t)
+
+
+def get_point_session(session: Simulation, point: Point) -> Simulation:
+    """
+    Session of the circuit at one point: the encoding of the session with the cos and sin of its symbolic angles
+    replaced by their (rational) values, in a new solver of the same z3 Context. The qubits and the angles are shared
+    with the session, which is not changed.
+    The values are substituted and not assumed, a product of a symbolic angle and an amplitude stays non-linear for z3
+    even when the angle is fixed by an assumption.
+    """
+    substitutions = []
+    for (expression, (cos_angle, sin_angle)) in session.angles.items():
+        cos_value, sin_value = get_circle_point(SymbolicAngle(expression).evaluate(point))
+        substitutions.append((cos_angle, z3.RealVal(str(cos_value), session.context)))
+        substitutions.append((sin_angle, z3.RealVal(str(sin_value), session.context)))
+    answer = copy.copy(session)
+    answer.solver = z3.Solver(ctx=session.context)
+    answer.memo = QueryMemo(QUERY_MEMO_SIZE)
+    answer.checkpoints = []
+    answer.solver.add([z3.substitute(assertion, *substitutions) for assertion in session.solver.assertions()])
+    return answer
+
+
+def evaluate_point(session: Simulation, point: Point, qubits: Optional[List[str]] = None) -> Distribution:
+    """
+    Evaluates the encoded parametric circuit at one point, the gates are not encoded again
+    :param qubits: the distribution of these qubits (the others are summed out), by default of all of them
+    :return: list of (reachable state, probability)
+    """
+    point_session = get_point_session(session, point)
+    mapping = point_session.mapping
+    if qubits is not None:
+        mapping = {name: point_session.mapping[name] for name in qubits}
+    answer = []
+    for state in StaticSolver.iter_reachable_states(point_session, mapping):
+        _, _, probability = StaticSolver.evaluate_state_probability(point_session, state, point_session.mapping)
+        answer.append((state, to_float(probability)))
+    return answer
+
+
+def init_worker(smt2: str, qubits: ExportedQubits, angles: Dict[str, Tuple[str, str]]) -> None:
+    # each worker process parses the formula into its own session, as in parallel.py
+    global worker_session
+    worker_session = load_encoding(smt2, qubits)
+    context = worker_session.context
+    worker_session.angles = {expression: (z3.Real(cos_name, context), z3.Real(sin_name, context))
+                             for (expression, (cos_name, sin_name)) in angles.items()}
+
+
+def evaluate_task(task: Tuple[Point, Optional[List[str]]]) -> Distribution:
+    point, qubits = task
+    return evaluate_point(worker_session, point, qubits)
+
+
+def iter_sweep(session: Simulation, points: List[Point], qubits: Optional[List[str]] = None,
+               workers: int = 1) -> Iterator[Tuple[Point, Distribution]]:
+    """
+    Evaluates the encoded parametric circuit at every point. With several workers the encoding is exported once as
+    SMT-LIB2 and the points are split among the worker processes
+    :return: generator of (point, distribution as in evaluate_point), in the order of the points
+    """
+    if workers <= 1:
+        for point in points:
+            yield point, evaluate_point(session, point, qubits)
+        return
+    smt2, exported_qubits = export_encoding(session)
+    angles = {expression: (str(cos_angle), str(sin_angle))
+              for (expression, (cos_angle, sin_angle)) in session.angles.items()}
+    with multiprocessing.get_context("fork").Pool(workers, initializer=init_worker,
+                                                  initargs=(smt2, exported_qubits, angles)) as pool:
+        yield from zip(points, pool.imap(evaluate_task, [(point, qubits) for point in points]))
@@ -1,79 +1,208 @@
+from typing import Optional, List, Tuple
+
 import z3
+from simulation import Simulation
 from static_solver import StaticSolver
+from settings import EXPRESSION_DAG, MAX_EXPRESSION_SIZE
+
+
+def linear_combination(terms: List[Tuple[float, z3.ArithRef]], context: z3.Context) -> z3.ArithRef:
+    """
+    :param terms: list of (python coefficient, z3 term)
+    :return: sum of coefficient * term, terms with coefficient 0 are dropped
+    """
+    answer = None
+    for (coefficient, term) in terms:
+        if coefficient == 0:
+            continue
+        if coefficient == 1:
+            summand = term
+        elif coefficient == -1:
+            summand = -term
+        else:
+            summand = coefficient * term
+        answer = summand if answer is None else answer + summand
+    if answer is None:
+        return z3.RealVal(0, context)
+    return answer
 
 
 class SymbolicComplex(object):
-    real: z3.Real
-    im: z3.Real
-    local_counter: int = 0
+    # there is one instance per amplitude and per expression node, they only hold the fields below
+    __slots__ = ["session", "name", "z3_real", "z3_im", "value", "size"]
+    session: Simulation
+    # name of the variables r_<name>/im_<name>, None for constants and expressions
+    name: Optional[str]
+    # terms of real/im. Constants and variables that are not defined by an expression build them on first use, so the
+    # temporary amplitudes that are never bound (see Z3Qubit.bind) create no z3 terms
+    z3_real: Optional[z3.ArithRef]
+    z3_im: Optional[z3.ArithRef]
+    # numeric value known at encoding time, None when the value depends on a branch variable
+    value: Optional[complex]
+    # number of nodes of the expression tree behind real/im, 1 for variables and constants
+    size: int
 
     @staticmethod
-    def to_complex(a):
+    def to_complex(session: Simulation, a):
         if isinstance(a, SymbolicComplex):
             return a
-        elif isinstance(a, complex):
-            SymbolicComplex.local_counter += 1
-            return SymbolicComplex(f"const_{SymbolicComplex.local_counter}", a.real, a.imag)
-        else:
-            SymbolicComplex.local_counter += 1
-            return SymbolicComplex(f"const_{SymbolicComplex.local_counter}", a, 0)
+        return SymbolicComplex.from_value(session, a)
+
+    @staticmethod
+    def from_value(session: Simulation, value) -> 'SymbolicComplex':
+        # constants are folded in python, they do not create z3 variables nor constraints
+        return SymbolicComplex(session, None, value=complex(value))
 
-    def __init__(self, name: str, real: float = None, im: float = None):
-        self.real = z3.Real("r_" + name)
-        self.im = z3.Real("im_" + name)
+    @staticmethod
+    def from_expression(session: Simulation, prefix: str, real: z3.ArithRef, im: z3.ArithRef,
+                        size: int) -> 'SymbolicComplex':
+        """
+        result of an arithmetic operation. In expression DAG mode it is kept as a plain z3 expression, otherwise (or
+        when the expression grows past MAX_EXPRESSION_SIZE) it is defined by fresh variables
+        """
+        index = session.local_counter
+        session.local_counter += 1
+        if EXPRESSION_DAG and size <= MAX_EXPRESSION_SIZE:
+            return SymbolicComplex(session, None, real, im, size=size)
+        return SymbolicComplex(session, f"{prefix}_{index}", real, im)
+
+    def __init__(self, session: Simulation, name: Optional[str], real: float = None, im: float = None,
+                 value: complex = None, size: int = 1):
+        self.session = session
+        self.name = None if value is not None else name
+        self.value = value
+        self.size = size
+        # expression node (see from_expression), or built on first use
+        self.z3_real = real if name is None else None
+        self.z3_im = im if name is None else None
+        if value is not None or name is None:
+            return
         if real is not None:
-            StaticSolver.solver.add(self.real == real)
+            session.real_count += 2
+            StaticSolver.add(session, self.real == real)
             assert(im is not None)
-            StaticSolver.solver.add(self.im == im)
+            StaticSolver.add(session, self.im == im)
         else:
             assert(im is None)
 
+    @property
+    def real(self) -> z3.ArithRef:
+        if self.z3_real is None:
+            if self.value is not None:
+                self.z3_real = z3.RealVal(self.value.real, self.session.context)
+            else:
+                self.z3_real = z3.Real("r_" + self.name, self.session.context)
+        return self.z3_real
+
+    @property
+    def im(self) -> z3.ArithRef:
+        if self.z3_im is None:
+            if self.value is not None:
+                self.z3_im = z3.RealVal(self.value.imag, self.session.context)
+            else:
+                self.z3_im = z3.Real("im_" + self.name, self.session.context)
+        return self.z3_im
+
+    def is_constant(self) -> bool:
+        return self.value is not None
+
+    def define(self, amplitude: 'SymbolicComplex') -> z3.BoolRef:
+        """
+        :return: constraint that defines this variable as the amplitude
+        """
+        return self == amplitude
 
     def conjugate(self):
-        name = f"conj_{SymbolicComplex.local_counter}"
-        SymbolicComplex.local_counter += 1
-        return SymbolicComplex(name, self.real, -1*self.im)
+        if self.is_constant():
+            return SymbolicComplex.from_value(self.session, self.value.conjugate())
+        return SymbolicComplex.from_expression(self.session, "conj", self.real, -1*self.im, self.size + 1)
 
     def __add__(self, other):
-        other = SymbolicComplex.to_complex(other)
-        name = f"add_{SymbolicComplex.local_counter}"
-        SymbolicComplex.local_counter += 1
-        return SymbolicComplex(name,self.real + other.real, self.im + other.im)
+        other = SymbolicComplex.to_complex(self.session, other)
+        if self.is_constant() and other.is_constant():
+            return SymbolicComplex.from_value(self.session, self.value + other.value)
+        if other.value == 0:
+            return self
+        if self.value == 0:
+            return other
+        return SymbolicComplex.from_expression(self.session, "add", self.real + other.real, self.im + other.im,
+                                               self.size + other.size + 1)
 
     def __eq__(self, other):
-        other =  SymbolicComplex.to_complex(other)
+        other =  SymbolicComplex.to_complex(self.session, other)
         return z3.And(self.real == other.real, self.im == other.im)
 
+    def scale(self, c: complex):
+        """
+        multiplication by a python scalar, the result is a linear expression of self
+        """
+        c = complex(c)
+        if self.is_constant():
+            return SymbolicComplex.from_value(self.session, self.value * c)
+        if c == 1:
+            return self
+        if c == 0:
+            return SymbolicComplex.from_value(self.session, 0)
+        context = self.session.context
+        return SymbolicComplex.from_expression(self.session, "mul",
+                                               linear_combination([(c.real, self.real), (-c.imag, self.im)], context),
+                                               linear_combination([(c.imag, self.real), (c.real, self.im)], context),
+                                               self.size + 1)
+
     def __mul__(self, other):
-        other = SymbolicComplex.to_complex(other)
-        name = f"mul_{SymbolicComplex.local_counter}"
-        SymbolicComplex.local_counter +=1
-        answer = SymbolicComplex(name, other.real * self.real - other.im * self.im, other.im * self.real + other.real * self.im)
+        other = SymbolicComplex.to_complex(self.session, other)
+        if other.is_constant():
+            return self.scale(other.value)
+        if self.is_constant():
+            return other.scale(self.value)
+        answer = SymbolicComplex.from_expression(self.session, "mul", other.real * self.real - other.im * self.im,
+                                                 other.im * self.real + other.real * self.im,
+                                                 self.size + other.size + 1)
         return answer
 
     def __sub__(self, other):
-        other = SymbolicComplex.to_complex(other)
-        name = f"sub_{SymbolicComplex.local_counter}"
-        SymbolicComplex.local_counter += 1
-        return SymbolicComplex(name, self.real - other.real, self.im - other.im)
+        other = SymbolicComplex.to_complex(self.session, other)
+        if self.is_constant() and other.is_constant():
+            return SymbolicComplex.from_value(self.session, self.value - other.value)
+        if other.value == 0:
+            return self
+        return SymbolicComplex.from_expression(self.session, "sub", self.real - other.real, self.im - other.im,
+                                               self.size + other.size + 1)
 
     def inv(self):
+        if self.is_constant() and self.value != 0:
+            return SymbolicComplex.from_value(self.session, 1 / self.value)
         den = self.real * self.real + self.im * self.im
-        name = f"inv_{SymbolicComplex.local_counter}"
-        SymbolicComplex.local_counter += 1
-        return SymbolicComplex(name, self.real / den, -self.im / den)
+        return SymbolicComplex.from_expression(self.session, "inv", self.real / den, -self.im / den,
+                                               2 * self.size + 1)
 
     def __truediv__(self, other):
-        other = SymbolicComplex.to_complex(other)
+        other = SymbolicComplex.to_complex(self.session, other)
+        if other.is_constant() and other.value != 0:
+            return self.scale(1 / other.value)
         inv_other = other.inv()
         return self.__mul__(inv_other)
 
     def __rdiv__(self, other):
-        other = SymbolicComplex.to_complex(other)
+        other = SymbolicComplex.to_complex(self.session, other)
         return self.inv().__mul__(other)
 
     def squared_norm(self) -> z3.Real:
+        if self.is_constant():
+            return z3.RealVal(self.value.real ** 2 + self.value.imag ** 2, self.session.context)
+        if EXPRESSION_DAG:
+            return self.real * self.real + self.im * self.im
         conj = self.conjugate()
         return self.__mul__(conj).real
 
-
+    @staticmethod
+    def select(condition: z3.BoolRef, then_value: 'SymbolicComplex', else_value: 'SymbolicComplex') -> 'SymbolicComplex':
+        """
+        If-then-else over complex values, folded when both branches are the same value
+        """
+        if then_value is else_value or (then_value.is_constant() and then_value.value == else_value.value):
+            return then_value
+        return SymbolicComplex.from_expression(then_value.session, "if",
+                                               z3.If(condition, then_value.real, else_value.real),
+                                               z3.If(condition, then_value.im, else_value.im),
+                                               then_value.size + else_value.size + 1)
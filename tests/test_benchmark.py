@@ -0,0 +1,63 @@
+import json
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark import MEMORY_OVERHEAD, find_regressions, find_over_budget, run_with_timeout
+from settings import Z3_BACKEND
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_benchmark(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, os.path.join(ROOT, "benchmark.py"), "--suite", "small", "--filter",
+                           "deutsch_n2", *args], cwd=ROOT, capture_output=True, text=True, timeout=300)
+
+
+def test_find_regressions():
+    old = {"circuit": "small/a.qasm", "status": "sat", "parse_time": 0.1, "encoding_time": 1.0, "check_time": 1.0,
+           "assertions": 100}
+    same = dict(old, encoding_time=1.1)
+    assert find_regressions([same], [old], 0.25) == []
+    slower = dict(old, check_time=3.0)
+    assert len(find_regressions([slower], [old], 0.25)) == 1
+    larger = dict(old, assertions=200)
+    assert find_regressions([larger], [old], 0.25) == ["small/a.qasm: assertions 100 -> 200"]
+    failed = dict(old, status="timeout")
+    assert find_regressions([failed], [old], 0.25) == ["small/a.qasm: status sat -> timeout"]
+
+
+def test_baseline(tmp_path):
+    output = str(tmp_path / "results")
+    baseline = str(tmp_path / "baseline.json")
+    # a missing baseline that was asked for fails the run
+    completed = run_benchmark("--output", output, "--baseline", baseline)
+    assert completed.returncode == 1
+    assert "no baseline" in completed.stdout
+
+    assert run_benchmark("--output", output, "--baseline", baseline, "--save-baseline").returncode == 0
+    completed = run_benchmark("--output", output, "--baseline", baseline)
+    assert completed.returncode == 0, completed.stdout
+    assert "no regressions" in completed.stdout
+
+    with open(baseline) as file:
+        results = json.load(file)
+    for result in results:
+        result["assertions"] = 1
+    with open(baseline, "w") as file:
+        json.dump(results, file)
+    completed = run_benchmark("--output", output, "--baseline", baseline)
+    assert completed.returncode == 1
+    assert "REGRESSIONS" in completed.stdout
+
+
+def test_memory_metrics():
+    result = run_with_timeout("small/deutsch_n2/deutsch_n2.qasm", Z3_BACKEND, False, False, 60.0, memory=True)
+    assert result["status"] == "sat"
+    for field in ["python_peak_kb", "z3_memory_kb", "bytes_per_gate"]:
+        assert result[field] >= 0
+    assert find_over_budget([result], 10 ** 9) == []
+    # a budget of 0 bytes per gate only leaves the fixed overhead
+    assert len(find_over_budget([dict(result, z3_memory_kb=MEMORY_OVERHEAD // 1024 + 1)], 0)) == 1
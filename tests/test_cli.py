@@ -0,0 +1,90 @@
+import ast
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARKS = os.path.join(ROOT, "benchmarks", "small")
+
+
+def run_script(script: str, *args: str) -> str:
+    completed = subprocess.run([sys.executable, os.path.join(ROOT, script), *args], cwd=ROOT, capture_output=True,
+                               text=True, timeout=300)
+    assert completed.returncode == 0, completed.stderr
+    return completed.stdout
+
+
+def get_circuit(name: str) -> str:
+    return os.path.join(BENCHMARKS, name, f"{name}.qasm")
+
+
+def test_main_clusters_with_qubits():
+    for name in ["bell_n4", "deutsch_n2"]:
+        output = run_script("main.py", get_circuit(name), "--clusters", "--qubits", "q[0]")
+        probability, state = ast.literal_eval(output.strip())
+        assert isinstance(probability, float)
+        assert list(state.keys()) == ["q_0"]
+        # the same marginal distribution as get_all_probs.py
+        distribution = []
+        for line in run_script("get_all_probs.py", get_circuit(name), "--clusters", "--qubits", "q[0]").splitlines():
+            line_state, line_probability = line.rsplit(" ", 1)
+            distribution.append((float(line_probability), ast.literal_eval(line_state)))
+        assert probability == max(item[0] for item in distribution)
+        assert (probability, state) in distribution
+
+
+def test_main_portfolio_most_likely(tmp_path):
+    circuit = get_circuit("deutsch_n2")
+    expected = ast.literal_eval(run_script("main.py", circuit).strip())
+    log = tmp_path / "portfolio_log.jsonl"
+    output = run_script("main.py", circuit, "--portfolio", "solver", "seed-1", "--portfolio-log", str(log))
+    assert ast.literal_eval(output.strip()) == expected
+    # the race is only logged in the given file
+    assert len(log.read_text().splitlines()) == 1
+
+
+def parse_states(output: str) -> dict:
+    """
+    :return: the value printed after each state, the serial z3 output also prints the amplitudes of the qubits
+    """
+    answer = dict()
+    for line in output.splitlines():
+        if line.startswith("{"):
+            state, value = line.rsplit("} ", 1)
+            answer[state + "}"] = value
+    return answer
+
+
+def test_get_all_probs_workers():
+    for name in ["deutsch_n2", "cat_state_n4"]:
+        for flags in [[], ["--amplitudes"]]:
+            serial = parse_states(run_script("get_all_probs.py", get_circuit(name), *flags))
+            assert len(serial) > 0
+            assert parse_states(run_script("get_all_probs.py", get_circuit(name), "--workers", "3", *flags)) == serial
+
+
+def test_main_top_matches_sorted_distribution():
+    for name in ["deutsch_n2", "grover_n2", "teleportation_n3"]:
+        k = 3
+        top = []
+        for line in run_script("main.py", get_circuit(name), "--top", str(k)).splitlines():
+            probability, state = line.split(" ", 1)
+            top.append((float(probability), ast.literal_eval(state)))
+        # get_all_probs.py prints the probabilities truncated to 3 decimals (with a trailing ?), --top skips the states
+        # of probability 0
+        distribution = {repr(ast.literal_eval(state)): float(value.rstrip("?"))
+                        for (state, value) in parse_states(run_script("get_all_probs.py", get_circuit(name))).items()
+                        if value not in ["unsat", "0"]}
+        expected = sorted(distribution.values(), reverse=True)[:k]
+        assert len(top) == len(expected)
+        for ((probability, state), expected_probability) in zip(top, expected):
+            assert abs(probability - expected_probability) < 2e-3
+            assert abs(probability - distribution[repr(state)]) < 2e-3
+
+
+def test_get_all_probs_allsat_matches_enumeration():
+    for name in ["deutsch_n2", "cat_state_n4", "toffoli_n3"]:
+        enumeration = parse_states(run_script("get_all_probs.py", get_circuit(name)))
+        reachable = {state: value for (state, value) in enumeration.items() if value != "unsat"}
+        assert len(reachable) > 0
+        assert parse_states(run_script("get_all_probs.py", get_circuit(name), "--allsat")) == reachable
@@ -0,0 +1,38 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clusters import split_instructions, solve_clusters, combine, get_highest_prob, solve_cluster
+from qasm_parser import parse_qasm_string
+
+TEXT = """OPENQASM 2.0;
+include "qelib1.inc";
+qreg q[5];
+h q[0];
+x q[3];
+cx q[0], q[2];
+h q[4];
+cx q[3], q[1];
+"""
+
+
+def test_split_instructions():
+    clusters = split_instructions(parse_qasm_string(TEXT))
+    assert [sorted({qubit for instruction in cluster for qubit in instruction.qubits}) for cluster in clusters] == \
+        [["q_0", "q_2"], ["q_1", "q_3"], ["q_4"]]
+    # the order of the instructions is kept inside a cluster
+    assert [instruction.name for instruction in clusters[0]] == ["h", "cx"]
+
+
+def test_combined_clusters_match_the_whole_circuit():
+    instructions = list(parse_qasm_string(TEXT))
+    distributions = solve_clusters(instructions, 2)
+    assert len(distributions) == 3
+    combined = sorted((tuple(state.items()), round(probability, 3)) for (state, probability) in combine(distributions))
+    whole = sorted((tuple(sorted(state.items())), round(probability, 3))
+                   for (state, probability) in solve_cluster(instructions))
+    assert combined == whole
+    probability, state = get_highest_prob(distributions)
+    assert state["q_1"] and state["q_3"]
+    assert probability == max(probability for (_, probability) in combined)
@@ -0,0 +1,55 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from encoding_cache import EncodingCache, get_session
+from qasm_parser import parse_qasm_file
+from static_solver import StaticSolver
+
+BELL = 'OPENQASM 2.0;\ninclude "qelib1.inc";\nqreg q[2];\nh q[0];\ncx q[0], q[1];\n'
+
+
+def write_circuit(path, text: str) -> str:
+    path.write_text(text)
+    return str(path)
+
+
+def test_hit_and_miss(tmp_path):
+    circuit = write_circuit(tmp_path / "bell.qasm", BELL)
+    cache = EncodingCache(str(tmp_path / "cache"))
+    key = EncodingCache.get_key(circuit, ["qasm", False])
+    session, is_cached = get_session(parse_qasm_file(circuit), cache, key)
+    assert not is_cached
+    expected = StaticSolver.get_highest_prob(session, session.mapping)
+
+    cached, is_cached = get_session(parse_qasm_file(circuit), cache, key)
+    assert is_cached
+    assert sorted(cached.mapping.keys()) == ["q_0", "q_1"]
+    assert StaticSolver.get_highest_prob(cached, cached.mapping) == expected
+
+
+def test_invalidation(tmp_path):
+    circuit = write_circuit(tmp_path / "bell.qasm", BELL)
+    key = EncodingCache.get_key(circuit, ["qasm", False])
+    # another option or another content is another entry
+    assert EncodingCache.get_key(circuit, ["qasm", True]) != key
+    write_circuit(tmp_path / "bell.qasm", BELL + "x q[1];\n")
+    assert EncodingCache.get_key(circuit, ["qasm", False]) != key
+
+
+def test_eviction(tmp_path):
+    cache = EncodingCache(str(tmp_path / "cache"))
+    keys = []
+    for i in range(3):
+        circuit = write_circuit(tmp_path / f"circuit_{i}.qasm", BELL + f"rz({i}) q[1];\n")
+        keys.append(EncodingCache.get_key(circuit, []))
+        get_session(parse_qasm_file(circuit), cache, keys[-1])
+        # distinct modification times
+        os.utime(cache.get_paths(keys[-1])[0], (i, i))
+    # room for the two most recent entries
+    cache.max_size = sum(os.path.getsize(path) for key in keys[1:] for path in cache.get_paths(key))
+    cache.evict()
+    # the least recently used entry is removed first
+    assert cache.load(keys[0]) is None
+    assert cache.load(keys[2]) is not None
@@ -0,0 +1,47 @@
+import os
+import sys
+
+import pytest
+import z3
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from circuit import encode_instructions
+from qasm_parser import parse_qasm_file, parse_qasm_string
+from simulation import Simulation
+from static_solver import StaticSolver, to_float
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "small")
+
+
+def get_distribution(instructions, exact: bool):
+    session = Simulation(exact=exact)
+    encode_instructions(session, instructions)
+    answer = dict()
+    for state in StaticSolver.iter_reachable_states(session, session.mapping):
+        _, _, probability = StaticSolver.evaluate_state_probability(session, state, session.mapping)
+        answer[tuple(sorted(state.items()))] = probability
+    return answer
+
+
+def test_exact_matches_default():
+    for name in ["deutsch_n2", "cat_state_n4", "toffoli_n3"]:
+        instructions = list(parse_qasm_file(os.path.join(BENCHMARKS, name, f"{name}.qasm")))
+        exact = get_distribution(instructions, True)
+        default = get_distribution(instructions, False)
+        assert exact.keys() == default.keys()
+        for (state, probability) in exact.items():
+            # the exact probabilities are rationals, the default ones are approximated
+            assert z3.is_rational_value(probability)
+            assert abs(to_float(probability) - to_float(default[state])) < 2e-3
+
+
+def test_exact_cat_state():
+    path = os.path.join(BENCHMARKS, "cat_state_n4", "cat_state_n4.qasm")
+    distribution = get_distribution(parse_qasm_file(path), True)
+    assert sorted(probability.as_fraction() for probability in distribution.values()) == [0.5, 0.5]
+
+
+def test_exact_rejects_other_gates():
+    with pytest.raises(Exception):
+        get_distribution(parse_qasm_string('include "qelib1.inc";\nqreg q[1];\nrz(0.3) q[0];'), True)
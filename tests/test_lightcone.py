@@ -0,0 +1,47 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from circuit import simulate_instructions
+from lightcone import get_light_cone, get_qubit_name, marginalize
+from qasm_parser import parse_qasm_string
+
+TEXT = """OPENQASM 2.0;
+include "qelib1.inc";
+qreg q[4];
+h q[0];
+h q[3];
+cx q[0], q[1];
+t q[1];
+cx q[2], q[3];
+x q[3];
+cx q[1], q[2];
+h q[0];
+"""
+
+
+def test_qubit_names():
+    assert get_qubit_name("q[3]") == "q_3"
+    assert get_qubit_name("q_3") == "q_3"
+
+
+def test_light_cone_keeps_the_marginal():
+    instructions = list(parse_qasm_string(TEXT))
+    cone = get_light_cone(instructions, ["q[1]"])
+    # the gates applied to a qubit after its last interaction with the cone of q_1 cannot change it
+    assert [(instruction.name, instruction.qubits) for instruction in cone] == \
+        [("h", ["q_0"]), ("h", ["q_3"]), ("cx", ["q_0", "q_1"]), ("t", ["q_1"]), ("cx", ["q_2", "q_3"]),
+         ("cx", ["q_1", "q_2"])]
+    expected = simulate_instructions(instructions).get_marginal_probabilities(["q_1"])
+    assert np.allclose(simulate_instructions(cone).get_marginal_probabilities(["q_1"]), expected)
+    with pytest.raises(Exception, match="not used"):
+        get_light_cone(instructions, ["r[0]"])
+
+
+def test_marginalize():
+    distribution = [({"a": False, "b": False}, 0.25), ({"a": True, "b": False}, 0.5), ({"a": True, "b": True}, 0.25)]
+    assert marginalize(distribution, ["b"]) == [({"b": False}, 0.75), ({"b": True}, 0.25)]
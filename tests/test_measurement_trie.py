@@ -0,0 +1,40 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from circuit import encode_instructions
+from qasm_parser import parse_qasm_string
+from simulation import Simulation
+from static_solver import StaticSolver
+from z3quantum_gate import Z3QuantumGate
+
+GHZ = 'OPENQASM 2.0;\ninclude "qelib1.inc";\nqreg q[3];\nh q[0];\ncx q[0], q[1];\ncx q[1], q[2];'
+
+
+def test_shots_share_the_trie(monkeypatch):
+    session = Simulation()
+    encode_instructions(session, parse_qasm_string(GHZ))
+    checks = []
+    check = StaticSolver.check
+
+    def count_check(session, *assumptions):
+        checks.append(assumptions)
+        return check(session, *assumptions)
+
+    monkeypatch.setattr(StaticSolver, "check", staticmethod(count_check))
+    random.seed(0)
+    counts = Z3QuantumGate.measure(session, shots=500)
+    assert sum(counts.values()) == 500
+    assert set(counts.keys()) == {"000", "111"}
+    assert abs(counts["000"] - 250) < 60
+    # every node of the trie is checked once, not once per shot
+    assert len(checks) < 20
+
+
+def test_measured_qubits():
+    session = Simulation()
+    encode_instructions(session, parse_qasm_string(GHZ))
+    counts = Z3QuantumGate.measure(session, shots=50, qubits=["q_2", "q_0"])
+    assert set(counts.keys()) <= {"00", "11"}
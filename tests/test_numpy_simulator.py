@@ -0,0 +1,49 @@
+import os
+import sys
+from math import pi
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from circuit import simulate_instructions
+from numpy_simulator import NumpyStatevector
+from qasm_parser import parse_qasm_string
+
+
+def simulate(text: str) -> NumpyStatevector:
+    return simulate_instructions(parse_qasm_string(f'OPENQASM 2.0;\ninclude "qelib1.inc";\n{text}'))
+
+
+def test_bell_state():
+    simulator = simulate("qreg q[2];\nh q[0];\ncx q[0], q[1];")
+    assert np.allclose(simulator.state, np.array([[1, 0], [0, 1]]) / np.sqrt(2))
+    assert np.isclose(simulator.get_state_probability({"q_0": True, "q_1": True}), 0.5)
+    assert np.isclose(simulator.get_state_probability({"q_0": False, "q_1": True}), 0.0)
+    # the other qubit is summed out
+    assert np.isclose(simulator.get_state_probability({"q_1": False}), 0.5)
+    assert np.allclose(simulator.get_marginal_probabilities(["q_1"]), [0.5, 0.5])
+
+
+def test_gate_arguments_order():
+    # the control and the target of cx are not swapped, and the marginal axes follow the given order
+    simulator = simulate("qreg q[3];\nx q[2];\ncx q[2], q[0];\nx q[1];\nx q[1];")
+    assert np.isclose(simulator.get_state_probability({"q_0": True, "q_1": False, "q_2": True}), 1.0)
+    probabilities = simulator.get_marginal_probabilities(["q_1", "q_2"])
+    assert np.isclose(probabilities[0, 1], 1.0)
+    assert simulator.get_highest_prob() == (1.0, {"q_2": True, "q_0": True, "q_1": False})
+
+
+def test_parametric_gates():
+    simulator = simulate(f"qreg q[1];\nrx({pi}) q[0];")
+    assert np.isclose(simulator.get_state_probability({"q_0": True}), 1.0)
+    simulator = simulate(f"qreg q[1];\nry({pi / 2}) q[0];\nrz({pi / 3}) q[0];")
+    assert np.isclose(simulator.get_state_probability({"q_0": True}), 0.5)
+    assert np.isclose(np.sum(simulator.get_probabilities()), 1.0)
+
+
+def test_counts():
+    counts = simulate("qreg q[2];\nx q[0];\nh q[1];").get_counts(200)
+    assert sum(counts.values()) == 200
+    # the first qubit is the rightmost bit, as in qiskit
+    assert set(counts.keys()) <= {"01", "11"}
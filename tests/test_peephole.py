@@ -0,0 +1,81 @@
+import os
+import sys
+from math import pi
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from circuit import simulate_instructions
+from peephole import PeepholeOptimizer, PHASE_RULE, INVERSE_PAIR_RULE, IDENTITY_RULE
+from qasm_parser import Instruction, parse_qasm_string
+from settings import *
+
+
+def optimize(text: str):
+    optimizer = PeepholeOptimizer()
+    instructions = list(optimizer.optimize(parse_qasm_string(f"qreg q[1];\n{text}")))
+    return instructions, optimizer.stats
+
+
+def test_lone_phase_is_one_gate():
+    for step in range(1, 8):
+        instructions, stats = optimize(f"u1({step}*pi/4) q[0];")
+        assert len(instructions) == 1
+        assert stats.gates_out == stats.gates_in == 1
+        assert stats.removed.get(PHASE_RULE, 0) == 0
+        assert stats.assertions_out <= stats.assertions_in
+
+
+def test_phase_without_single_gate_is_u1():
+    instructions, _ = optimize("u1(3*pi/4) q[0];")
+    assert instructions[0].name == U1 and abs(instructions[0].params[0] - 3 * pi / 4) < 1e-9
+    instructions, stats = optimize("z q[0];\nt q[0];")
+    assert [instruction.name for instruction in instructions] == [U1]
+    assert stats.removed[PHASE_RULE] == 1
+
+
+def test_merged_run_uses_single_gate():
+    instructions, stats = optimize("t q[0];\nt q[0];")
+    assert [instruction.name for instruction in instructions] == [S]
+    assert stats.removed[PHASE_RULE] == 1
+    instructions, stats = optimize("s q[0];\nsdg q[0];")
+    assert instructions == []
+    assert stats.removed[PHASE_RULE] == 2
+
+
+def test_inverse_pairs_and_identities():
+    optimizer = PeepholeOptimizer()
+    text = "qreg q[2];\nh q[0];\nh q[0];\ncx q[0], q[1];\ncx q[0], q[1];\nid q[1];\nx q[1];"
+    instructions = list(optimizer.optimize(parse_qasm_string(text)))
+    assert [(instruction.name, instruction.qubits) for instruction in instructions] == [(X, ["q_1"])]
+    assert optimizer.stats.removed[INVERSE_PAIR_RULE] == 4
+    assert optimizer.stats.removed[IDENTITY_RULE] == 1
+
+
+def test_same_statevector():
+    text = f"""OPENQASM 2.0;
+include "qelib1.inc";
+qreg q[3];
+h q[0];
+t q[0];
+t q[0];
+cx q[0], q[1];
+s q[1];
+sdg q[1];
+u1({pi / 8}) q[2];
+rz({pi / 4}) q[2];
+cx q[1], q[2];
+cx q[1], q[2];
+tdg q[0];
+h q[2];
+"""
+    optimizer = PeepholeOptimizer()
+    instructions = list(parse_qasm_string(text))
+    optimized = list(optimizer.optimize(instructions))
+    assert len(optimized) < len(instructions)
+    expected = simulate_instructions(instructions)
+    # the qubits are created in order of first use, a global phase is allowed
+    answer = simulate_instructions([Instruction(I, [name], ()) for name in expected.qubits] + optimized)
+    overlap = np.vdot(expected.state, answer.state)
+    assert np.isclose(abs(overlap), 1.0)
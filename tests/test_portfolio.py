@@ -0,0 +1,59 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from portfolio import SOLVER, NLSAT, SEED_1, race, log_race, select_configuration
+from static_solver import StaticSolver, SolverTimeout
+from circuit import encode_instructions
+from qasm_parser import parse_qasm_string
+from simulation import Simulation
+
+BELL = 'OPENQASM 2.0; include "qelib1.inc"; qreg q[2]; h q[0]; cx q[0], q[1];'
+
+
+def get_session() -> Simulation:
+    session = Simulation()
+    encode_instructions(session, parse_qasm_string(BELL))
+    return session
+
+
+def test_race_most_likely():
+    answer = race(get_session(), [SOLVER], targets=["q_0", "q_1"])
+    assert answer["winner"] == SOLVER
+    assert answer["result"] == "sat"
+    assert round(answer["probability"], 3) == 0.5
+
+
+def test_race_shows_errors(monkeypatch, capfd):
+    def get_top_k(session, mapping, k):
+        raise KeyError("broken search")
+
+    monkeypatch.setattr(StaticSolver, "get_top_k", staticmethod(get_top_k))
+    answer = race(get_session(), [SOLVER], targets=["q_0", "q_1"])
+    assert answer["winner"] is None
+    assert "KeyError: 'broken search'" in capfd.readouterr().err
+
+
+def test_race_timeout(monkeypatch):
+    def get_top_k(session, mapping, k):
+        raise SolverTimeout("SAT solver timeout")
+
+    monkeypatch.setattr(StaticSolver, "get_top_k", staticmethod(get_top_k))
+    answer = race(get_session(), [SOLVER], targets=["q_0", "q_1"])
+    assert answer["winner"] is None
+    assert answer["result"] == "unknown"
+    assert SOLVER in answer["times"].keys()
+
+
+def test_select_configuration(tmp_path):
+    path = str(tmp_path / "log" / "portfolio_log.jsonl")
+    small = {"qubits": 2, "reals": 10, "bools": 5, "assertions": 10}
+    large = {"qubits": 20, "reals": 10000, "bools": 5000, "assertions": 10000}
+    # nothing logged yet
+    assert select_configuration(small, path) == SOLVER
+    for _ in range(3):
+        log_race("small.qasm", small, {"winner": NLSAT, "result": "sat", "time": 0.1, "times": dict()}, path)
+        log_race("large.qasm", large, {"winner": SEED_1, "result": "sat", "time": 1.0, "times": dict()}, path)
+    assert select_configuration(dict(small, reals=12), path) == NLSAT
+    assert select_configuration(dict(large, assertions=9000), path) == SEED_1
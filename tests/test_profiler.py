@@ -0,0 +1,44 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from circuit import encode_instructions
+from profiler import Profiler, CHECK
+from qasm_parser import parse_qasm_string
+from simulation import Simulation
+from static_solver import StaticSolver
+
+BELL = 'OPENQASM 2.0;\ninclude "qelib1.inc";\nqreg q[2];\nh q[0];\ncx q[0], q[1];\nh q[1];'
+
+
+def test_gates_and_queries_are_recorded(tmp_path):
+    Profiler.enable()
+    try:
+        session = Simulation()
+        encode_instructions(session, parse_qasm_string(BELL))
+        StaticSolver.get_highest_prob(session, session.mapping)
+    finally:
+        Profiler.disable()
+    assert Profiler.gates["h"]["count"] == 2
+    assert Profiler.gates["cx"]["count"] == 1
+    assert 0 < sum(entry["assertions"] for entry in Profiler.gates.values()) <= session.assertion_count
+    assert Profiler.queries[CHECK]["count"] == sum(Profiler.results.values()) > 0
+    assert len(Profiler.slowest_checks) > 0
+
+    path = str(tmp_path / "report.json")
+    Profiler.write_report(path)
+    with open(path) as file:
+        report = json.load(file)
+    assert set(report.keys()) == {"gates", "queries", "results", "slowest_checks"}
+    assert "cx" in Profiler.get_summary(5)
+
+
+def test_disabled_profiler_records_nothing():
+    Profiler.enable()
+    Profiler.disable()
+    session = Simulation()
+    encode_instructions(session, parse_qasm_string(BELL))
+    assert Profiler.gates == dict()
+    assert Profiler.queries == dict()
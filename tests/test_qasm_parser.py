@@ -0,0 +1,43 @@
+import math
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qasm_parser import parse_qasm_file, parse_qasm_string
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_reset_is_rejected():
+    with pytest.raises(Exception, match="Unsupported statement"):
+        list(parse_qasm_string("qreg q[1];\nh q[0];\nreset q[0];"))
+    with pytest.raises(Exception, match="reset is not supported"):
+        list(parse_qasm_file(os.path.join(ROOT, "benchmarks", "small", "ipea_n2", "ipea_n2.qasm")))
+
+
+def test_gate_definitions_are_expanded():
+    text = """OPENQASM 2.0;
+include "qelib1.inc";
+// comments are skipped
+qreg q[2];
+gate mygate(theta) a, b { rz(theta / 2) b; cx a, b; }
+mygate(pi) q[0],
+       q[1];
+h q;
+measure q[0] -> c[0];
+"""
+    instructions = list(parse_qasm_string(text))
+    assert [(op, args) for (op, args, _) in instructions] == [("rz", ["q_1"]), ("cx", ["q_0", "q_1"]),
+                                                              ("h", ["q_0"]), ("h", ["q_1"])]
+    assert abs(instructions[0].params[0] - math.pi / 2) < 1e-12
+
+
+def test_statements_are_streamed():
+    instructions = parse_qasm_string('include "qelib1.inc";\nqreg q[1];\nx q[0];\nif (c == 1) x q[0];')
+    # the first instruction is yielded before the unsupported statement is read
+    assert next(instructions).name == "x"
+    with pytest.raises(Exception, match="not supported"):
+        next(instructions)
@@ -0,0 +1,56 @@
+import os
+import sys
+
+import z3
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from circuit import encode_instructions
+from qasm_parser import parse_qasm_string
+from query_memo import QueryMemo
+from simulation import Simulation
+from static_solver import StaticSolver
+
+BELL = 'OPENQASM 2.0;\ninclude "qelib1.inc";\nqreg q[2];\nh q[0];\ncx q[0], q[1];'
+
+
+def test_generations_and_lru():
+    a, b, c = z3.Bools("a b c")
+    memo = QueryMemo(2)
+    memo.put([a, b], z3.sat, None)
+    memo.put([c], z3.unsat, None)
+    # the order of the literals does not matter
+    assert memo.get([b, a]).result == z3.sat
+    memo.invalidate()
+    # sat results are stale once a constraint is added, unsat results stay valid
+    assert memo.get([a, b]) is None
+    assert memo.get([c]).result == z3.unsat
+    memo.put([a], z3.sat, None)
+    memo.put([b], z3.sat, None)
+    # at most max_size entries, the least recently used one is dropped
+    assert memo.get([c]) is None
+    memo.clear()
+    assert memo.get([b]) is None
+
+
+def test_repeated_queries_are_not_checked_again(monkeypatch):
+    session = Simulation()
+    encode_instructions(session, parse_qasm_string(BELL))
+    checks = []
+    check = StaticSolver.check
+
+    def count_check(session, *assumptions):
+        checks.append(assumptions)
+        return check(session, *assumptions)
+
+    monkeypatch.setattr(StaticSolver, "check", staticmethod(count_check))
+    state = {"q_0": True, "q_1": True}
+    first = StaticSolver.evaluate_state_probability(session, state, session.mapping)[2]
+    count = len(checks)
+    second = StaticSolver.evaluate_state_probability(session, state, session.mapping)[2]
+    assert len(checks) == count
+    assert first.eq(second)
+    # a new constraint invalidates the memo
+    StaticSolver.add(session, session.mapping["q_0"].qubit)
+    StaticSolver.evaluate_state_probability(session, state, session.mapping)
+    assert len(checks) > count
@@ -0,0 +1,49 @@
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from server import JobRunner, UnixServer, UnixRequestHandler, run_query, send_request
+
+BELL = 'OPENQASM 2.0; include "qelib1.inc"; qreg q[2]; h q[0]; cx q[0], q[1];'
+
+
+def test_most_likely():
+    for backend in ["z3", "numpy", "stabilizer"]:
+        assert run_query({"qasm": BELL, "query": "most_likely", "backend": backend}) == \
+            [0.5, {"q_0": False, "q_1": False}]
+        assert run_query({"qasm": BELL, "query": "most_likely", "backend": backend, "qubits": ["q[1]"]}) == \
+            [0.5, {"q_1": False}]
+
+
+def test_queries():
+    distribution = run_query({"qasm": BELL, "query": "distribution", "backend": "numpy"})
+    assert sorted((tuple(state.values()), round(probability, 3)) for (state, probability) in distribution) == \
+        [((False, False), 0.5), ((True, True), 0.5)]
+    marginal = run_query({"qasm": BELL, "query": "marginal", "backend": "stabilizer", "qubits": ["q[0]"]})
+    assert sorted((tuple(state.items()), probability) for (state, probability) in marginal) == \
+        [((("q_0", False),), 0.5), ((("q_0", True),), 0.5)]
+    counts = run_query({"qasm": BELL, "query": "shots", "shots": 100})
+    assert sum(counts.values()) == 100 and set(counts.keys()) <= {"00", "11"}
+    with pytest.raises(Exception, match="needs the qubits"):
+        run_query({"qasm": BELL, "query": "marginal"})
+
+
+def test_unix_socket(tmp_path):
+    socket_path = str(tmp_path / "server.sock")
+    server = UnixServer(socket_path, UnixRequestHandler)
+    server.runner = JobRunner(2)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        answer = send_request(socket_path, {"qasm": BELL, "query": "most_likely", "backend": "numpy"})
+        assert answer["result"] == [0.5, {"q_0": False, "q_1": False}]
+        answer = send_request(socket_path, {"qasm": BELL, "query": "unknown"})
+        assert "not implemented" in answer["error"]
+        assert send_request(socket_path, {"qasm": BELL, "timeout": 0})["error"] == "timeout"
+    finally:
+        server.shutdown()
+        server.server_close()
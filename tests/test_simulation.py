@@ -0,0 +1,81 @@
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from circuit import encode_instructions, iter_variants
+from qasm_parser import parse_qasm_string
+from simulation import Simulation
+from static_solver import StaticSolver
+
+HEADER = 'OPENQASM 2.0;\ninclude "qelib1.inc";\n'
+BELL = HEADER + "qreg q[2];\nh q[0];\ncx q[0], q[1];"
+FLIP = HEADER + "qreg q[2];\nx q[1];"
+
+
+def encode(text: str) -> Simulation:
+    session = Simulation()
+    encode_instructions(session, parse_qasm_string(text))
+    return session
+
+
+def get_support(session: Simulation):
+    return sorted(tuple(state.values()) for state in StaticSolver.iter_reachable_states(session, session.mapping))
+
+
+def test_sessions_are_independent():
+    bell = encode(BELL)
+    flip = encode(FLIP)
+    # the qubits have the same names in both circuits
+    assert get_support(bell) == [(False, False), (True, True)]
+    assert get_support(flip) == [(True,)]
+    assert bell.context is not flip.context
+    assert bell.assertion_count != flip.assertion_count
+
+
+def test_sessions_in_threads():
+    answers = dict()
+
+    def run(name: str, text: str) -> None:
+        answers[name] = get_support(encode(text))
+
+    threads = [threading.Thread(target=run, args=(f"{name}_{i}", text))
+               for i in range(2) for (name, text) in [("bell", BELL), ("flip", FLIP)]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for i in range(2):
+        assert answers[f"bell_{i}"] == [(False, False), (True, True)]
+        assert answers[f"flip_{i}"] == [(True,)]
+
+
+def get_counters(session: Simulation):
+    return (sorted(session.mapping.keys()), session.local_counter, session.real_count, session.bool_count,
+            session.assertion_count, len(session.solver.assertions()))
+
+
+def test_pop_restores_the_session():
+    session = encode(BELL)
+    support = get_support(session)
+    before = get_counters(session)
+    session.push()
+    encode_instructions(session, parse_qasm_string("qreg q[3];\nx q[0];\nh q[2];"))
+    assert get_counters(session) != before
+    session.pop()
+    assert get_counters(session) == before
+    assert get_support(session) == support
+    with pytest.raises(Exception, match="no scope"):
+        session.pop()
+
+
+def test_variants_match_whole_circuits():
+    suffixes = ["qreg q[2];\nx q[1];", "qreg q[3];\ncx q[1], q[2];", "qreg q[2];\nh q[0];\nh q[0];"]
+    session = encode(BELL)
+    answers = [get_support(variant)
+               for variant in iter_variants(session, [parse_qasm_string(suffix) for suffix in suffixes])]
+    assert answers == [get_support(encode(BELL + "\n" + suffix.split("\n", 1)[1])) for suffix in suffixes]
+    assert session.solver.num_scopes() == 0
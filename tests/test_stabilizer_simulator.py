@@ -0,0 +1,53 @@
+import os
+import random
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from circuit import simulate_instructions, simulate_stabilizer, is_clifford
+from qasm_parser import Instruction
+from utils import build_state
+from settings import *
+
+
+def get_random_clifford(qubits: int, gates: int, seed: int):
+    generator = random.Random(seed)
+    names = [f"q_{i}" for i in range(qubits)]
+    # every qubit is used first in order, so both simulators number them alike
+    instructions = [Instruction(H, [name], ()) for name in names]
+    for _ in range(gates):
+        op = generator.choice([H, S, SDG, X, Y, Z, CX, CZ, SWAP])
+        if op in [CX, CZ, SWAP]:
+            instructions.append(Instruction(op, generator.sample(names, 2), ()))
+        else:
+            instructions.append(Instruction(op, [generator.choice(names)], ()))
+    return instructions
+
+
+def test_stabilizer_matches_numpy():
+    for seed in range(10):
+        instructions = get_random_clifford(4, 30, seed)
+        assert is_clifford(instructions)
+        simulator = simulate_instructions(instructions)
+        tableau = simulate_stabilizer(instructions)
+        names = sorted(simulator.qubits)
+        for i in range(2 ** len(names)):
+            state = build_state(names, i)
+            assert np.isclose(tableau.get_state_probability(state), simulator.get_state_probability(state))
+        support = {tuple(sorted(state.items())): probability for (state, probability) in tableau.iter_support(names)}
+        assert np.isclose(sum(support.values()), 1.0)
+        for (state, probability) in support.items():
+            assert np.isclose(simulator.get_state_probability(dict(state)), probability)
+        # marginals
+        assert np.isclose(tableau.get_state_probability({"q_1": True}), simulator.get_state_probability({"q_1": True}))
+
+
+def test_large_ghz_state():
+    names = [f"q_{i}" for i in range(100)]
+    instructions = [Instruction(H, [names[0]], ())]
+    instructions += [Instruction(CX, [names[i], names[i + 1]], ()) for i in range(len(names) - 1)]
+    support = list(simulate_stabilizer(instructions).iter_support(names))
+    assert sorted(sum(state.values()) for (state, _) in support) == [0, len(names)]
+    assert all(np.isclose(probability, 0.5) for (_, probability) in support)
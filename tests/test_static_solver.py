@@ -0,0 +1,36 @@
+import os
+import sys
+
+import z3
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from circuit import encode_instructions
+from qasm_parser import parse_qasm_string
+from simulation import Simulation
+from static_solver import StaticSolver
+
+BELL = 'OPENQASM 2.0;\ninclude "qelib1.inc";\nqreg q[2];\nh q[0];\ncx q[0], q[1];'
+
+
+def encode(text: str) -> Simulation:
+    session = Simulation()
+    encode_instructions(session, parse_qasm_string(text))
+    return session
+
+
+def test_queries_use_assumptions():
+    session = encode(BELL)
+    assert isinstance(session.solver, z3.Solver)
+    assertions = len(session.solver.assertions())
+    q_0 = session.mapping["q_0"].qubit
+    q_1 = session.mapping["q_1"].qubit
+    assert StaticSolver.is_value_sat(session, q_1, True, [StaticSolver.literal(q_0, True)]) is True
+    assert StaticSolver.is_value_sat(session, q_1, False, [StaticSolver.literal(q_0, True)]) is False
+    assert StaticSolver.is_state_sat(session, {q_0: False, q_1: False}) is True
+    # no query adds a constraint or leaves a scope open
+    assert len(session.solver.assertions()) == assertions
+    assert session.solver.num_scopes() == 0
+    # the unsat result did not stick to the solver
+    assert StaticSolver.is_value_sat(session, q_1, False) is True
+
@@ -0,0 +1,59 @@
+import os
+import sys
+from math import isclose
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from circuit import encode_instructions
+from qasm_parser import parse_qasm_string
+from simulation import Simulation
+from static_solver import StaticSolver, to_float
+from sweep import get_circle_point, iter_sweep
+
+TEXT = """OPENQASM 2.0;
+include "qelib1.inc";
+qreg q[2];
+h q[0];
+rx(2*beta) q[1];
+cx q[0], q[1];
+rz(-gamma) q[1];
+ry(beta+gamma) q[0];
+"""
+POINTS = [{"beta": 0.3, "gamma": 1.2}, {"beta": 1.1, "gamma": 0.4}]
+
+
+def get_numeric_distribution(point):
+    text = TEXT
+    for (name, value) in point.items():
+        text = text.replace(name, f"({value})")
+    session = Simulation()
+    encode_instructions(session, parse_qasm_string(text))
+    answer = dict()
+    for state in StaticSolver.iter_reachable_states(session, session.mapping):
+        _, _, probability = StaticSolver.evaluate_state_probability(session, state, session.mapping)
+        answer[tuple(sorted(state.items()))] = to_float(probability)
+    return answer
+
+
+def test_circle_points():
+    for angle in [0.0, 0.3, 1.5, 3.14159, -2.0]:
+        cos_value, sin_value = get_circle_point(angle)
+        assert cos_value ** 2 + sin_value ** 2 == 1
+
+
+def test_sweep_matches_numeric_circuits():
+    session = Simulation()
+    encode_instructions(session, parse_qasm_string(TEXT, parameters=["beta", "gamma"]))
+    serial = list(iter_sweep(session, POINTS))
+    assert [point for (point, _) in serial] == POINTS
+    for (point, distribution) in serial:
+        expected = get_numeric_distribution(point)
+        answer = {tuple(sorted(state.items())): probability for (state, probability) in distribution}
+        assert answer.keys() == expected.keys()
+        for (state, probability) in answer.items():
+            assert isclose(probability, expected[state], abs_tol=1e-3)
+    parallel = list(iter_sweep(session, POINTS, workers=2))
+    assert [point for (point, _) in parallel] == POINTS
+    for ((_, serial_distribution), (_, parallel_distribution)) in zip(serial, parallel):
+        assert sorted((repr(state), round(probability, 6)) for (state, probability) in serial_distribution) == \
+            sorted((repr(state), round(probability, 6)) for (state, probability) in parallel_distribution)
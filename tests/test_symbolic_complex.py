@@ -0,0 +1,78 @@
+import os
+import sys
+import tracemalloc
+
+import z3
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from circuit import encode_instructions
+from qasm_parser import Instruction
+from simulation import Simulation
+from symbolic_complex import SymbolicComplex
+from settings import *
+
+
+def test_constants_are_folded():
+    session = Simulation()
+    a = SymbolicComplex.from_value(session, 1 + 2j)
+    b = SymbolicComplex.from_value(session, 0.5)
+    for (answer, expected) in [(a + b, 1.5 + 2j), (a - b, 0.5 + 2j), (a * b, 0.5 + 1j), (a / b, 2 + 4j),
+                               (a.conjugate(), 1 - 2j), (a.scale(1j), -2 + 1j), (a.inv(), 1 / (1 + 2j))]:
+        assert answer.is_constant()
+        assert abs(answer.value - expected) < 1e-12
+    # nothing was encoded
+    assert len(session.solver.assertions()) == 0
+    assert session.real_count == 0
+
+
+def test_identities_are_short_circuited():
+    session = Simulation()
+    variable = SymbolicComplex(session, "x")
+    assert variable * 1 is variable
+    assert (variable + 0) is variable
+    assert (variable - 0) is variable
+    zero = variable * 0
+    assert zero.is_constant() and zero.value == 0
+    assert z3.simplify(variable.scale(2).real - 2 * variable.real).eq(z3.RealVal(0, session.context))
+
+
+def test_expressions_are_not_defined_by_variables():
+    session = Simulation()
+    a = SymbolicComplex(session, "a")
+    b = SymbolicComplex(session, "b")
+    product = a * b + a - b
+    # the intermediate values are z3 expressions of a and b, no fresh variable nor constraint
+    assert product.name is None
+    assert len(session.solver.assertions()) == 0
+    names = {str(constant) for constant in z3.z3util.get_vars(product.real)}
+    assert names <= {"r_a", "im_a", "r_b", "im_b"}
+
+
+def test_large_expressions_get_variables():
+    session = Simulation()
+    answer = SymbolicComplex(session, "a")
+    for _ in range(MAX_EXPRESSION_SIZE):
+        answer = answer * SymbolicComplex(session, "b")
+    # the expression grew past MAX_EXPRESSION_SIZE at least once and was cut by a defined variable
+    assert len(session.solver.assertions()) > 0
+    assert answer.size <= MAX_EXPRESSION_SIZE
+
+
+def test_encoding_memory():
+    # unbound amplitudes build no z3 term
+    session = Simulation()
+    variable = SymbolicComplex(session, "unused")
+    assert variable.z3_real is None and variable.z3_im is None
+    qubits = 500
+    instructions = [Instruction(H, [f"q_{i}"], ()) for i in range(qubits)]
+    instructions += [Instruction(CX, [f"q_{i}", f"q_{i + 1}"], ()) for i in range(qubits - 1)]
+    instructions += [Instruction(RZ, [f"q_{i}"], (0.3,)) for i in range(qubits)]
+    tracemalloc.start()
+    try:
+        encode_instructions(Simulation(), instructions)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # about 190 bytes per gate are kept in python, the rest of the encoding is held by z3
+    assert peak / len(instructions) < 1024
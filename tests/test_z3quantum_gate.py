@@ -0,0 +1,55 @@
+import os
+import sys
+from math import pi
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from circuit import encode_instructions, simulate_instructions
+from qasm_parser import parse_qasm_string
+from simulation import Simulation
+from static_solver import StaticSolver
+from settings import *
+
+HEADER = 'OPENQASM 2.0;\ninclude "qelib1.inc";\n'
+
+
+def get_supports(text: str):
+    """
+    :return: the reachable states of the z3 encoding and the states of non-zero probability of the statevector
+    """
+    instructions = list(parse_qasm_string(HEADER + text))
+    session = Simulation()
+    encode_instructions(session, instructions)
+    z3_support = {tuple(sorted(state.items()))
+                  for state in StaticSolver.iter_reachable_states(session, session.mapping)}
+    simulator = simulate_instructions(instructions)
+    names = sorted(simulator.qubits)
+    probabilities = simulator.get_marginal_probabilities(names)
+    numpy_support = {tuple((name, bool(position[i])) for (i, name) in enumerate(names))
+                     for position in zip(*(probabilities > 1e-9).nonzero())}
+    return z3_support, numpy_support
+
+
+def test_multi_qubit_gates_are_native():
+    text = "qreg q[4];\nccx q[0], q[1], q[2];\ncswap q[0], q[1], q[2];\nmcx q[0], q[1], q[2], q[3];\nswap q[0], q[3];"
+    assert [instruction.name for instruction in parse_qasm_string(HEADER + text)] == [CCX, CSWAP, MCX, SWAP]
+
+
+def test_multi_qubit_gates():
+    for text in ["qreg q[3];\nh q[0];\nh q[1];\nccx q[0], q[1], q[2];",
+                 "qreg q[3];\nh q[0];\nx q[1];\ncswap q[0], q[1], q[2];",
+                 "qreg q[4];\nh q[0];\nh q[1];\nx q[2];\nmcx q[0], q[1], q[2], q[3];",
+                 "qreg q[2];\nx q[0];\nswap q[0], q[1];\nh q[0];",
+                 "qreg q[2];\nh q[0];\ncz q[0], q[1];\nh q[1];"]:
+        z3_support, numpy_support = get_supports(text)
+        assert z3_support == numpy_support, text
+
+
+def test_parametric_gates():
+    # the reachable states of the encoding do not see interference, the circuits have none
+    for text in [f"qreg q[1];\nrx({pi}) q[0];",
+                 f"qreg q[1];\nu3({pi}, 0, {pi}) q[0];",
+                 f"qreg q[2];\nx q[0];\nh q[1];\ncu1({pi}) q[0], q[1];\nry({pi}) q[0];",
+                 f"qreg q[2];\nu2(0, {pi}) q[0];\nrz({pi / 3}) q[0];\ncx q[0], q[1];"]:
+        z3_support, numpy_support = get_supports(text)
+        assert z3_support == numpy_support, text
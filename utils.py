@@ -1,7 +1,9 @@
-from typing import List, Optional, Dict
+from typing import Iterator, List, Optional, Dict
 
-from z3 import And
-from static_solver import StaticSolver
+from z3 import And, sat
+from static_solver import StaticSolver, to_float
+from exact_complex import get_complex_class
+from simulation import Simulation
 import math
 
 def get_probability(zero_amplitude, one_amplitude):
@@ -26,9 +28,9 @@ def get_and_expression(qubits):
     return expression
 
 
-def get_qubit_probabilities(qubit) -> (complex, complex):
-    is_true_sat = StaticSolver.is_value_sat(qubit.qubit, True)
-    is_false_sat = StaticSolver.is_value_sat(qubit.qubit, False)
+def get_qubit_probabilities(session: Simulation, qubit) -> (complex, complex):
+    is_true_sat = StaticSolver.is_value_sat(session, qubit.qubit, True)
+    is_false_sat = StaticSolver.is_value_sat(session, qubit.qubit, False)
 
     if is_true_sat is None or is_false_sat is None:
         raise Exception("SAT solver timeout")
@@ -43,46 +45,62 @@ def build_state(vars, n) -> Dict[str, bool]:
         n /= 2
     return state
 
-def get_state_amplitude(mapping, state: Dict[str, bool]) -> Optional[complex]:
+def iter_prefix_order(size: int) -> Iterator[int]:
+    """
+    Indices of the states of build_state, in lexicographic order of the variables (the last variable changes
+    fastest). Consecutive states share their longest prefix, so the queries made along the prefix are found in the
+    memo of the session.
+    """
+    for n in range(2**size):
+        index = 0
+        for bit in range(size):
+            if n & (1 << (size - 1 - bit)):
+                index |= 1 << bit
+        yield index
+
+def get_state_amplitude(session: Simulation, mapping, state: Dict[str, bool]) -> Optional[complex]:
     """
     Check whether a given state exists
     :param state: a dictionary mapping variable names to boolean values
     :return: probability that the given state is observed upon measurement, or None
     """
-    answer = 1.0
-    StaticSolver.solver.push()
+    answer = get_complex_class(session).from_value(session, 1.0)
+    assumptions = []
     for (var, value) in state.items():
         qubit = mapping[var]
-        check_output = StaticSolver.is_value_sat(qubit.qubit, value)
+        check_output = StaticSolver.is_value_sat(session, qubit.qubit, value, assumptions)
         if check_output:
-            check_output2 = StaticSolver.is_value_sat(qubit.qubit, not value)
+            check_output2 = StaticSolver.is_value_sat(session, qubit.qubit, not value, assumptions)
             if check_output2:
                 if value:
                     answer *= qubit.one_amplitude
                 else:
                     answer *= qubit.zero_amplitude
             elif check_output2 is None:
-                StaticSolver.solver.pop()
                 return None
         elif not check_output:
-            StaticSolver.solver.pop()
             return 0.0
         elif check_output is None:
-            StaticSolver.solver.pop()
             return None
 
-        StaticSolver.solver.add(qubit.qubit == value)
-    StaticSolver.solver.pop()
-    return round(answer.real, 2)
+        assumptions.append(StaticSolver.literal(qubit.qubit, value))
 
+    # the amplitudes are evaluated in a model of the whole state
+    entry = StaticSolver.check_memoized(session, assumptions)
+    if entry.result != sat:
+        return None
+    real = to_float(entry.evaluate(answer.real))
+    im = to_float(entry.evaluate(answer.im))
+    return complex(round(real, 2), round(im, 2))
 
-def get_amplitudes(mapping, args) -> List[complex]:
-    amplitudes = []
-    for n in range(2**len(args)):
+
+def get_amplitudes(session: Simulation, mapping, args) -> List[complex]:
+    amplitudes = [0.0] * (2**len(args))
+    for n in iter_prefix_order(len(args)):
         state = build_state(args, n)
-        amplitude = get_state_amplitude(mapping, state)
+        amplitude = get_state_amplitude(session, mapping, state)
         assert(amplitude is not None)
-        amplitudes.append(amplitude)
+        amplitudes[n] = amplitude
     return amplitudes
 
 def get_qubit_amplitude_from_amplitudes(new_state: List[complex], value, index):
@@ -96,8 +114,3 @@ def get_qubit_amplitude_from_amplitudes(new_state: List[complex], value, index):
         elif value == 1 and result_mask > 0:
             result += new_state[i]
     return result
-
-
-
-
-
@@ -1,45 +1,55 @@
-from typing import Tuple
+from time import perf_counter
+from typing import Tuple, Union
 from z3qubit import Z3Qubit
+from measurement_trie import MeasurementTrie
+from symbolic_complex import SymbolicComplex
+from exact_complex import get_complex_class
+from profiler import Profiler
+from simulation import Simulation
+from gate_matrices import get_matrix, get_target_matrix
+from parametric_gates import get_parametric_matrix, is_zero_entry, scale_entry
+from qasm_parser import is_symbolic
 from settings import *
 from utils import *
 import z3
-from random import random
 
 
 class Z3QuantumGate:
+    session: Simulation
     name: str
-    mapping: Dict[str, Z3Qubit] = dict()
 
-    def __init__(self, name, args):
+    def __init__(self, session: Simulation, name, args, params=()):
+        self.session = session
         self.name = name
         self.base_class = None
         self.args = args
+        self.params = tuple(params)
 
     def set_instruction(self):
         if self.name == X:
-            self.base_class = XGate(self.name, self.args)
+            self.base_class = XGate(self.session, self.name, self.args)
         elif self.name == H:
-            self.base_class = HGate(self.name, self.args)
+            self.base_class = HGate(self.session, self.name, self.args)
         elif self.name == CX:
-            self.base_class = CXGate(self.name, self.args)
-        elif self.name == CZ:
-            self.base_class = CZGate(self.name, self.args)
+            self.base_class = CXGate(self.session, self.name, self.args)
+        elif self.name in [CZ, CCX, MCX, CU1]:
+            self.base_class = ControlledGate(self.session, self.name, self.args, self.params)
         elif self.name == SWAP:
-            self.base_class = SwapGate(self.name, self.args)
+            self.base_class = SwapGate(self.session, self.name, self.args)
+        elif self.name == CSWAP:
+            self.base_class = CSwapGate(self.session, self.name, self.args)
         elif self.name == I:
-            self.base_class = IGate(self.name, self.args)
+            self.base_class = IGate(self.session, self.name, self.args)
         elif self.name == Z:
-            self.base_class = ZGate(self.name, self.args)
+            self.base_class = ZGate(self.session, self.name, self.args)
         elif self.name == Y:
-            self.base_class = YGate(self.name, self.args)
+            self.base_class = YGate(self.session, self.name, self.args)
         elif self.name == T:
-            self.base_class = TGate(self.name, self.args)
-        elif self.name == S:
-            self.base_class = SGate(self.name, self.args)
-        elif self.name == CCX:
-            self.base_class = CCXGate(self.name, self.args)
+            self.base_class = TGate(self.session, self.name, self.args)
         elif self.name == TDG:
-            self.base_class = TDGGate(self.name, self.args)
+            self.base_class = TDGGate(self.session, self.name, self.args)
+        elif self.name in [S, SDG, U1, U2, U3, RX, RY, RZ]:
+            self.base_class = UnitaryGate(self.session, self.name, self.args, self.params)
         else:
             raise Exception(f"Gate ({self.name}) not implemented")
 
@@ -49,87 +59,85 @@ class Z3QuantumGate:
             self.set_instruction()
         return self.base_class
 
+    @staticmethod
+    def get_counters(session: Simulation) -> Dict[str, int]:
+        # sizes of the encoding so far, the profiler reports the difference made by each gate
+        return {"reals": session.real_count, "bools": session.bool_count,
+                "assertions": session.assertion_count, "expressions": session.local_counter}
+
     def execute(self) -> None:
-        self.specific_subclass.execute()
+        if not Profiler.enabled or Profiler.depth > 0:
+            self.specific_subclass.execute()
+            return
+        before = Z3QuantumGate.get_counters(self.session)
+        start = perf_counter()
+        Profiler.depth += 1
+        try:
+            self.specific_subclass.execute()
+        finally:
+            Profiler.depth -= 1
+        Profiler.record_gate(self.name, perf_counter() - start, before, Z3QuantumGate.get_counters(self.session))
 
     @staticmethod
-    def measure() -> Tuple[float, Dict[str, bool]]:
+    def measure(session: Simulation, shots: Optional[int] = None,
+                qubits: Optional[List[str]] = None) -> Union[Tuple[float, Dict[str, bool]], Dict[str, int]]:
         """
 
-        :return: the probability of measuring a state, and the state itself or it raises an Exception
+        :param shots: number of shots. The shots share a prefix trie of solver results (see MeasurementTrie)
+        :param qubits: measured qubits, by default all of them
+        :return: the probability of measuring a state, and the state itself or it raises an Exception. When shots is
+        given, a histogram from bitstrings to counts like qiskit get_counts
         """
-        prob: complex = 1.0
-        state: Dict[str, bool] = dict()
-        StaticSolver.solver.push()
-        for (var_name, obj_qubit) in Z3QuantumGate.mapping.items():
-            random_num = random()
-            assert(0 <= random_num <= 1.0)
-#            assert(is_unitary(Z3QuantumGate.mapping, var_name))
-            if random_num <= obj_qubit.zero_amplitude.squared_norm():
-                assign_value = False
-            else:
-                assign_value = True
-
-            if not StaticSolver.is_value_sat(obj_qubit.qubit, assign_value):
-                if StaticSolver.is_value_sat(obj_qubit.qubit, not assign_value):
-                    assign_value = not assign_value
-                else:
-                    raise Exception(f"No value satisfies for {var_name}")
-            elif StaticSolver.is_value_sat(obj_qubit.qubit, not assign_value):
-                if assign_value:
-                    prob *= obj_qubit.one_amplitude
-                else:
-                    prob *= obj_qubit.zero_amplitude
-
-            StaticSolver.solver.add(obj_qubit.qubit == assign_value)
-
-            assert(var_name not in state.keys())
-            state[var_name] = assign_value
-        prob = prob * prob.conjugate()
-        StaticSolver.solver.pop()
-        return round(prob.real, 2), state
+        mapping = session.mapping
+        if qubits is not None:
+            mapping = {name: session.mapping[name] for name in qubits}
+        trie = MeasurementTrie(session, [])
+        if shots is None:
+            prob, state = trie.sample(mapping)
+            return round(prob, 2), state
+        return trie.get_counts(mapping, shots)
 
     @staticmethod
-    def does_state_exists(state: Dict[str, bool]) -> Optional[float]:
+    def does_state_exists(session: Simulation, state: Dict[str, bool]) -> Optional[float]:
         """
         Check whether a given state exists
         :param state: a dictionary mapping variable names to boolean values
         :return: probability that the given state is observed upon measurement, or None
         """
-        answer = get_state_amplitude(Z3QuantumGate.mapping, state)
+        answer = get_state_amplitude(session, session.mapping, state)
         answer = answer * answer.conjugate()
         return round(answer.real, 2)
 
 
 class XGate(Z3QuantumGate):
-    def __init__(self, name: str, args: List[str]):
-        super().__init__(name, args)
+    def __init__(self, session: Simulation, name: str, args: List[str]):
+        super().__init__(session, name, args)
 
     def execute(self) -> None:
         assert(len(self.args) == 1)
-        Z3QuantumGate.mapping[self.args[0]].quantum_not()
+        self.session.mapping[self.args[0]].quantum_not()
 
 
 class HGate(Z3QuantumGate):
 
-    def __init__(self, name: str, args: List[str]):
-        super().__init__(name, args)
+    def __init__(self, session: Simulation, name: str, args: List[str]):
+        super().__init__(session, name, args)
 
     def execute(self) -> None:
         assert (len(self.args) == 1)
-        Z3QuantumGate.mapping[self.args[0]].hadamard()
+        self.session.mapping[self.args[0]].hadamard()
 
 
 class CXGate(Z3QuantumGate):
 
-    def __init__(self, name: str, args: List[str]):
-        super().__init__(name, args)
+    def __init__(self, session: Simulation, name: str, args: List[str]):
+        super().__init__(session, name, args)
 
     def execute(self) -> None:
         assert (len(self.args) == 2)
 
-        control = Z3QuantumGate.mapping[self.args[0]]
-        target = Z3QuantumGate.mapping[self.args[1]]
+        control = self.session.mapping[self.args[0]]
+        target = self.session.mapping[self.args[1]]
 
         # TARGET AMPLITUDES
         # new qubit for target qubit
@@ -141,32 +149,34 @@ class CXGate(Z3QuantumGate):
         alpha2 = target.zero_amplitude
         beta2 = target.one_amplitude
 
+        # each product is built once and shared by the real and imaginary parts of the new amplitudes
+        alpha1_alpha2 = alpha1 * alpha2
+        alpha1_beta2 = alpha1 * beta2
+        beta1_alpha2 = beta1 * alpha2
+        beta1_beta2 = beta1 * beta2
+
         # adding the new zero probability for control
-        StaticSolver.solver.add(control_temp_0_prob.real ==
-                                z3.If(target_qubit, (alpha1*beta2).real, (alpha1 * alpha2).real))
-        StaticSolver.solver.add(control_temp_0_prob.im ==
-                                z3.If(target_qubit, (alpha1 * beta2).im, (alpha1 * alpha2).im))
+        control_temp_0_prob = control.bind(control_temp_0_prob,
+                                           get_complex_class(self.session).select(target_qubit, alpha1_beta2,
+                                                                                  alpha1_alpha2))
 
         # adding the new one probability for control
-        StaticSolver.solver.add(control_temp_1_prob.real ==
-                                z3.If(target_qubit, (beta1*alpha2).real, (beta1*beta2).real))
-        StaticSolver.solver.add(control_temp_1_prob.im ==
-                                z3.If(target_qubit, (beta1*alpha2).im, (beta1*beta2).im))
+        control_temp_1_prob = control.bind(control_temp_1_prob,
+                                           get_complex_class(self.session).select(target_qubit, beta1_alpha2,
+                                                                                  beta1_beta2))
 
         # adding the new zero probability for target
-        StaticSolver.solver.add(target_temp_0_prob.real ==
-                                z3.If(control.qubit, (beta1*beta2).real, (alpha1*alpha2).real))
-        StaticSolver.solver.add(target_temp_0_prob.im ==
-                                z3.If(control.qubit, (beta1*beta2).im, (alpha1*alpha2).im))
+        target_temp_0_prob = target.bind(target_temp_0_prob,
+                                         get_complex_class(self.session).select(control.qubit, beta1_beta2,
+                                                                                alpha1_alpha2))
 
         # adding the new one probability for target
-        StaticSolver.solver.add(target_temp_1_prob.real ==
-                                z3.If(control.qubit, (beta1*alpha2).real, (alpha1*beta2).real))
-        StaticSolver.solver.add(target_temp_1_prob.im ==
-                                z3.If(control.qubit, (beta1*alpha2).im, (alpha1*beta2).im))
+        target_temp_1_prob = target.bind(target_temp_1_prob,
+                                         get_complex_class(self.session).select(control.qubit, beta1_alpha2,
+                                                                                alpha1_beta2))
 
         # add condition to SAT formula
-        StaticSolver.solver.add(target_qubit == z3.If(control.qubit, z3.Not(target.qubit), target.qubit))
+        StaticSolver.add(self.session, target_qubit == z3.If(control.qubit, z3.Not(target.qubit), target.qubit))
 
         # commit new amplitudes for target
         target.swap_vars(target_temp_0_prob, target_temp_1_prob, target_qubit)
@@ -174,32 +184,131 @@ class CXGate(Z3QuantumGate):
         control.swap_vars(control_temp_0_prob, control_temp_1_prob, None)
 
 
-class CZGate(Z3QuantumGate):
-    def __init__(self, name: str, args: List[str]):
-        super().__init__(name, args)
+class ControlledGate(Z3QuantumGate):
+    """
+    Gates that apply a single qubit operation on the last qubit when all the other qubits are 1 (CZ, CCX, MCX, CU1).
+    Each qubit gets, for each of its values, the amplitude of the state in which the other qubits take their new
+    branch values, as in CXGate.
+    """
+    def __init__(self, session: Simulation, name: str, args: List[str], params: Tuple[float, ...] = ()):
+        super().__init__(session, name, args, params)
 
     def execute(self) -> None:
-        assert (len(self.args) == 2)
-        target = Z3QuantumGate.mapping[self.args[1]]
-        target.hadamard()
-        Z3QuantumGate(CX, self.args).execute()
-        target.hadamard()
+        assert (len(self.args) >= 2)
+        controls = [self.session.mapping[name] for name in self.args[:-1]]
+        target = self.session.mapping[self.args[-1]]
+        if is_symbolic(self.params):
+            matrix = get_parametric_matrix(self.session, self.name, self.params)
+        else:
+            matrix = get_target_matrix(self.name, self.params)
+        all_controls = z3.And([control.qubit for control in controls])
+
+        # new branch variable of the target
+        target_temp_0_prob, target_temp_1_prob, target_qubit = target.get_vars()
+        if is_zero_entry(matrix[0][1]) and is_zero_entry(matrix[1][0]):
+            target_qubit = target.qubit
+        elif is_zero_entry(matrix[0][0]) and is_zero_entry(matrix[1][1]):
+            StaticSolver.add(self.session, target_qubit == z3.If(all_controls, z3.Not(target.qubit), target.qubit))
+        else:
+            StaticSolver.add(self.session, z3.Implies(z3.Not(all_controls), target_qubit == target.qubit))
+
+        # amplitudes of the target before and after the operation
+        old = [target.zero_amplitude, target.one_amplitude]
+        applied = [scale_entry(old[0], matrix[0][0]) + scale_entry(old[1], matrix[0][1]),
+                   scale_entry(old[0], matrix[1][0]) + scale_entry(old[1], matrix[1][1])]
+        # amplitude of each control in its current branch
+        selected = [control.get_amplitude(control.qubit) for control in controls]
+
+        new_amplitudes = []
+        for (i, control) in enumerate(controls):
+            others = get_complex_class(self.session).from_value(self.session, 1)
+            for (j, amplitude) in enumerate(selected):
+                if j != i:
+                    others = others * amplitude
+            temp_0_prob, temp_1_prob, _ = control.get_vars()
+            old_target = get_complex_class(self.session).select(target_qubit, old[1], old[0])
+            applied_target = get_complex_class(self.session).select(target_qubit, applied[1], applied[0])
+            other_controls = [c.qubit for (j, c) in enumerate(controls) if j != i]
+            if len(other_controls) > 0:
+                applied_target = get_complex_class(self.session).select(z3.And(other_controls), applied_target,
+                                                                        old_target)
+            temp_0_prob = control.bind(temp_0_prob, control.zero_amplitude * others * old_target)
+            temp_1_prob = control.bind(temp_1_prob, control.one_amplitude * others * applied_target)
+            new_amplitudes.append((temp_0_prob, temp_1_prob))
+
+        all_selected = get_complex_class(self.session).from_value(self.session, 1)
+        for amplitude in selected:
+            all_selected = all_selected * amplitude
+        target_temp_0_prob = target.bind(target_temp_0_prob,
+                                         all_selected * get_complex_class(self.session).select(all_controls, applied[0],
+                                                                                               old[0]))
+        target_temp_1_prob = target.bind(target_temp_1_prob,
+                                         all_selected * get_complex_class(self.session).select(all_controls, applied[1],
+                                                                                               old[1]))
+
+        # commit the new amplitudes once all of them are built from the old ones
+        for (control, (temp_0_prob, temp_1_prob)) in zip(controls, new_amplitudes):
+            control.swap_vars(temp_0_prob, temp_1_prob, None)
+        target.swap_vars(target_temp_0_prob, target_temp_1_prob,
+                         None if target_qubit is target.qubit else target_qubit)
 
 
 class SwapGate(Z3QuantumGate):
-    def __init__(self, name: str, args: List[str]):
-        super().__init__(name, args)
+    def __init__(self, session: Simulation, name: str, args: List[str]):
+        super().__init__(session, name, args)
 
     def execute(self) -> None:
+        # the qubits are relabeled, nothing is added to the solver
         assert (len(self.args) == 2)
-        Z3QuantumGate(CX, self.args).execute()
-        Z3QuantumGate(CX, self.args[::-1]).execute()
-        Z3QuantumGate(CX, self.args).execute()
+        first, second = self.args
+        self.session.mapping[first], self.session.mapping[second] = \
+            self.session.mapping[second], self.session.mapping[first]
+
+
+class CSwapGate(Z3QuantumGate):
+    def __init__(self, session: Simulation, name: str, args: List[str]):
+        super().__init__(session, name, args)
+
+    def execute(self) -> None:
+        assert (len(self.args) == 3)
+        control = self.session.mapping[self.args[0]]
+        first = self.session.mapping[self.args[1]]
+        second = self.session.mapping[self.args[2]]
+
+        control_temp_0_prob, control_temp_1_prob, _ = control.get_vars()
+        first_temp_0_prob, first_temp_1_prob, first_qubit = first.get_vars()
+        second_temp_0_prob, second_temp_1_prob, second_qubit = second.get_vars()
+        StaticSolver.add(self.session, first_qubit == z3.If(control.qubit, second.qubit, first.qubit))
+        StaticSolver.add(self.session, second_qubit == z3.If(control.qubit, first.qubit, second.qubit))
+
+        # amplitudes of the targets in their new branches, when they are not swapped and when they are
+        kept = first.get_amplitude(first_qubit) * second.get_amplitude(second_qubit)
+        swapped = first.get_amplitude(second_qubit) * second.get_amplitude(first_qubit)
+        control_amplitude = control.get_amplitude(control.qubit)
+
+        control_temp_0_prob = control.bind(control_temp_0_prob, control.zero_amplitude * kept)
+        control_temp_1_prob = control.bind(control_temp_1_prob, control.one_amplitude * swapped)
+        first_temp_0_prob = first.bind(first_temp_0_prob, control_amplitude * get_complex_class(self.session).select(
+            control.qubit, first.get_amplitude(second_qubit) * second.zero_amplitude,
+            first.zero_amplitude * second.get_amplitude(second_qubit)))
+        first_temp_1_prob = first.bind(first_temp_1_prob, control_amplitude * get_complex_class(self.session).select(
+            control.qubit, first.get_amplitude(second_qubit) * second.one_amplitude,
+            first.one_amplitude * second.get_amplitude(second_qubit)))
+        second_temp_0_prob = second.bind(second_temp_0_prob, control_amplitude * get_complex_class(self.session).select(
+            control.qubit, first.zero_amplitude * second.get_amplitude(first_qubit),
+            first.get_amplitude(first_qubit) * second.zero_amplitude))
+        second_temp_1_prob = second.bind(second_temp_1_prob, control_amplitude * get_complex_class(self.session).select(
+            control.qubit, first.one_amplitude * second.get_amplitude(first_qubit),
+            first.get_amplitude(first_qubit) * second.one_amplitude))
+
+        control.swap_vars(control_temp_0_prob, control_temp_1_prob, None)
+        first.swap_vars(first_temp_0_prob, first_temp_1_prob, first_qubit)
+        second.swap_vars(second_temp_0_prob, second_temp_1_prob, second_qubit)
 
 
 class IGate(Z3QuantumGate):
-    def __init__(self, name: str, args: List[str]):
-        super().__init__(name, args)
+    def __init__(self, session: Simulation, name: str, args: List[str]):
+        super().__init__(session, name, args)
 
     def execute(self) -> None:
         # identity gate
@@ -207,55 +316,52 @@ class IGate(Z3QuantumGate):
 
 
 class ZGate(Z3QuantumGate):
-    def __init__(self, name: str, args: List[str]):
-        super().__init__(name, args)
+    def __init__(self, session: Simulation, name: str, args: List[str]):
+        super().__init__(session, name, args)
 
     def execute(self) -> None:
         assert(len(self.args) == 1)
-        Z3QuantumGate.mapping[self.args[0]].z()
+        self.session.mapping[self.args[0]].z()
 
 
 class YGate(Z3QuantumGate):
-    def __init__(self, name: str, args: List[str]):
-        super().__init__(name, args)
+    def __init__(self, session: Simulation, name: str, args: List[str]):
+        super().__init__(session, name, args)
 
     def execute(self) -> None:
         assert (len(self.args) == 1)
-        Z3QuantumGate.mapping[self.args[0]].y()
+        self.session.mapping[self.args[0]].y()
 
 
 class TGate(Z3QuantumGate):
-    def __init__(self, name: str, args: List[str]):
-        super().__init__(name, args)
+    def __init__(self, session: Simulation, name: str, args: List[str]):
+        super().__init__(session, name, args)
 
     def execute(self) -> None:
         assert (len(self.args) == 1)
-        Z3QuantumGate.mapping[self.args[0]].t()
-
-
-class SGate(Z3QuantumGate):
-    def __init__(self, name: str, args: List[str]):
-        super().__init__(name, args)
-
-    def execute(self) -> None:
-        assert (len(self.args) == 1)
-        Z3QuantumGate.mapping[self.args[0]].t()
-        Z3QuantumGate.mapping[self.args[0]].t()
+        self.session.mapping[self.args[0]].t()
 
 
 class TDGGate(Z3QuantumGate):
-    def __init__(self, name: str, args: List[str]):
-        super().__init__(name, args)
+    def __init__(self, session: Simulation, name: str, args: List[str]):
+        super().__init__(session, name, args)
 
     def execute(self) -> None:
         assert (len(self.args) == 1)
-        Z3QuantumGate.mapping[self.args[0]].t_transpose()
+        self.session.mapping[self.args[0]].t_transpose()
 
 
-class CCXGate(Z3QuantumGate):
-    def __init__(self, name: str, args: List[str]):
-        super().__init__(name, args)
+class UnitaryGate(Z3QuantumGate):
+    """
+    Single qubit gates given by their matrix (S, SDG and the parametric gates U1, U2, U3, RX, RY, RZ)
+    """
+    def __init__(self, session: Simulation, name: str, args: List[str], params: Tuple[float, ...] = ()):
+        super().__init__(session, name, args, params)
 
     def execute(self) -> None:
-        assert(len(self.args) == 3)
-        raise Exception("Not implemented")
+        assert (len(self.args) == 1)
+        if is_symbolic(self.params):
+            matrix = get_parametric_matrix(self.session, self.name, self.params)
+        else:
+            matrix = get_matrix(self.name, self.params)
+        self.session.mapping[self.args[0]].apply_unitary(matrix)
@@ -4,39 +4,54 @@ import z3
 from utils import StaticSolver
 from math import sqrt, e, pi
 from symbolic_complex import SymbolicComplex
-from stack import Stack
+from exact_complex import get_complex_class
+from parametric_gates import is_zero_entry, scale_entry
+from simulation import Simulation
 
 # TODO: check when to create new qubits for gates
 
 class Z3Qubit:
+    # one instance per qubit, copied by Simulation.push
+    __slots__ = ["session", "zero_amplitude", "one_amplitude", "qubit", "counter", "name"]
+    session: Simulation
     zero_amplitude: SymbolicComplex
     one_amplitude: SymbolicComplex
     qubit: z3.Bool
     counter: int
     name: str
-    had_count: int
-    is_in_superposition: bool
-    stack: Stack
 
-    def __init__(self, name):
+    def __init__(self, session: Simulation, name):
+        self.session = session
         self.name = name
         self.counter = 0
-        self.zero_amplitude = SymbolicComplex(f"z_{name}_{self.counter}", 1.0, 0.0)
-        self.one_amplitude = SymbolicComplex(f"o_{name}_{self.counter}", 0.0, 0.0)
-        self.qubit = z3.Bool(f"b_{name}_{self.counter}")
-        self.is_in_superposition = False
+        self.zero_amplitude = get_complex_class(session).from_value(session, 1.0)
+        self.one_amplitude = get_complex_class(session).from_value(session, 0.0)
+        self.qubit = z3.Bool(f"b_{name}_{self.counter}", session.context)
         self.counter += 1
-        StaticSolver.solver.add(self.qubit == False)
-        self.had_count = 0
-        self.stack = Stack()
+        session.bool_count += 1
+        StaticSolver.add(session, self.qubit == False)
 
     def get_vars(self) -> (SymbolicComplex, SymbolicComplex, z3.Bool):
-        zero_amplitude = SymbolicComplex(f"z_{self.name}_{self.counter}")
-        one_amplitude = SymbolicComplex(f"o_{self.name}_{self.counter}")
-        qubit = z3.Bool(f"{self.name}_{self.counter}")
+        zero_amplitude = get_complex_class(self.session)(self.session, f"z_{self.name}_{self.counter}")
+        one_amplitude = get_complex_class(self.session)(self.session, f"o_{self.name}_{self.counter}")
+        qubit = z3.Bool(f"{self.name}_{self.counter}", self.session.context)
         self.counter += 1
         return zero_amplitude, one_amplitude, qubit
 
+    @staticmethod
+    def bind(temp_amplitude: SymbolicComplex, amplitude: SymbolicComplex) -> SymbolicComplex:
+        # amplitudes known at encoding time are propagated as constants, and amplitudes that already are a single
+        # variable are reused, only other expressions use the fresh variables
+        if amplitude.is_constant() or amplitude.size == 1:
+            return amplitude
+        temp_amplitude.session.real_count += 2
+        StaticSolver.add(temp_amplitude.session, temp_amplitude.define(amplitude))
+        return temp_amplitude
+
+    def get_amplitude(self, value: z3.BoolRef) -> SymbolicComplex:
+        # amplitude of the branch selected by a boolean, e.g. the branch variable of another qubit
+        return get_complex_class(self.session).select(value, self.one_amplitude, self.zero_amplitude)
+
     def get_probability(self, value: int) -> float:
         if value == 0:
             return self.zero_amplitude.squared_norm()
@@ -48,21 +63,22 @@ class Z3Qubit:
         self.zero_amplitude = temp_zero_amplitude
         self.one_amplitude = temp_one_amplitude
         if qubit is not None:
+            self.session.bool_count += 1
             self.qubit = qubit
 
     def quantum_not(self) -> None:
         _, _, qubit = self.get_vars()
         temp_one_amplitude = self.zero_amplitude
         temp_zero_amplitude = self.one_amplitude
-        StaticSolver.solver.add(qubit == z3.Not(self.qubit))
+        StaticSolver.add(self.session, qubit == z3.Not(self.qubit))
         self.swap_vars(temp_zero_amplitude, temp_one_amplitude, qubit)
 
     def hadamard(self) -> None:
         # hadamard gate: 1/sqrt(2)[[1,1],[1,-1]]
 
         temp_zero_amplitude, temp_one_amplitude, qubit = self.get_vars()
-        StaticSolver.solver.add(temp_zero_amplitude == ((self.zero_amplitude + self.one_amplitude) / sqrt(2)))
-        StaticSolver.solver.add(temp_one_amplitude == ((self.zero_amplitude - self.one_amplitude) / sqrt(2)))
+        temp_zero_amplitude = self.bind(temp_zero_amplitude, (self.zero_amplitude + self.one_amplitude) / sqrt(2))
+        temp_one_amplitude = self.bind(temp_one_amplitude, (self.zero_amplitude - self.one_amplitude) / sqrt(2))
 
         # TODO: add condition to restrict this
         self.swap_vars(temp_zero_amplitude, temp_one_amplitude, qubit)
@@ -71,25 +87,44 @@ class Z3Qubit:
     def y(self) -> None:
         # introduces a global phase i
         temp_zero_amplitude, temp_one_amplitude, qubit = self.get_vars()
-        StaticSolver.solver.add(temp_zero_amplitude == self.one_amplitude * complex(0, -1))
-        StaticSolver.solver.add(temp_one_amplitude == self.zero_amplitude * complex(0, 1))
+        temp_zero_amplitude = self.bind(temp_zero_amplitude, self.one_amplitude * complex(0, -1))
+        temp_one_amplitude = self.bind(temp_one_amplitude, self.zero_amplitude * complex(0, 1))
         self.swap_vars(temp_zero_amplitude, temp_one_amplitude, qubit)
 
     def z(self) -> None:
         # phase flip gate
         temp_zero_amplitude, temp_one_amplitude, qubit = self.get_vars()
         temp_zero_amplitude = self.zero_amplitude
-        StaticSolver.solver.add(temp_one_amplitude == self.one_amplitude * complex(-1, 0))
+        temp_one_amplitude = self.bind(temp_one_amplitude, self.one_amplitude * complex(-1, 0))
         self.swap_vars(temp_zero_amplitude, temp_one_amplitude, qubit)
 
     def t(self) -> None:
         temp_zero_amplitude, temp_one_amplitude, _ = self.get_vars()
         temp_zero_amplitude = self.zero_amplitude
-        StaticSolver.solver.add(temp_one_amplitude == self.one_amplitude * (complex(e, 0) ** complex(0, pi/4)))
+        temp_one_amplitude = self.bind(temp_one_amplitude, self.one_amplitude * (complex(e, 0) ** complex(0, pi/4)))
         self.swap_vars(temp_zero_amplitude, temp_one_amplitude)
 
     def t_transpose(self) -> None:
         temp_zero_amplitude, temp_one_amplitude, _ = self.get_vars()
         temp_zero_amplitude = self.zero_amplitude
-        StaticSolver.solver.add(temp_one_amplitude == self.one_amplitude * (complex(e, 0) ** complex(0, - pi / 4)))
+        temp_one_amplitude = self.bind(temp_one_amplitude,
+                                       self.one_amplitude * (complex(e, 0) ** complex(0, - pi / 4)))
         self.swap_vars(temp_zero_amplitude, temp_one_amplitude)
+
+    def apply_unitary(self, matrix) -> None:
+        """
+        Applies a single qubit gate. Diagonal gates keep the branch variable, anti-diagonal ones negate it and any
+        other gate creates a fresh one, as the hadamard gate does
+        :param matrix: 2x2 matrix, matrix[i][j] is the amplitude of |i> for the input |j>. Entries are numbers, or
+        SymbolicComplex for gates with symbolic parameters
+        """
+        temp_zero_amplitude, temp_one_amplitude, qubit = self.get_vars()
+        temp_zero_amplitude = self.bind(temp_zero_amplitude, scale_entry(self.zero_amplitude, matrix[0][0])
+                                        + scale_entry(self.one_amplitude, matrix[0][1]))
+        temp_one_amplitude = self.bind(temp_one_amplitude, scale_entry(self.zero_amplitude, matrix[1][0])
+                                       + scale_entry(self.one_amplitude, matrix[1][1]))
+        if is_zero_entry(matrix[0][1]) and is_zero_entry(matrix[1][0]):
+            qubit = None
+        elif is_zero_entry(matrix[0][0]) and is_zero_entry(matrix[1][1]):
+            StaticSolver.add(self.session, qubit == z3.Not(self.qubit))
+        self.swap_vars(temp_zero_amplitude, temp_one_amplitude, qubit)